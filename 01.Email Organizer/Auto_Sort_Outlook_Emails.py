@@ -1 +1,399 @@
+import graph_client
+import token_cache
+import mail_sync
+import graph_batch
+import folder_index
+from sort_rules import RuleSet
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
 
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+CLIENT_ID = "YOUR_CLIENT_ID"
+
+# Permissions requested at login (offline_access allows silent token refresh)
+SCOPES = "Mail.ReadWrite offline_access"
+
+# Sorting rules, in priority order (the first matching rule wins).
+# Each rule can match on sender domains (subdomains included), exact
+# sender addresses, subject keywords, preview (body) keywords and
+# importance. Folders are created if they don't exist; use "/" for
+# subfolders ("Newsletters/Tech", or "inbox/Receipts" under the Inbox).
+SORT_RULES = [
+    {
+        "folder": "Washington Post",
+        "domains": ["washpost.com", "washingtonpost.com"]
+    },
+    {
+        "folder": "Important",
+        "importance": "high",
+        "subject": ["urgent", "asap", "action required", "important"]
+    },
+    {
+        "folder": "Newsletters",
+        "domains": ["substack.com", "mailchimp.com", "beehiiv.com"],
+        "subject": ["newsletter", "digest", "weekly update"],
+        "body": ["unsubscribe", "view in browser"]
+    },
+    {
+        "folder": "Work",
+        "domains": ["yourcompany.com"]  # Your work domain(s)
+    },
+    {
+        "folder": "Personal",
+        "domains": ["gmail.com", "outlook.com", "hotmail.com", "yahoo.com", "icloud.com"]
+    }
+]
+
+# On the first run, sort everything received this many days back
+BACKLOG_DAYS = 365
+
+# How often to check for new emails once the backlog is sorted (in seconds)
+CHECK_INTERVAL = 300  # Check every 5 minutes
+
+# Only print what would be moved, without moving anything (dry runs keep
+# their own sync state, so the first real run still sorts the backlog)
+DRY_RUN = False
+
+# $batch move calls in flight at once (Outlook allows 4 concurrent requests per mailbox)
+MOVE_WORKERS = 4
+
+# Messages per page requested from Graph (pages are followed automatically)
+PAGE_SIZE = 100
+
+# Name of the saved delta sync state (only new or changed messages are fetched each check)
+SYNC_STATE_NAME = "auto_sort_inbox"
+
+# Fields the rules look at
+MESSAGE_FIELDS = "id,subject,from,bodyPreview,importance,receivedDateTime"
+
+# ============================================================
+# AUTHENTICATION
+# ============================================================
+
+def get_access_token(interactive=True):
+    """Get a valid access token (cached and silently refreshed, device code login only when needed)
+    
+    The sorting loop passes interactive=False: if the refresh token stops
+    working it reports the failure rather than blocking on a login prompt.
+    """
+    
+    return token_cache.get_token_manager(CLIENT_ID, SCOPES).get_token(interactive)
+
+# ============================================================
+# FOLDER FUNCTIONS
+# ============================================================
+
+def resolve_folders(access_token, folder_paths, user=None):
+    """Map every rule's folder path to its id, creating missing folders
+    
+    Done once at startup from the cached folder index, so sorting never
+    looks a folder up per message. `user` is another mailbox (None = yours).
+    """
+    
+    index = folder_index.get_folder_index(user=user)
+    folder_ids = {}
+    
+    for path in dict.fromkeys(folder_paths):
+        folder_id = index.resolve(access_token, path, create=not DRY_RUN)
+        
+        if folder_id or DRY_RUN:
+            folder_ids[path] = folder_id
+        else:
+            print(f"  ⚠️  No folder for {path} - its emails stay in the inbox")
+    
+    return folder_ids
+
+# ============================================================
+# SORTING FUNCTIONS
+# ============================================================
+
+def get_new_emails(access_token):
+    """Inbox messages that arrived or changed since the last check (delta sync)
+    
+    Returns a mail_sync.DeltaRound: iterating it streams the messages, and
+    its save() marks them as sorted. Until then the next check gets them
+    again.
+    """
+    
+    state_name = f"{SYNC_STATE_NAME}_dry_run" if DRY_RUN else SYNC_STATE_NAME
+    
+    return mail_sync.DeltaRound(
+        access_token, state_name, MESSAGE_FIELDS, page_size=PAGE_SIZE, initial_days=BACKLOG_DAYS
+    )
+
+def is_permanent_failure(status):
+    """Whether a failed move would fail the same way next time (a 4xx other than a timeout or throttle)"""
+    
+    return status is not None and 400 <= status < 500 and status not in (408, 429)
+
+def skip_move(email, folder, status):
+    """Log a move that will not be retried"""
+    
+    print(f"  ⚠️  Could not move to {folder} ({status}), leaving it in the inbox: {(email.get('subject') or 'No Subject')[:50]}")
+
+def retry_missing_folders(access_token, folder_ids, not_found, base="/me", user=None):
+    """Move again the emails whose move answered 404, once their folders are checked
+    
+    A 404 means the destination folder was deleted or the email itself
+    is gone. Deleted folders are dropped from the index and created again
+    (updating folder_ids); moves still answering 404 are skipped. Returns
+    (moved per folder, failed moves).
+    """
+    
+    index = folder_index.get_folder_index(user=user)
+    moved = Counter()
+    failed = 0
+    unavailable = set()  # folders that could not be checked or created again
+    
+    for folder in dict.fromkeys(folder for folder, _ in not_found):
+        exists = index.check_exists(access_token, folder_ids[folder])
+        
+        if exists is False:
+            print(f"  ⚠️  Folder {folder} no longer exists - creating it again")
+            folder_id = index.resolve(access_token, folder, create=True)
+            if folder_id:
+                folder_ids[folder] = folder_id
+            else:
+                unavailable.add(folder)
+        elif exists is None:
+            unavailable.add(folder)
+    
+    queue = graph_batch.BatchQueue(access_token)
+    destinations = {}
+    
+    for folder, email in not_found:
+        if folder in unavailable:
+            failed += 1
+            continue
+        
+        request = queue.add("POST", f"{base}/messages/{email['id']}/move", body={"destinationId": folder_ids[folder]})
+        destinations[request] = (folder, email)
+    
+    for request in queue.flush():
+        folder, email = destinations[request]
+        if request.ok:
+            moved[folder] += 1
+        elif is_permanent_failure(request.status):
+            skip_move(email, folder, request.status)
+        else:
+            failed += 1
+    
+    return moved, failed
+
+def sort_emails(access_token, rule_set, folder_ids, emails, base="/me", user=None):
+    """Classify each email once and move matches with $batch calls
+    
+    Moves are queued 20 to a $batch call and up to MOVE_WORKERS calls run
+    while later pages are still being read. `base` is the mailbox the
+    emails are in ("/me" or "/users/{id}") and `user` its address (None =
+    yours). Moves answering 404 get one more try once deleted folders are
+    recreated; other 4xx answers are logged and skipped, since retrying
+    them would fail forever and hold up the sync state. Returns (moved per
+    folder, emails checked, failed moves worth retrying).
+    """
+    
+    moved = Counter()
+    destinations = {}  # queued BatchRequest -> (folder name, email)
+    not_found = []  # (folder name, email) whose move answered 404
+    failed = 0
+    checked = 0
+    in_flight = set()
+    
+    def collect(futures):
+        nonlocal failed
+        
+        for future in futures:
+            for request in future.result():
+                folder, email = destinations.pop(request)
+                if request.ok:
+                    moved[folder] += 1
+                elif request.status == 404:
+                    not_found.append((folder, email))
+                elif is_permanent_failure(request.status):
+                    skip_move(email, folder, request.status)
+                else:
+                    failed += 1
+    
+    with ThreadPoolExecutor(max_workers=MOVE_WORKERS) as pool:
+        queue = graph_batch.BatchQueue(access_token, auto_flush=False)
+        
+        for email in emails:
+            checked += 1
+            folder = rule_set.classify(email)
+            
+            if folder is None or folder not in folder_ids:
+                continue
+            
+            if DRY_RUN:
+                print(f"  📨 Would move to {folder}: {(email.get('subject') or 'No Subject')[:50]}")
+                moved[folder] += 1
+                continue
+            
+            request = queue.add("POST", f"{base}/messages/{email['id']}/move", body={"destinationId": folder_ids[folder]})
+            destinations[request] = (folder, email)
+            
+            if len(queue) >= graph_batch.MAX_BATCH_SIZE:
+                in_flight.add(pool.submit(queue.flush))
+                queue = graph_batch.BatchQueue(access_token, auto_flush=False)
+                
+                # Keep a few batches queued, not the whole backlog
+                if len(in_flight) >= MOVE_WORKERS * 2:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+        
+        if len(queue):
+            in_flight.add(pool.submit(queue.flush))
+        
+        collect(in_flight)
+    
+    if not_found:
+        retried, retry_failed = retry_missing_folders(access_token, folder_ids, not_found, base, user)
+        moved.update(retried)
+        failed += retry_failed
+    
+    return moved, checked, failed
+
+def handle_messages(access_token, mailbox, messages):
+    """Mailbox daemon handler: sort the messages one check fetched
+    
+    The rules are compiled and the mailbox's folders resolved on its
+    first check, then kept with the mailbox. Raises GraphError if any move
+    failed, so the daemon hands the messages out again next check.
+    Refuses DRY_RUN: the daemon shares one delta state between its
+    handlers, and saving it would mark emails sorted that never moved.
+    """
+    
+    if DRY_RUN:
+        raise ValueError("DRY_RUN cannot be used from the mailbox daemon (it would save the shared delta state)")
+    
+    if "sort_folders" not in mailbox.context:
+        rule_set = RuleSet(SORT_RULES)
+        mailbox.context["sort_rules"] = rule_set
+        mailbox.context["sort_folders"] = resolve_folders(access_token, rule_set.folders, mailbox.user)
+    
+    moved, checked, failed = sort_emails(
+        access_token, mailbox.context["sort_rules"], mailbox.context["sort_folders"], messages, mailbox.base, mailbox.user
+    )
+    
+    if moved or failed:
+        print(f"[{mailbox.name}] Sorted {sum(moved.values())} of {checked} email(s)")
+        for folder, count in moved.most_common():
+            print(f"  ✓ {folder}: {count}")
+        if failed:
+            print(f"  ❌ Failed to move: {failed}")
+    
+    if failed:
+        raise graph_client.GraphError(f"{failed} email(s) could not be moved")
+    
+    return sum(moved.values())
+
+# ============================================================
+# MAIN SCRIPT
+# ============================================================
+
+def main():
+    print("\n" + "="*60)
+    print("AUTO-SORT OUTLOOK EMAILS")
+    print("="*60 + "\n")
+    
+    rule_set = RuleSet(SORT_RULES)
+    
+    print(f"✓ Client ID configured")
+    print(f"✓ {len(rule_set)} sorting rules loaded")
+    print(f"✓ Check interval: Every {CHECK_INTERVAL} seconds")
+    print(f"✓ Mode: {'DRY RUN (nothing is moved)' if DRY_RUN else 'moving emails'}")
+    print()
+    
+    # Authenticate
+    access_token = get_access_token()
+    
+    if not access_token:
+        print("❌ Authentication failed!")
+        return
+    
+    # Resolve folder names once
+    print("Loading mail folders...")
+    folder_ids = resolve_folders(access_token, rule_set.folders)
+    print(f"✓ {len(folder_ids)} destination folders ready\n")
+    
+    print("="*60)
+    print("SORTING INBOX")
+    print("="*60)
+    print("Press Ctrl+C to stop\n")
+    
+    total_moved = Counter()
+    check_count = 0
+    
+    try:
+        while True:
+            check_count += 1
+            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            
+            # Cached token, refreshed shortly before it expires (never prompts)
+            access_token = get_access_token(interactive=False)
+            if not access_token:
+                print(f"[{current_time}] ❌ Could not renew access token - retrying next check")
+                time.sleep(CHECK_INTERVAL)
+                continue
+            
+            if check_count == 1:
+                print(f"[{current_time}] Sorting new and backlog emails (up to {BACKLOG_DAYS} days back)...")
+            
+            start = time.perf_counter()
+            emails = get_new_emails(access_token)
+            
+            try:
+                moved, checked, failed = sort_emails(access_token, rule_set, folder_ids, emails)
+            except Exception as e:
+                print(f"[{current_time}] ❌ Error: {e}")
+                time.sleep(CHECK_INTERVAL)
+                continue
+            
+            elapsed = time.perf_counter() - start
+            total_moved.update(moved)
+            
+            # Only move the sync state on once every move went through, so
+            # emails that failed to move are offered again next check
+            if not failed:
+                emails.save()
+            
+            if moved or failed:
+                print(f"\n[{current_time}] Checked {checked} email(s) in {elapsed:.1f}s")
+                for folder, count in moved.most_common():
+                    print(f"  ✓ {folder}: {count}")
+                if failed:
+                    print(f"  ❌ Failed to move: {failed} (retrying next check)")
+                print(f"  Total sorted: {sum(total_moved.values())}")
+            else:
+                if check_count % 10 == 0:
+                    print(f"[{current_time}] No emails to sort. Total sorted: {sum(total_moved.values())}")
+            
+            # Wait before next check
+            time.sleep(CHECK_INTERVAL)
+    
+    except KeyboardInterrupt:
+        print("\n\n" + "="*60)
+        print("STOPPED BY USER")
+        print("="*60)
+        for folder, count in total_moved.most_common():
+            print(f"{folder}: {count}")
+        print(f"Total emails sorted: {sum(total_moved.values())}")
+        print("="*60 + "\n")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print("\n" + "="*60)
+        print("ERROR OCCURRED")
+        print("="*60)
+        print(f"\n{type(e).__name__}: {str(e)}\n")
+        import traceback
+        traceback.print_exc()
+    finally:
+        input("\nPress Enter to close...")
@@ -1,6 +1,10 @@
-import requests
-import time
-from datetime import datetime, timedelta
+import availability
+import calendar_cache
+import event_records
+import free_time
+import graph_client
+import token_cache
+from datetime import timedelta
 
 # ============================================================
 # CONFIGURATION
@@ -8,178 +12,176 @@ from datetime import datetime, timedelta
 
 CLIENT_ID = "YOUR_CLIENT_ID"
 
+# Permissions requested at login (offline_access allows silent token refresh)
+SCOPES = "Calendars.Read offline_access"
+
 # Working hours (24-hour format)
 WORK_START_HOUR = 8  # 8 AM
 WORK_END_HOUR = 21   # 9 PM
 
+# Time zone for working hours and the report, as an IANA name such as
+# "Europe/London" (None uses this computer's time zone)
+TIME_ZONE = None
+
 # Minimum gap duration to report (in hours)
 MIN_GAP_DURATION = 2
 
 # How many days ahead to check
 DAYS_AHEAD = 7  # Check next 7 days
 
+# Events per page requested from Graph (pages are followed automatically)
+PAGE_SIZE = 100
+
+# Keep a local copy of the calendar (shared by the calendar scripts) and
+# only download what changed since the last run
+USE_CALENDAR_CACHE = True
+
+# Find time that is free for all of these people (leave empty to check only
+# your own calendar). Include your own address to be part of the meeting.
+ATTENDEES = []  # e.g. ["you@example.com", "colleague@example.com"]
+
 # ============================================================
 # AUTHENTICATION
 # ============================================================
 
-def get_access_token_device_code():
-    """Get access token using device code flow"""
-    
-    device_code_url = "https://login.microsoftonline.com/common/oauth2/v2.0/devicecode"
-    
-    data = {
-        "client_id": CLIENT_ID,
-        "scope": "Calendars.Read offline_access"
-    }
-    
-    print("Requesting authentication...")
+def get_access_token():
+    """Get a valid access token (cached and silently refreshed, device code login only when needed)"""
     
-    try:
-        response = requests.post(device_code_url, data=data)
-        response.raise_for_status()
-        device_code_response = response.json()
-        
-        if 'error' in device_code_response or 'message' not in device_code_response:
-            print(f"\n❌ Authentication error")
-            return None
-        
-    except requests.exceptions.RequestException as e:
-        print(f"\n❌ Network error: {e}")
-        return None
-    
-    print("\n" + "="*60)
-    print("AUTHENTICATION REQUIRED")
-    print("="*60)
-    print(f"\n{device_code_response['message']}\n")
-    print(f"User Code: {device_code_response['user_code']}")
-    print(f"Visit: {device_code_response['verification_uri']}")
-    print("\nWaiting for authentication...")
-    print("="*60 + "\n")
-    
-    token_url = "https://login.microsoftonline.com/common/oauth2/v2.0/token"
-    
-    token_data = {
-        "grant_type": "urn:ietf:params:oauth:grant-type:device_code",
-        "client_id": CLIENT_ID,
-        "device_code": device_code_response['device_code']
-    }
-    
-    while True:
-        try:
-            token_response = requests.post(token_url, data=token_data)
-            token_result = token_response.json()
-            
-            if "access_token" in token_result:
-                print("✓ Authentication successful!\n")
-                return token_result["access_token"]
-            elif token_result.get("error") == "authorization_pending":
-                print(".", end="", flush=True)
-                time.sleep(5)
-            else:
-                print(f"\n❌ Error: {token_result.get('error_description', 'Unknown error')}")
-                return None
-        except Exception as e:
-            print(f"\n❌ Error: {e}")
-            return None
+    return token_cache.get_token_manager(CLIENT_ID, SCOPES).get_token()
 
 # ============================================================
 # CALENDAR FUNCTIONS
 # ============================================================
 
 def get_calendar_events(access_token, start_date, end_date):
-    """Get calendar events within date range"""
+    """Stream calendar events within date range (all pages, ordered by start)
     
-    url = "https://graph.microsoft.com/v1.0/me/calendar/calendarView"
+    Raises graph_client.GraphError if a page cannot be read: a calendar
+    with meetings missing would show them as free time.
+    """
+    
+    url = "/me/calendar/calendarView"
     
     params = {
-        "startDateTime": start_date.isoformat(),
-        "endDateTime": end_date.isoformat(),
-        "$select": "subject,start,end",
+        "startDateTime": event_records.utc_text(start_date) + "Z",
+        "endDateTime": event_records.utc_text(end_date) + "Z",
+        "$select": "subject,start,end,isAllDay",
         "$orderby": "start/dateTime"
     }
     
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
+    # Times come back in UTC and are converted to TIME_ZONE once, in EventRecords
+    headers = {"Prefer": event_records.PREFER_UTC}
     
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        
-        if response.status_code == 200:
-            return response.json().get('value', [])
-        else:
-            print(f"❌ Error fetching events: {response.status_code}")
-            return []
-    except Exception as e:
-        print(f"❌ Error: {e}")
-        return []
+    if USE_CALENDAR_CACHE:
+        yield from calendar_cache.get_events(access_token, start_date, end_date)
+    else:
+        yield from graph_client.iter_items(access_token, url, params=params, page_size=PAGE_SIZE, headers=headers)
 
-def find_gaps_for_day(events, date):
+def find_gaps_for_day(index, events, day, zone=None):
     """Find free time gaps in a specific day"""
     
-    # Define working hours for the day
-    work_start = date.replace(hour=WORK_START_HOUR, minute=0, second=0, microsecond=0)
-    work_end = date.replace(hour=WORK_END_HOUR, minute=0, second=0, microsecond=0)
+    # Define working hours for the day (as timestamps, so DST days are right)
+    work_start = event_records.local_timestamp(day, WORK_START_HOUR, zone)
+    work_end = event_records.local_timestamp(day, WORK_END_HOUR, zone)
     
-    # Filter events for this specific day within working hours
+    # Clip the day's events (already parsed and sorted) to working hours
     day_events = []
     for event in events:
-        start_dt = datetime.fromisoformat(event['start']['dateTime'].replace('Z', '+00:00'))
-        end_dt = datetime.fromisoformat(event['end']['dateTime'].replace('Z', '+00:00'))
-        
-        # Check if event overlaps with this day's working hours
-        if start_dt.date() == date.date() or end_dt.date() == date.date():
-            # Clip event times to working hours
-            clipped_start = max(start_dt.replace(tzinfo=None), work_start)
-            clipped_end = min(end_dt.replace(tzinfo=None), work_end)
-            
-            if clipped_start < clipped_end:
-                day_events.append({
-                    'start': clipped_start,
-                    'end': clipped_end,
-                    'subject': event.get('subject', 'No Subject')
-                })
-    
-    # Sort events by start time
-    day_events.sort(key=lambda x: x['start'])
-    
-    # Find gaps
-    gaps = []
-    current_time = work_start
-    
-    for event in day_events:
-        # Check if there's a gap before this event
-        if current_time < event['start']:
-            gap_duration = (event['start'] - current_time).total_seconds() / 3600  # Convert to hours
-            
-            if gap_duration >= MIN_GAP_DURATION:
-                gaps.append({
-                    'start': current_time,
-                    'end': event['start'],
-                    'duration': gap_duration
-                })
-        
-        # Move current_time to end of this event
-        current_time = max(current_time, event['end'])
-    
-    # Check if there's a gap after the last event until end of work day
-    if current_time < work_end:
-        gap_duration = (work_end - current_time).total_seconds() / 3600
+        clipped_start = max(event.start_ts, work_start)
+        clipped_end = min(event.end_ts, work_end)
         
-        if gap_duration >= MIN_GAP_DURATION:
-            gaps.append({
-                'start': current_time,
-                'end': work_end,
-                'duration': gap_duration
+        if clipped_start < clipped_end:
+            day_events.append({
+                'start': event_records.to_local(clipped_start, zone),
+                'end': event_records.to_local(clipped_end, zone),
+                'subject': event.subject
             })
     
+    # Free windows come from the merged busy time of the whole range
+    gaps = [
+        {
+            'start': event_records.to_local(gap_start, zone),
+            'end': event_records.to_local(gap_end, zone),
+            'duration': (gap_end - gap_start) / 3600  # Convert to hours
+        }
+        for gap_start, gap_end in index.free_timestamps(work_start, work_end, MIN_GAP_DURATION * 3600)
+    ]
+    
     return gaps, day_events
 
+def find_common_free_time(access_token, attendees, start_date, end_date, zone=None):
+    """Free slots shared by every attendee, grouped by day
+    
+    Returns None when no attendee's schedule could be read: working hours
+    on their own are not anybody's free time. Raises if a getSchedule call
+    fails rather than intersecting only the attendees that were read.
+    """
+    
+    grid = availability.SlotGrid(start_date, end_date, zone=zone)
+    views = availability.fetch_availability(access_token, attendees, start_date, end_date)
+    
+    if not views:
+        return None
+    
+    missing = [address for address in attendees if address.lower() not in views]
+    if missing:
+        print(f"⚠️  Skipping {len(missing)} attendee(s) without a schedule: {', '.join(missing)}")
+    
+    # Everyone's free slots ANDed together, limited to working hours
+    bitmaps = [grid.free_from_view(view) for view in views.values()]
+    bitmaps.append(grid.working_hours(WORK_START_HOUR, WORK_END_HOUR))
+    common = availability.common_free(bitmaps)
+    
+    slots_by_day = {}
+    for slot_start, slot_end in grid.windows(common, MIN_GAP_DURATION * 60):
+        slots_by_day.setdefault(slot_start.date(), []).append((slot_start, slot_end))
+    
+    return len(views), slots_by_day
+
 # ============================================================
 # MAIN SCRIPT
 # ============================================================
 
+def print_common_free_time(access_token, start_date, end_date, zone=None):
+    """Report slots where all ATTENDEES are free"""
+    
+    print(f"Fetching availability for {len(ATTENDEES)} people from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}...")
+    
+    try:
+        result = find_common_free_time(access_token, ATTENDEES, start_date, end_date, zone)
+    except Exception as e:
+        print(f"❌ Could not read every schedule, no common free time reported: {e}\n")
+        return
+    
+    if result is None:
+        print("❌ Could not read anyone's schedule, no common free time reported\n")
+        return
+    
+    people, slots_by_day = result
+    
+    print("="*60)
+    print(f"COMMON FREE TIME ({people} of {len(ATTENDEES)} people)")
+    print("="*60 + "\n")
+    
+    total_hours = 0
+    
+    for day, slots in sorted(slots_by_day.items()):
+        print(f"📅 {day.strftime('%A, %B %d, %Y')}")
+        print("-" * 60)
+        for slot_start, slot_end in slots:
+            hours = (slot_end - slot_start).total_seconds() / 3600
+            total_hours += hours
+            print(f"   → {slot_start.strftime('%I:%M %p')} - {slot_end.strftime('%I:%M %p')} ({hours:.1f} hours)")
+        print()
+    
+    if not slots_by_day:
+        print(f"❌ No common free slots (minimum {MIN_GAP_DURATION} hours)\n")
+    
+    print("="*60)
+    print(f"Total common free slots: {sum(len(slots) for slots in slots_by_day.values())}")
+    print(f"Total common free hours: {total_hours:.1f} hours")
+    print("="*60 + "\n")
+
 def main():
     print("\n" + "="*60)
     print("CALENDAR GAP FINDER - FIND FREE TIME SLOTS")
@@ -192,22 +194,32 @@ def main():
     print()
     
     # Authenticate
-    access_token = get_access_token_device_code()
+    access_token = get_access_token()
     
     if not access_token:
         print("❌ Authentication failed!")
         return
     
-    # Calculate date range
-    start_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    end_date = start_date + timedelta(days=DAYS_AHEAD)
+    # Calculate date range (local midnights in TIME_ZONE)
+    zone = event_records.get_zone(TIME_ZONE)
+    first_day = event_records.today(zone)
+    start_date = event_records.to_local(event_records.local_timestamp(first_day, 0, zone), zone)
+    end_date = event_records.to_local(event_records.local_timestamp(first_day + timedelta(days=DAYS_AHEAD), 0, zone), zone)
+    
+    if ATTENDEES:
+        print_common_free_time(access_token, start_date, end_date, zone)
+        return
     
     print(f"Fetching calendar events from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}...")
     
-    # Get all events in the range
-    events = get_calendar_events(access_token, start_date, end_date)
+    # Parse every event once, then merge busy time across the whole range
+    try:
+        events = free_time.sort_records(event_records.iter_records(get_calendar_events(access_token, start_date, end_date), zone))
+    except Exception as e:
+        print(f"❌ Could not read your calendar, no free time reported: {e}")
+        return
     
-    print(f"✓ Found {len(events)} events\n")
+    index = free_time.FreeTimeIndex(events, zone)
     
     print("="*60)
     print("FREE TIME SLOTS")
@@ -217,14 +229,13 @@ def main():
     total_free_hours = 0
     
     # Check each day
-    for day_offset in range(DAYS_AHEAD):
-        current_date = start_date + timedelta(days=day_offset)
+    for current_date, day_events in free_time.iter_days(events, first_day, DAYS_AHEAD, zone):
         
         # Skip weekends if desired (optional)
         # if current_date.weekday() >= 5:  # Saturday = 5, Sunday = 6
         #     continue
         
-        gaps, day_events = find_gaps_for_day(events, current_date)
+        gaps, day_events = find_gaps_for_day(index, day_events, current_date, zone)
         
         if gaps or day_events:
             print(f"📅 {current_date.strftime('%A, %B %d, %Y')}")
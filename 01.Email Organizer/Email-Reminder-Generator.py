@@ -1,7 +1,18 @@
-import requests
+import graph_client
+import graph_retry
+import token_cache
+import mail_sync
+import graph_batch
+import change_notifications
+import adaptive_polling
+import date_extraction
+import event_records
+from keyword_index import KeywordIndex
+from dedup_store import DedupStore, scoped_key
+from result_cache import ResultCache
 import time
-import re
-from datetime import datetime, timedelta
+import asyncio
+from datetime import datetime, timedelta, timezone
 
 # ============================================================
 # CONFIGURATION
@@ -10,185 +21,220 @@ from datetime import datetime, timedelta
 CLIENT_ID = "YOUR_CLIENT_ID"
 YOUR_EMAIL = "YOUR_EMAIL_ADDRESS"
 
+# Permissions requested at login (offline_access allows silent token refresh)
+SCOPES = "Mail.Read Tasks.ReadWrite Calendars.ReadWrite offline_access"
+
 # Keywords that trigger reminder creation
 REMINDER_KEYWORDS = ["deadline", "due", "reminder", "meeting set-up"]
 
+# Deadlines are looked for within this many characters of a keyword first
+DATE_SEARCH_RADIUS = 300
+
+# Each distinct deadline near a keyword gets its own reminder, up to this many per email
+MAX_DEADLINES_PER_EMAIL = 3
+
+# How to read numeric dates like 03/04/2026 that could be either way round:
+# "MDY" (April 3) or "DMY" (March 4). SENDER_DATE_ORDER overrides it by
+# sender address, "@domain" or ".tld" ending (the most specific one wins)
+DATE_ORDER = "MDY"
+SENDER_DATE_ORDER = {
+    ".uk": "DMY", ".ie": "DMY", ".au": "DMY", ".nz": "DMY", ".in": "DMY",
+    ".de": "DMY", ".fr": "DMY", ".es": "DMY", ".it": "DMY", ".nl": "DMY", ".br": "DMY"
+}
+
+# When the built-in rules find no date near a keyword, try a heavier
+# parser on the same text (None = off, "dateparser" needs: pip install dateparser)
+FALLBACK_DATE_PARSER = None
+
+# Deadlines found in an email are cached by a hash of it (in days)
+DATE_CACHE_DAYS = 30
+
 # How many days before the deadline to send reminder
 REMINDER_DAYS_BEFORE = 1
 
 # How often to check for new emails (in seconds)
 CHECK_INTERVAL = 300  # Check every 5 minutes
 
-# Track processed emails to avoid duplicates
-processed_emails = set()
+# Adapt the interval to how much mail arrives: checks come quicker during
+# busy hours and slower when it is quiet, starting from CHECK_INTERVAL and
+# staying between these bounds (in seconds). The chosen interval is kept
+# in ~/.email_organizer/<SYNC_STATE_NAME>.polling.json
+ADAPTIVE_POLLING = True
+MIN_CHECK_INTERVAL = 30
+MAX_CHECK_INTERVAL = 900
+
+# Subscription mode: Graph tells a small local receiver about new mail
+# instead of the script polling every CHECK_INTERVAL (polling takes over
+# while the subscription is down). NOTIFICATION_URL must be a public HTTPS
+# address forwarding to LISTEN_PORT on this machine, e.g. an ngrok or
+# devtunnel URL.
+SUBSCRIPTION_MODE = False
+NOTIFICATION_URL = "https://YOUR_PUBLIC_HOST/notifications"
+LISTEN_PORT = 8000
+
+# Send each check's tasks and reminder emails as $batch calls (20 per request)
+BATCH_WRITES = True
+
+# Messages per page requested from Graph (pages are followed automatically)
+PAGE_SIZE = 50
+
+# Name of the saved delta sync state (only changed messages are fetched each check)
+SYNC_STATE_NAME = "reminder_generator_inbox"
+
+# Let Graph's search pick out the emails with a keyword (since the last
+# check) instead of fetching every new email. Search matches whole words
+# and word starts, so "due" no longer finds "overdue"; set to False to
+# scan every new email locally as before (delta sync).
+# Limitation: each search only looks back mail_sync.SEARCH_INDEX_LAG
+# (10 minutes) before the last one, so an email that Graph indexes later
+# than that after it arrived is never found. Delta sync has no such gap
+SERVER_SEARCH = True
+
+# Fields read from each new email to decide if it is a candidate. The
+# full body is only fetched afterwards, as plain text, for the emails
+# that have a keyword in the subject or preview
+MESSAGE_FIELDS = "id,subject,bodyPreview,receivedDateTime,from"
+
+# How long to remember handled emails (in days)
+DEDUP_TTL_DAYS = 90
+
+# Track processed emails to avoid duplicates (kept on disk, survives restarts)
+processed_emails = DedupStore("reminder_generator_processed", ttl_days=DEDUP_TTL_DAYS)
+
+# Keyword index built once at startup (one scan per email, however many keywords)
+KEYWORD_INDEX = KeywordIndex(REMINDER_KEYWORDS)
+
+# Deadline finder: rules first, FALLBACK_DATE_PARSER only next to keywords
+DATE_EXTRACTOR = date_extraction.DateExtractor(
+    KEYWORD_INDEX, DATE_SEARCH_RADIUS, fallback=FALLBACK_DATE_PARSER,
+    cache=ResultCache("reminder_generator_dates", ttl_days=DATE_CACHE_DAYS),
+    default_order=DATE_ORDER, sender_orders=SENDER_DATE_ORDER
+)
+
+# The same keywords as a Graph search (KQL)
+SEARCH_QUERY = mail_sync.keywords_query(REMINDER_KEYWORDS)
 
 # ============================================================
 # AUTHENTICATION
 # ============================================================
 
-def get_access_token_device_code():
-    """Get access token using device code flow"""
+def get_access_token(interactive=True):
+    """Get a valid access token (cached and silently refreshed, device code login only when needed)
     
-    device_code_url = "https://login.microsoftonline.com/common/oauth2/v2.0/devicecode"
-    
-    data = {
-        "client_id": CLIENT_ID,
-        "scope": "Mail.Read Tasks.ReadWrite Calendars.ReadWrite offline_access"
-    }
+    The monitoring loop passes interactive=False: if the refresh token stops
+    working it reports the failure rather than blocking on a login prompt.
+    """
     
-    print("Requesting authentication...")
-    
-    try:
-        response = requests.post(device_code_url, data=data)
-        response.raise_for_status()
-        device_code_response = response.json()
-        
-        if 'error' in device_code_response or 'message' not in device_code_response:
-            print(f"\n❌ Authentication error")
-            return None
-        
-    except requests.exceptions.RequestException as e:
-        print(f"\n❌ Network error: {e}")
-        return None
-    
-    print("\n" + "="*60)
-    print("AUTHENTICATION REQUIRED")
-    print("="*60)
-    print(f"\n{device_code_response['message']}\n")
-    print(f"User Code: {device_code_response['user_code']}")
-    print(f"Visit: {device_code_response['verification_uri']}")
-    print("\nWaiting for authentication...")
-    print("="*60 + "\n")
-    
-    token_url = "https://login.microsoftonline.com/common/oauth2/v2.0/token"
-    
-    token_data = {
-        "grant_type": "urn:ietf:params:oauth:grant-type:device_code",
-        "client_id": CLIENT_ID,
-        "device_code": device_code_response['device_code']
-    }
-    
-    while True:
-        try:
-            token_response = requests.post(token_url, data=token_data)
-            token_result = token_response.json()
-            
-            if "access_token" in token_result:
-                print("✓ Authentication successful!\n")
-                return token_result["access_token"]
-            elif token_result.get("error") == "authorization_pending":
-                print(".", end="", flush=True)
-                time.sleep(5)
-            else:
-                print(f"\n❌ Error: {token_result.get('error_description', 'Unknown error')}")
-                return None
-        except Exception as e:
-            print(f"\n❌ Error: {e}")
-            return None
+    return token_cache.get_token_manager(CLIENT_ID, SCOPES).get_token(interactive)
 
 # ============================================================
 # EMAIL FUNCTIONS
 # ============================================================
 
-def get_recent_emails(access_token, max_emails=20):
-    """Get recent emails from inbox"""
+def start_check(access_token):
+    """The search or delta round for one check; save() it once its emails are handled"""
     
-    url = "https://graph.microsoft.com/v1.0/me/mailFolders/inbox/messages"
+    if SERVER_SEARCH:
+        return mail_sync.SearchRound(access_token, SYNC_STATE_NAME, MESSAGE_FIELDS, SEARCH_QUERY, page_size=PAGE_SIZE)
     
-    params = {
-        "$top": max_emails,
-        "$select": "id,subject,bodyPreview,body,receivedDateTime,from",
-        "$orderby": "receivedDateTime DESC"
-    }
+    return mail_sync.DeltaRound(access_token, SYNC_STATE_NAME, MESSAGE_FIELDS, page_size=PAGE_SIZE)
+
+def get_recent_emails(check_round):
+    """Get emails that arrived since the last check (keyword search, or every change with delta sync)
     
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
+    Returns None if the mailbox could not be read (throttled or failed), so
+    a failed check is never mistaken for an empty inbox.
+    """
     
     try:
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code == 200:
-            return response.json().get('value', [])
-        else:
-            print(f"❌ Error fetching emails: {response.status_code}")
-            return []
+        return list(check_round)
+    except graph_retry.GraphThrottledError as e:
+        print(f"⚠️  Graph is throttling this mailbox, skipping this check: {e}")
+        return None
     except Exception as e:
         print(f"❌ Error: {e}")
-        return []
+        return None
 
-def extract_dates_from_text(text):
-    """Extract potential dates from email text"""
+def count_new_emails(access_token, since):
+    """How many emails arrived since a Unix time (for adaptive polling: searches only return keyword hits)"""
     
-    dates = []
+    if since is None:
+        return 0
     
-    # Common date patterns
-    patterns = [
-        r'\b(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})\b',  # MM/DD/YYYY or DD-MM-YYYY
-        r'\b(\d{4})[/-](\d{1,2})[/-](\d{1,2})\b',    # YYYY-MM-DD
-        r'\b(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]* (\d{1,2}),? (\d{4})\b',  # Month DD, YYYY
-        r'\b(\d{1,2}) (Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]* (\d{4})\b',  # DD Month YYYY
-    ]
+    try:
+        return mail_sync.count_received(access_token, datetime.fromtimestamp(since, timezone.utc))
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return None
+
+def fetch_bodies(access_token, emails, base="/me"):
+    """Add each email's full body (as plain text), 20 to a $batch call
     
-    month_map = {
-        'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
-        'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
-    }
+    Emails whose body could not be fetched keep just their preview.
+    """
     
-    for pattern in patterns:
-        matches = re.finditer(pattern, text, re.IGNORECASE)
-        for match in matches:
-            try:
-                groups = match.groups()
-                
-                if len(groups) == 3:
-                    if groups[0].isdigit() and groups[1].isdigit():
-                        # Numeric date format
-                        if len(groups[0]) == 4:  # YYYY-MM-DD
-                            year, month, day = int(groups[0]), int(groups[1]), int(groups[2])
-                        else:  # MM/DD/YYYY or DD/MM/YYYY - assume MM/DD/YYYY
-                            month, day, year = int(groups[0]), int(groups[1]), int(groups[2])
-                            if year < 100:
-                                year += 2000
-                    else:
-                        # Month name format
-                        if groups[0].isdigit():  # DD Month YYYY
-                            day = int(groups[0])
-                            month = month_map.get(groups[1][:3].lower())
-                            year = int(groups[2])
-                        else:  # Month DD, YYYY
-                            month = month_map.get(groups[0][:3].lower())
-                            day = int(groups[1])
-                            year = int(groups[2])
-                    
-                    date = datetime(year, month, day)
-                    if date >= datetime.now():  # Only future dates
-                        dates.append(date)
-            except (ValueError, TypeError):
-                continue
+    queue = graph_batch.BatchQueue(access_token)
+    headers = {"Prefer": 'outlook.body-content-type="text"'}
+    gets = [queue.add("GET", f"{base}/messages/{email['id']}?$select=body", headers=headers) for email in emails]
+    queue.flush()
+    
+    for email, get in zip(emails, gets):
+        if get.ok and get.response:
+            email['body'] = get.response.get('body')
+        else:
+            print(f"⚠️  Could not fetch the body of {email.get('subject', 'No Subject')[:40]} ({get.status})")
+    
+    return emails
+
+def extract_dates_from_text(text, limit=None):
+    """Extract future dates from email text, in the order they appear (numeric dates read in DATE_ORDER)"""
     
-    return dates
+    return date_extraction.extract_dates(text, limit=limit, day_first=DATE_ORDER.upper() == "DMY")
 
 def check_for_keywords(email):
     """Check if email contains reminder keywords"""
     
-    subject = email.get('subject', '').lower()
-    body = email.get('bodyPreview', '').lower()
+    return KEYWORD_INDEX.matches_any(email.get('subject') or '', email.get('bodyPreview') or '')
+
+def find_deadline_dates(email, text):
+    """Upcoming deadlines next to the reminder keywords, else the first date anywhere in the email
+    
+    Relative dates ("by Friday", "EOD tomorrow") count from when the email
+    was received; numeric dates are read in the sender's date order.
+    """
+    
+    sender = ((email.get('from') or {}).get('emailAddress') or {}).get('address')
+    
+    return DATE_EXTRACTOR.deadlines(text, email.get('receivedDateTime'), sender, limit=MAX_DEADLINES_PER_EMAIL)
+
+def format_deadline(date, date_format='%B %d, %Y'):
+    """A deadline for display, with its time of day when one was given"""
+    
+    if date.hour or date.minute:
+        return date.strftime(date_format + ' at %I:%M %p')
+    
+    return date.strftime(date_format)
+
+def describe_deadline(deadline):
+    """A found deadline for the console, with the end of a range and the words it came from"""
+    
+    text = format_deadline(deadline.date)
     
-    for keyword in REMINDER_KEYWORDS:
-        if keyword.lower() in subject or keyword.lower() in body:
-            return True
+    if deadline.until:
+        text += " - " + format_deadline(deadline.until)
     
-    return False
+    return f"{text} (\"{deadline.text.strip()}\")"
 
 # ============================================================
 # REMINDER FUNCTIONS
 # ============================================================
 
-def create_outlook_reminder(access_token, subject, date, email_subject):
-    """Create a reminder/task in Outlook"""
+def build_reminder_task(subject, date, email_subject):
+    """Build the Outlook task payload for a reminder
     
-    url = "https://graph.microsoft.com/v1.0/me/outlook/tasks"
+    Deadlines are naive local times (a time of day as the email wrote it),
+    so they are converted to UTC before being sent as UTC.
+    """
     
     reminder_date = date - timedelta(days=REMINDER_DAYS_BEFORE)
     
@@ -196,42 +242,44 @@ def create_outlook_reminder(access_token, subject, date, email_subject):
         "subject": subject,
         "body": {
             "contentType": "text",
-            "content": f"Reminder for: {email_subject}\nDeadline: {date.strftime('%B %d, %Y')}"
+            "content": f"Reminder for: {email_subject}\nDeadline: {format_deadline(date)}"
         },
         "dueDateTime": {
-            "dateTime": date.isoformat(),
+            "dateTime": event_records.utc_text(date),
             "timeZone": "UTC"
         },
         "reminderDateTime": {
-            "dateTime": reminder_date.isoformat(),
+            "dateTime": event_records.utc_text(reminder_date),
             "timeZone": "UTC"
         },
         "importance": "high"
     }
     
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
+    return task_data
+
+def create_outlook_reminder(access_token, subject, date, email_subject, base="/me"):
+    """Create a reminder/task in Outlook"""
+    
+    url = f"{base}/outlook/tasks"
+    
+    task_data = build_reminder_task(subject, date, email_subject)
     
     try:
-        response = requests.post(url, headers=headers, json=task_data)
+        response = graph_client.graph_post(access_token, url, json=task_data)
         return response.status_code == 201
     except Exception as e:
         print(f"❌ Error creating reminder: {e}")
         return False
 
-def send_reminder_email(access_token, subject, date, email_subject):
-    """Send reminder email to yourself"""
-    
-    url = "https://graph.microsoft.com/v1.0/me/sendMail"
+def build_reminder_email(subject, date, email_subject, to_address=None):
+    """Build the sendMail payload for a reminder email to yourself (or to_address)"""
     
     reminder_date = date - timedelta(days=REMINDER_DAYS_BEFORE)
     
     message_body = f"""This is an automated reminder.
 
 Subject: {email_subject}
-Deadline: {date.strftime('%A, %B %d, %Y')}
+Deadline: {format_deadline(date, '%A, %B %d, %Y')}
 
 You will be reminded on: {reminder_date.strftime('%A, %B %d, %Y')}
 
@@ -248,25 +296,176 @@ This reminder was automatically created by the Reminder Generator script.
             "toRecipients": [
                 {
                     "emailAddress": {
-                        "address": YOUR_EMAIL
+                        "address": to_address or YOUR_EMAIL
                     }
                 }
             ]
         }
     }
     
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
+    return email_data
+
+def send_reminder_email(access_token, subject, date, email_subject, base="/me", to_address=None):
+    """Send reminder email to yourself"""
+    
+    url = f"{base}/sendMail"
+    
+    email_data = build_reminder_email(subject, date, email_subject, to_address)
     
     try:
-        response = requests.post(url, headers=headers, json=email_data)
+        response = graph_client.graph_post(access_token, url, json=email_data)
         return response.status_code == 202
     except Exception as e:
         print(f"❌ Error sending email: {e}")
         return False
 
+def queue_reminder(queue, subject, date, email_subject, base="/me", to_address=None):
+    """Queue the task and reminder email for one deadline in a $batch"""
+    
+    task = queue.add("POST", f"{base}/outlook/tasks", body=build_reminder_task(subject, date, email_subject))
+    email = queue.add("POST", f"{base}/sendMail", body=build_reminder_email(subject, date, email_subject, to_address))
+    
+    return task, email
+
+def report_queued_reminders(queued):
+    """Print the outcome of flushed reminders, returns (tasks created, ids of emails whose tasks failed)"""
+    
+    created = 0
+    failed_ids = set()
+    
+    for task, email, email_subject, email_id in queued:
+        if task.ok:
+            created += 1
+            print(f"  ✓ Reminder created in Outlook Tasks: {email_subject[:40]}")
+        else:
+            failed_ids.add(email_id)
+            print(f"  ❌ Failed to create reminder ({task.status}): {email_subject[:40]}")
+        
+        if email.ok:
+            print(f"  ✓ Reminder email sent: {email_subject[:40]}")
+    
+    return created, failed_ids
+
+def process_emails(access_token, emails, base="/me", to_address=None):
+    """Create reminders for the emails with a keyword and a deadline. Returns (reminders created, failed)
+    
+    With BATCH_WRITES the tasks and reminder emails are sent together as
+    $batch calls. `base` is the mailbox the emails came from ("/me" or
+    "/users/{id}"); reminder emails go to to_address (default YOUR_EMAIL).
+    An email is only marked processed once all its tasks were created, so
+    one whose task failed is tried again when it is next handed out.
+    """
+    
+    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    reminders_created = 0
+    failed = 0
+    
+    # Writes for this check are sent together as $batch calls
+    queue = graph_batch.BatchQueue(access_token) if BATCH_WRITES else None
+    queued = []
+    queued_ids = []
+    
+    for email in emails:
+        email_id = scoped_key(email.get('id'), base)
+        
+        # Skip if already processed
+        if email_id in processed_emails:
+            continue
+        
+        subject = email.get('subject', 'No Subject')
+        body_preview = email.get('bodyPreview', '')
+        full_body = date_extraction.body_text(email)  # HTML tags stripped
+        
+        # Check if email contains reminder keywords
+        if check_for_keywords(email):
+            print(f"\n[{current_time}] 📧 Found potential reminder:")
+            print(f"  Subject: {subject}")
+            
+            # Every distinct deadline near a keyword (cached per email)
+            deadlines = find_deadline_dates(email, subject + " " + body_preview + " " + full_body)
+            
+            email_failed = False
+            
+            if deadlines:
+                for deadline in deadlines:
+                    date = deadline.date
+                    print(f"  Deadline found: {describe_deadline(deadline)}")
+                    
+                    # Create reminder
+                    reminder_subject = f"Deadline: {subject[:50]}"
+                    
+                    if queue is not None:
+                        task, reminder_email = queue_reminder(queue, reminder_subject, date, subject, base, to_address)
+                        queued.append((task, reminder_email, subject, email_id))
+                        continue
+                    
+                    if create_outlook_reminder(access_token, reminder_subject, date, subject, base):
+                        reminders_created += 1
+                        print(f"  ✓ Reminder created in Outlook Tasks")
+                    else:
+                        failed += 1
+                        email_failed = True
+                    
+                    if send_reminder_email(access_token, reminder_subject, date, subject, base, to_address):
+                        print(f"  ✓ Reminder email sent")
+            else:
+                print(f"  ⚠️  No date found in email - skipping")
+            
+            if deadlines and queue is not None:
+                queued_ids.append(email_id)
+            elif not email_failed:
+                processed_emails.add(email_id)
+    
+    if queued:
+        queue.flush()
+        created, failed_ids = report_queued_reminders(queued)
+        reminders_created += created
+        failed += len(queued) - created
+        
+        for email_id in queued_ids:
+            if email_id not in failed_ids:
+                processed_emails.add(email_id)
+    
+    return reminders_created, failed
+
+def select_candidates(emails, base="/me"):
+    """Emails not handled yet with a keyword in the subject or preview"""
+    
+    return [
+        email for email in emails
+        if scoped_key(email.get('id'), base) not in processed_emails and check_for_keywords(email)
+    ]
+
+def check_emails(access_token, emails, base="/me", to_address=None):
+    """Fetch the bodies of the candidate emails only, then create their reminders. Returns (created, failed)"""
+    
+    candidates = select_candidates(emails, base)
+    
+    if not candidates:
+        return 0, 0
+    
+    fetch_bodies(access_token, candidates, base)
+    
+    return process_emails(access_token, candidates, base, to_address)
+
+def require_reminders_created(created, failed):
+    """Raise GraphError if any reminder failed, so the check is not saved and they are retried"""
+    
+    if failed:
+        raise graph_client.GraphError(f"{failed} reminder(s) could not be created")
+    
+    return created
+
+def create_reminders(access_token, emails):
+    """Create reminders from the emails a check fetched (subscription mode). Returns reminders created"""
+    
+    return require_reminders_created(*check_emails(access_token, emails))
+
+def handle_messages(access_token, mailbox, messages):
+    """Mailbox daemon handler: create reminders from the messages one check fetched"""
+    
+    return require_reminders_created(*check_emails(access_token, messages, mailbox.base, mailbox.user))
+
 # ============================================================
 # MAIN SCRIPT
 # ============================================================
@@ -278,13 +477,18 @@ def main():
     
     print(f"✓ Client ID configured")
     print(f"✓ Your email: {YOUR_EMAIL}")
-    print(f"✓ Keywords: {', '.join(REMINDER_KEYWORDS)}")
+    print(f"✓ Keywords: {', '.join(REMINDER_KEYWORDS)}{' (searched by Graph)' if SERVER_SEARCH else ''}")
     print(f"✓ Reminder: {REMINDER_DAYS_BEFORE} day(s) before deadline")
-    print(f"✓ Check interval: Every {CHECK_INTERVAL} seconds")
+    if SUBSCRIPTION_MODE:
+        print(f"✓ Subscription mode: notifications to {NOTIFICATION_URL} (port {LISTEN_PORT})")
+    elif ADAPTIVE_POLLING:
+        print(f"✓ Check interval: Adaptive, {MIN_CHECK_INTERVAL}-{MAX_CHECK_INTERVAL} seconds (starting at {CHECK_INTERVAL})")
+    else:
+        print(f"✓ Check interval: Every {CHECK_INTERVAL} seconds")
     print()
     
     # Authenticate
-    access_token = get_access_token_device_code()
+    access_token = get_access_token()
     
     if not access_token:
         print("❌ Authentication failed!")
@@ -295,63 +499,79 @@ def main():
     print("="*60)
     print("Press Ctrl+C to stop\n")
     
+    if SUBSCRIPTION_MODE:
+        runner = change_notifications.SubscriptionRunner(
+            lambda: get_access_token(interactive=False), create_reminders, start_check, MESSAGE_FIELDS, NOTIFICATION_URL,
+            port=LISTEN_PORT, name=SYNC_STATE_NAME, poll_interval=CHECK_INTERVAL
+        )
+        
+        try:
+            asyncio.run(runner.run())
+        except KeyboardInterrupt:
+            pass
+        
+        print("\n\n" + "="*60)
+        print("STOPPED BY USER")
+        print("="*60)
+        print(f"Total reminders created: {runner.actions}")
+        print("="*60 + "\n")
+        return
+    
     reminders_created = 0
     check_count = 0
     
+    # Learns the mail arrival rate and picks each next interval from it
+    poller = None
+    if ADAPTIVE_POLLING:
+        poller = adaptive_polling.AdaptivePoller(SYNC_STATE_NAME, CHECK_INTERVAL, MIN_CHECK_INTERVAL, MAX_CHECK_INTERVAL)
+    interval = poller.interval if poller else CHECK_INTERVAL
+    
     try:
         while True:
             check_count += 1
             current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
+            # Cached token, refreshed shortly before it expires (never prompts)
+            access_token = get_access_token(interactive=False)
+            if not access_token:
+                print(f"[{current_time}] ❌ Could not renew access token - retrying next check")
+                time.sleep(interval)
+                continue
+            
             # Get recent emails
-            emails = get_recent_emails(access_token)
+            check_round = start_check(access_token)
+            emails = get_recent_emails(check_round)
+            if emails is None:
+                print(f"[{current_time}] ❌ Could not check the inbox - retrying next check")
+                time.sleep(interval)
+                continue
             
-            if emails:
-                for email in emails:
-                    email_id = email.get('id')
-                    
-                    # Skip if already processed
-                    if email_id in processed_emails:
-                        continue
-                    
-                    subject = email.get('subject', 'No Subject')
-                    body_preview = email.get('bodyPreview', '')
-                    full_body = email.get('body', {}).get('content', '')
-                    
-                    # Check if email contains reminder keywords
-                    if check_for_keywords(email):
-                        print(f"\n[{current_time}] 📧 Found potential reminder:")
-                        print(f"  Subject: {subject}")
-                        
-                        # Extract dates from email
-                        dates = extract_dates_from_text(subject + " " + body_preview + " " + full_body)
-                        
-                        if dates:
-                            for date in dates[:1]:  # Use first date found
-                                print(f"  Deadline found: {date.strftime('%B %d, %Y')}")
-                                
-                                # Create reminder
-                                reminder_subject = f"Deadline: {subject[:50]}"
-                                
-                                if create_outlook_reminder(access_token, reminder_subject, date, subject):
-                                    reminders_created += 1
-                                    print(f"  ✓ Reminder created in Outlook Tasks")
-                                
-                                if send_reminder_email(access_token, reminder_subject, date, subject):
-                                    print(f"  ✓ Reminder email sent")
-                                
-                                print(f"  Total reminders: {reminders_created}")
-                        else:
-                            print(f"  ⚠️  No date found in email - skipping")
-                        
-                        processed_emails.add(email_id)
+            created, failed = check_emails(access_token, emails)
+            
+            if created:
+                reminders_created += created
+                print(f"  Total reminders: {reminders_created}")
+            
+            if failed:
+                # Not saving the search/delta state hands these emails out again next check
+                print(f"  ❌ Failed to create reminders: {failed} (retrying next check)")
+            else:
+                check_round.save()
+            
+            # The arrival rate counts every new email, not just the candidates
+            if poller and SERVER_SEARCH:
+                arrivals = count_new_emails(access_token, poller.last_check)
+                if arrivals is not None:
+                    interval = poller.record(arrivals)
+            elif poller:
+                interval = poller.record_messages(emails)
             
             if check_count % 10 == 0:
-                print(f"[{current_time}] Checked emails. Total reminders created: {reminders_created}")
+                print(f"[{current_time}] Checked emails. Total reminders created: {reminders_created}. Next check in {interval:.0f}s")
             
             # Wait before next check
-            time.sleep(CHECK_INTERVAL)
-            
+            time.sleep(interval)
+    
     except KeyboardInterrupt:
         print("\n\n" + "="*60)
         print("STOPPED BY USER")
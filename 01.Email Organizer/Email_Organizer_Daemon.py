@@ -0,0 +1,168 @@
+import token_cache
+import mail_daemon
+import importlib
+import importlib.util
+import os
+import signal
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+CLIENT_ID = "YOUR_CLIENT_ID"
+
+# Permissions requested at login (offline_access allows silent token refresh).
+# Everything the handlers need; the .Shared scopes cover MAILBOXES that
+# have been shared with you.
+SCOPES = ("Mail.ReadWrite Mail.Send Tasks.ReadWrite "
+          "Mail.ReadWrite.Shared Mail.Send.Shared Tasks.ReadWrite.Shared offline_access")
+
+# Mailboxes to serve, by address (empty = just your own). You need full
+# access to each one.
+MAILBOXES = []
+
+# Handlers run on each mailbox's new emails, in this order:
+#   "auto_reply" - Email_Response_Bot (vacation auto-replies)
+#   "reminders"  - Email-Reminder-Generator (tasks for deadlines)
+#   "sort"       - Auto_Sort_Outlook_Emails (moves emails into folders)
+# Each handler uses the settings at the top of its own script. Keep
+# "sort" last: a moved email is no longer in the inbox for the others.
+HANDLERS = ["auto_reply", "reminders", "sort"]
+
+# How often each mailbox is checked (in seconds)
+CHECK_INTERVAL = 300  # Check every 5 minutes
+
+# Give each mailbox its own interval, following how much mail it gets:
+# quicker when busy, slower when quiet, starting from CHECK_INTERVAL and
+# staying between these bounds (in seconds)
+ADAPTIVE_POLLING = True
+MIN_CHECK_INTERVAL = 30
+MAX_CHECK_INTERVAL = 900
+
+# Mailboxes checked at the same time
+MAILBOX_WORKERS = 8
+
+# On a mailbox's first check, handle emails received this many days back
+BACKLOG_DAYS = 1
+
+# ============================================================
+# AUTHENTICATION
+# ============================================================
+
+def get_access_token(mailbox=None, interactive=False):
+    """Get a valid access token (cached and silently refreshed)
+    
+    Only the login at startup may prompt; inside the daemon a failed refresh
+    is reported as a failed check instead of blocking the worker.
+    """
+    
+    return token_cache.get_token_manager(CLIENT_ID, SCOPES).get_token(interactive)
+
+# ============================================================
+# HANDLERS
+# ============================================================
+
+def load_script(filename, module_name):
+    """Import a script next to this one whose file name is not a valid module name"""
+    
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    
+    return module
+
+# Handler name -> function importing the script that provides it
+HANDLER_SCRIPTS = {
+    "auto_reply": lambda: importlib.import_module("Email_Response_Bot"),
+    "reminders": lambda: load_script("Email-Reminder-Generator.py", "email_reminder_generator"),
+    "sort": lambda: importlib.import_module("Auto_Sort_Outlook_Emails")
+}
+
+def register_handlers(daemon, names):
+    """Import each handler's script and register its handle_messages"""
+    
+    for name in names:
+        if name not in HANDLER_SCRIPTS:
+            print(f"⚠️  Unknown handler {name!r} (choose from {', '.join(HANDLER_SCRIPTS)}) - skipped")
+            continue
+        
+        script = HANDLER_SCRIPTS[name]()
+        
+        # A dry run only previews; the daemon would still save its delta state
+        if getattr(script, "DRY_RUN", False):
+            print(f"⚠️  Handler {name!r} has DRY_RUN = True - skipped (dry runs only work standalone)")
+            continue
+        
+        daemon.register(name, script.handle_messages, script.MESSAGE_FIELDS)
+        print(f"✓ Handler: {name}")
+
+# ============================================================
+# MAIN SCRIPT
+# ============================================================
+
+def main():
+    print("\n" + "="*60)
+    print("EMAIL ORGANIZER DAEMON")
+    print("="*60 + "\n")
+    
+    daemon = mail_daemon.MailDaemon(
+        get_access_token, workers=MAILBOX_WORKERS, interval=CHECK_INTERVAL, initial_days=BACKLOG_DAYS,
+        adaptive=ADAPTIVE_POLLING, min_interval=MIN_CHECK_INTERVAL, max_interval=MAX_CHECK_INTERVAL
+    )
+    
+    print(f"✓ Client ID configured")
+    register_handlers(daemon, HANDLERS)
+    print(f"✓ Mailboxes: {', '.join(MAILBOXES) if MAILBOXES else 'your own'}")
+    if ADAPTIVE_POLLING:
+        print(f"✓ Check interval: Adaptive, {MIN_CHECK_INTERVAL}-{MAX_CHECK_INTERVAL} seconds per mailbox ({MAILBOX_WORKERS} at a time)")
+    else:
+        print(f"✓ Check interval: Every {CHECK_INTERVAL} seconds ({MAILBOX_WORKERS} mailboxes at a time)")
+    print()
+    
+    if not daemon.handlers:
+        print("❌ No handlers configured!")
+        return
+    
+    # Authenticate
+    if not get_access_token(interactive=True):
+        print("❌ Authentication failed!")
+        return
+    
+    for user in MAILBOXES or [None]:
+        daemon.add_mailbox(user)
+    
+    # A service manager stops the daemon with SIGTERM; finish the running checks first
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+    
+    print("="*60)
+    print("MONITORING MAILBOXES")
+    print("="*60)
+    print("Press Ctrl+C to stop\n")
+    
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        daemon.stop()
+    
+    metrics = daemon.metrics()
+    
+    print("\n\n" + "="*60)
+    print("STOPPED")
+    print("="*60)
+    print(f"Mailbox checks: {metrics['fetches']}")
+    for name, _, _ in daemon.handlers:
+        print(f"{name}: {metrics['actions'].get(name, 0)} action(s), {metrics['failures'].get(name, 0)} failure(s)")
+    print("="*60 + "\n")
+
+if __name__ == "__main__":
+    # Runs unattended, so errors are printed without waiting for Enter
+    try:
+        main()
+    except Exception as e:
+        print("\n" + "="*60)
+        print("ERROR OCCURRED")
+        print("="*60)
+        print(f"\n{type(e).__name__}: {str(e)}\n")
+        import traceback
+        traceback.print_exc()
@@ -1,5 +1,13 @@
-import requests
+import graph_client
+import graph_retry
+import token_cache
+import mail_sync
+import graph_batch
+import change_notifications
+import adaptive_polling
+from dedup_store import DedupStore, scoped_key
 import time
+import asyncio
 from datetime import datetime
 
 # ============================================================
@@ -8,6 +16,9 @@ from datetime import datetime
 
 CLIENT_ID = "YOUR_CLIENT_ID"
 
+# Permissions requested at login (offline_access allows silent token refresh)
+SCOPES = "Mail.ReadWrite Mail.Send offline_access"
+
 # Auto-reply settings
 AUTO_REPLY_ENABLED = False  # Set to True to enable auto-replies
 AUTO_REPLY_MESSAGE = """Greetings {sender_name},
@@ -21,109 +32,85 @@ Kindest Regards."""
 # How often to check for new emails (in seconds)
 CHECK_INTERVAL = 300  # Check every 5 minutes
 
-# Track replied emails to avoid duplicate responses
-replied_emails = set()
+# Adapt the interval to how much mail arrives: checks come quicker during
+# busy hours and slower when it is quiet, starting from CHECK_INTERVAL and
+# staying between these bounds (in seconds). The chosen interval is kept
+# in ~/.email_organizer/<SYNC_STATE_NAME>.polling.json
+ADAPTIVE_POLLING = True
+MIN_CHECK_INTERVAL = 30
+MAX_CHECK_INTERVAL = 900
+
+# Subscription mode: Graph tells a small local receiver about new mail
+# instead of the script polling every CHECK_INTERVAL (polling takes over
+# while the subscription is down). NOTIFICATION_URL must be a public HTTPS
+# address forwarding to LISTEN_PORT on this machine, e.g. an ngrok or
+# devtunnel URL.
+SUBSCRIPTION_MODE = False
+NOTIFICATION_URL = "https://YOUR_PUBLIC_HOST/notifications"
+LISTEN_PORT = 8000
+
+# Send replies and mark-reads as $batch calls (20 per request) in serial mode
+BATCH_WRITES = True
+
+# Handle each check's emails concurrently (needs: pip install aiohttp)
+ASYNC_MODE = False
+MAX_CONCURRENT_REQUESTS = 10  # Requests in flight at once in async mode
+
+# Messages per page requested from Graph (pages are followed automatically)
+PAGE_SIZE = 50
+
+# Name of the saved delta sync state (only changed messages are fetched each check)
+SYNC_STATE_NAME = "response_bot_inbox"
+
+# Fields the bot reads from each message
+MESSAGE_FIELDS = "id,subject,from,receivedDateTime,conversationId,isRead"
+
+# How long to remember handled emails (in days)
+DEDUP_TTL_DAYS = 30
+
+# Track replied emails to avoid duplicate responses (kept on disk, survives restarts)
+replied_emails = DedupStore("response_bot_replied", ttl_days=DEDUP_TTL_DAYS)
 
 # ============================================================
 # AUTHENTICATION
 # ============================================================
 
-def get_access_token_device_code():
-    """Get access token using device code flow"""
-    
-    device_code_url = "https://login.microsoftonline.com/common/oauth2/v2.0/devicecode"
-    
-    data = {
-        "client_id": CLIENT_ID,
-        "scope": "Mail.ReadWrite Mail.Send offline_access"
-    }
+def get_access_token(interactive=True):
+    """Get a valid access token (cached and silently refreshed, device code login only when needed)
     
-    print("Requesting authentication...")
+    The monitoring loop passes interactive=False: if the refresh token stops
+    working it reports the failure rather than blocking on a login prompt.
+    """
     
-    try:
-        response = requests.post(device_code_url, data=data)
-        response.raise_for_status()
-        device_code_response = response.json()
-        
-        if 'error' in device_code_response or 'message' not in device_code_response:
-            print(f"\n❌ Authentication error")
-            return None
-        
-    except requests.exceptions.RequestException as e:
-        print(f"\n❌ Network error: {e}")
-        return None
-    
-    print("\n" + "="*60)
-    print("AUTHENTICATION REQUIRED")
-    print("="*60)
-    print(f"\n{device_code_response['message']}\n")
-    print(f"User Code: {device_code_response['user_code']}")
-    print(f"Visit: {device_code_response['verification_uri']}")
-    print("\nWaiting for authentication...")
-    print("="*60 + "\n")
-    
-    token_url = "https://login.microsoftonline.com/common/oauth2/v2.0/token"
-    
-    token_data = {
-        "grant_type": "urn:ietf:params:oauth:grant-type:device_code",
-        "client_id": CLIENT_ID,
-        "device_code": device_code_response['device_code']
-    }
-    
-    while True:
-        try:
-            token_response = requests.post(token_url, data=token_data)
-            token_result = token_response.json()
-            
-            if "access_token" in token_result:
-                print("✓ Authentication successful!\n")
-                return token_result["access_token"]
-            elif token_result.get("error") == "authorization_pending":
-                print(".", end="", flush=True)
-                time.sleep(5)
-            else:
-                print(f"\n❌ Error: {token_result.get('error_description', 'Unknown error')}")
-                return None
-        except Exception as e:
-            print(f"\n❌ Error: {e}")
-            return None
+    return token_cache.get_token_manager(CLIENT_ID, SCOPES).get_token(interactive)
 
 # ============================================================
 # EMAIL FUNCTIONS
 # ============================================================
 
-def get_unread_emails(access_token, max_emails=20):
-    """Get unread emails from inbox"""
-    
-    url = "https://graph.microsoft.com/v1.0/me/mailFolders/inbox/messages"
+def start_check(access_token):
+    """The delta round for one check; save() it once its emails are handled"""
     
-    params = {
-        "$top": max_emails,
-        "$filter": "isRead eq false",
-        "$select": "id,subject,from,receivedDateTime,conversationId",
-        "$orderby": "receivedDateTime DESC"
-    }
+    return mail_sync.DeltaRound(access_token, SYNC_STATE_NAME, MESSAGE_FIELDS, page_size=PAGE_SIZE)
+
+def get_unread_emails(delta_round):
+    """Get unread emails that arrived or changed since the last check (delta sync)
     
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
+    Returns None if the inbox could not be read (throttled or failed), so
+    a failed check is never mistaken for an empty inbox.
+    """
     
     try:
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code == 200:
-            return response.json().get('value', [])
-        else:
-            print(f"❌ Error fetching emails: {response.status_code}")
-            return []
+        return [email for email in delta_round if not email.get('isRead')]
+    except graph_retry.GraphThrottledError as e:
+        print(f"⚠️  Graph is throttling this mailbox, skipping this check: {e}")
+        return None
     except Exception as e:
         print(f"❌ Error: {e}")
-        return []
+        return None
 
-def send_auto_reply(access_token, to_email, to_name, subject):
-    """Send automatic reply to email"""
-    
-    url = "https://graph.microsoft.com/v1.0/me/sendMail"
+def build_auto_reply(to_email, to_name, subject):
+    """Build the sendMail payload for an auto-reply"""
     
     # Format the message with sender's name
     message_body = AUTO_REPLY_MESSAGE.format(sender_name=to_name)
@@ -146,37 +133,214 @@ def send_auto_reply(access_token, to_email, to_name, subject):
         }
     }
     
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
+    return email_data
+
+def send_auto_reply(access_token, to_email, to_name, subject, base="/me"):
+    """Send automatic reply to email"""
+    
+    url = f"{base}/sendMail"
+    
+    email_data = build_auto_reply(to_email, to_name, subject)
     
     try:
-        response = requests.post(url, headers=headers, json=email_data)
+        response = graph_client.graph_post(access_token, url, json=email_data)
         return response.status_code == 202
     except Exception as e:
         print(f"❌ Error sending reply: {e}")
         return False
 
-def mark_as_read(access_token, email_id):
+def mark_as_read(access_token, email_id, base="/me"):
     """Mark email as read"""
     
-    url = f"https://graph.microsoft.com/v1.0/me/messages/{email_id}"
-    
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
+    url = f"{base}/messages/{email_id}"
     
     data = {"isRead": True}
     
     try:
-        response = requests.patch(url, headers=headers, json=data)
+        response = graph_client.graph_patch(access_token, url, json=data)
         return response.status_code == 200
     except Exception as e:
         print(f"❌ Error marking as read: {e}")
         return False
 
+def describe_email(email):
+    """Pull the fields the bot needs out of a Graph message"""
+    
+    sender = email.get('from', {}).get('emailAddress', {})
+    
+    return (
+        email.get('id'),
+        email.get('conversationId'),
+        email.get('subject', 'No Subject'),
+        sender.get('address', 'Unknown'),
+        sender.get('name', 'Unknown')
+    )
+
+def process_emails(access_token, unread_emails, base="/me"):
+    """Reply to and mark read each new email. Returns (replies sent, replies failed)
+    
+    With BATCH_WRITES the replies and mark-reads are queued and sent as
+    $batch calls; each mark-read depends on its reply succeeding. `base`
+    is the mailbox the emails came from ("/me" or "/users/{id}").
+    """
+    
+    replies_sent = 0
+    failed = 0
+    queue = graph_batch.BatchQueue(access_token) if BATCH_WRITES else None
+    queued = {}  # conversation_id -> (reply request, subject, sender_email)
+    
+    for email in unread_emails:
+        email_id, conversation_id, subject, sender_email, sender_name = describe_email(email)
+        conversation_id = scoped_key(conversation_id, base)
+        
+        # Skip if we've already replied to this conversation
+        if conversation_id in replied_emails or conversation_id in queued:
+            print(f"  ⏭️  Skipped (already replied): {subject[:40]}...")
+            continue
+        
+        print(f"  📧 New email: {subject[:40]}...")
+        print(f"     From: {sender_name} ({sender_email})")
+        
+        if AUTO_REPLY_ENABLED and queue is not None:
+            reply = queue.add("POST", f"{base}/sendMail", body=build_auto_reply(sender_email, sender_name, subject))
+            queue.add("PATCH", f"{base}/messages/{email_id}", body={"isRead": True}, depends_on=[reply])
+            queued[conversation_id] = (reply, subject, sender_email)
+        elif AUTO_REPLY_ENABLED:
+            # Send auto-reply
+            if send_auto_reply(access_token, sender_email, sender_name, subject, base):
+                replies_sent += 1
+                replied_emails.add(conversation_id)
+                print(f"     ✓ Auto-reply sent")
+                
+                # Mark as read
+                mark_as_read(access_token, email_id, base)
+            else:
+                failed += 1
+                print(f"     ❌ Failed to send auto-reply")
+        else:
+            print(f"     ⏸️  Auto-reply disabled - no action taken")
+    
+    if queued:
+        queue.flush()
+        
+        for conversation_id, (reply, subject, sender_email) in queued.items():
+            if reply.ok:
+                replies_sent += 1
+                replied_emails.add(conversation_id)
+                print(f"  ✓ Auto-reply sent: {subject[:40]}... → {sender_email}")
+            else:
+                failed += 1
+                print(f"  ❌ Failed to send auto-reply to {sender_email} ({reply.status})")
+    
+    return replies_sent, failed
+
+def require_replies_sent(replies_sent, failed):
+    """Raise GraphError if any reply failed, so the check is not saved and they are retried"""
+    
+    if failed:
+        raise graph_client.GraphError(f"{failed} auto-reply(s) could not be sent")
+    
+    return replies_sent
+
+def reply_to_new_emails(access_token, emails):
+    """Reply to the unread emails among `emails` (subscription mode). Returns replies sent"""
+    
+    unread_emails = [email for email in emails if not email.get('isRead')]
+    
+    if not unread_emails:
+        return 0
+    
+    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"\n[{current_time}] Found {len(unread_emails)} unread email(s)")
+    
+    if ASYNC_MODE:
+        return require_replies_sent(*asyncio.run(process_emails_async(access_token, unread_emails)))
+    
+    return require_replies_sent(*process_emails(access_token, unread_emails))
+
+def handle_messages(access_token, mailbox, messages):
+    """Mailbox daemon handler: reply to the unread messages one check fetched"""
+    
+    unread_emails = [email for email in messages if not email.get('isRead')]
+    
+    if not unread_emails:
+        return 0
+    
+    print(f"[{mailbox.name}] Found {len(unread_emails)} unread email(s)")
+    return require_replies_sent(*process_emails(access_token, unread_emails, mailbox.base))
+
+# ============================================================
+# ASYNC MODE (needs: pip install aiohttp)
+# ============================================================
+
+async def handle_conversation_async(session, semaphore, access_token, conversation_emails):
+    """Handle one conversation's emails in order: reply, then mark read. Returns (sent, failed)"""
+    
+    replies_sent = 0
+    failed = 0
+    
+    for email in conversation_emails:
+        email_id, conversation_id, subject, sender_email, sender_name = describe_email(email)
+        
+        # Same dedup rule as the serial loop: one reply per conversation
+        if conversation_id in replied_emails:
+            print(f"  ⏭️  Skipped (already replied): {subject[:40]}...")
+            continue
+        
+        if not AUTO_REPLY_ENABLED:
+            print(f"  📧 New email: {subject[:40]}... ⏸️  Auto-reply disabled - no action taken")
+            continue
+        
+        try:
+            async with semaphore:
+                status = await graph_client.async_graph_request(
+                    session, "POST", access_token, "/me/sendMail",
+                    json=build_auto_reply(sender_email, sender_name, subject)
+                )
+        except Exception as e:
+            failed += 1
+            print(f"  ❌ Error sending reply to {sender_email}: {e}")
+            continue
+        
+        if status != 202:
+            failed += 1
+            print(f"  ❌ Failed to send auto-reply to {sender_email} ({status})")
+            continue
+        
+        replies_sent += 1
+        replied_emails.add(conversation_id)
+        print(f"  ✓ Auto-reply sent: {subject[:40]}... → {sender_email}")
+        
+        # Mark read as soon as this reply lands, without waiting for the others
+        try:
+            async with semaphore:
+                await graph_client.async_graph_request(
+                    session, "PATCH", access_token, f"/me/messages/{email_id}",
+                    json={"isRead": True}
+                )
+        except Exception as e:
+            print(f"  ❌ Error marking as read: {e}")
+    
+    return replies_sent, failed
+
+async def process_emails_async(access_token, unread_emails):
+    """Handle all conversations concurrently (MAX_CONCURRENT_REQUESTS at a time). Returns (sent, failed)"""
+    
+    # Emails in the same conversation stay sequential so only one gets a reply
+    conversations = {}
+    for email in unread_emails:
+        conversations.setdefault(email.get('conversationId'), []).append(email)
+    
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    
+    async with graph_client.create_async_session(limit=MAX_CONCURRENT_REQUESTS) as session:
+        results = await asyncio.gather(*[
+            handle_conversation_async(session, semaphore, access_token, conversation_emails)
+            for conversation_emails in conversations.values()
+        ])
+    
+    return sum(sent for sent, _ in results), sum(failed for _, failed in results)
+
 # ============================================================
 # MAIN SCRIPT
 # ============================================================
@@ -187,8 +351,14 @@ def main():
     print("="*60 + "\n")
     
     print(f"✓ Client ID configured")
-    print(f"✓ Check interval: Every {CHECK_INTERVAL} seconds")
+    if SUBSCRIPTION_MODE:
+        print(f"✓ Subscription mode: notifications to {NOTIFICATION_URL} (port {LISTEN_PORT})")
+    elif ADAPTIVE_POLLING:
+        print(f"✓ Check interval: Adaptive, {MIN_CHECK_INTERVAL}-{MAX_CHECK_INTERVAL} seconds (starting at {CHECK_INTERVAL})")
+    else:
+        print(f"✓ Check interval: Every {CHECK_INTERVAL} seconds")
     print(f"✓ Auto-reply status: {'ENABLED ✓' if AUTO_REPLY_ENABLED else 'DISABLED ✗'}")
+    print(f"✓ Mode: {f'async ({MAX_CONCURRENT_REQUESTS} concurrent requests)' if ASYNC_MODE else 'serial'}")
     
     if not AUTO_REPLY_ENABLED:
         print("\n⚠️  WARNING: Auto-reply is currently DISABLED!")
@@ -201,7 +371,7 @@ def main():
     print()
     
     # Authenticate
-    access_token = get_access_token_device_code()
+    access_token = get_access_token()
     
     if not access_token:
         print("❌ Authentication failed!")
@@ -212,56 +382,82 @@ def main():
     print("="*60)
     print("Press Ctrl+C to stop\n")
     
+    if SUBSCRIPTION_MODE:
+        runner = change_notifications.SubscriptionRunner(
+            lambda: get_access_token(interactive=False), reply_to_new_emails, start_check, MESSAGE_FIELDS, NOTIFICATION_URL,
+            port=LISTEN_PORT, name=SYNC_STATE_NAME, poll_interval=CHECK_INTERVAL
+        )
+        
+        try:
+            asyncio.run(runner.run())
+        except KeyboardInterrupt:
+            pass
+        
+        print("\n\n" + "="*60)
+        print("STOPPED BY USER")
+        print("="*60)
+        print(f"Total auto-replies sent: {runner.actions}")
+        print("="*60 + "\n")
+        return
+    
     replied_count = 0
     check_count = 0
     
+    # Learns the mail arrival rate and picks each next interval from it
+    poller = None
+    if ADAPTIVE_POLLING:
+        poller = adaptive_polling.AdaptivePoller(SYNC_STATE_NAME, CHECK_INTERVAL, MIN_CHECK_INTERVAL, MAX_CHECK_INTERVAL)
+    interval = poller.interval if poller else CHECK_INTERVAL
+    
     try:
         while True:
             check_count += 1
             current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
+            # Cached token, refreshed shortly before it expires (never prompts)
+            access_token = get_access_token(interactive=False)
+            if not access_token:
+                print(f"[{current_time}] ❌ Could not renew access token - retrying next check")
+                time.sleep(interval)
+                continue
+            
             # Get unread emails
-            unread_emails = get_unread_emails(access_token)
+            delta_round = start_check(access_token)
+            unread_emails = get_unread_emails(delta_round)
+            if unread_emails is None:
+                print(f"[{current_time}] ❌ Could not check the inbox - retrying next check")
+                time.sleep(interval)
+                continue
             
+            failed = 0
             if unread_emails:
                 print(f"\n[{current_time}] Found {len(unread_emails)} unread email(s)")
                 
-                for email in unread_emails:
-                    email_id = email.get('id')
-                    conversation_id = email.get('conversationId')
-                    subject = email.get('subject', 'No Subject')
-                    sender = email.get('from', {}).get('emailAddress', {})
-                    sender_email = sender.get('address', 'Unknown')
-                    sender_name = sender.get('name', 'Unknown')
-                    
-                    # Skip if we've already replied to this conversation
-                    if conversation_id in replied_emails:
-                        print(f"  ⏭️  Skipped (already replied): {subject[:40]}...")
-                        continue
-                    
-                    print(f"  📧 New email: {subject[:40]}...")
-                    print(f"     From: {sender_name} ({sender_email})")
-                    
-                    if AUTO_REPLY_ENABLED:
-                        # Send auto-reply
-                        if send_auto_reply(access_token, sender_email, sender_name, subject):
-                            replied_count += 1
-                            replied_emails.add(conversation_id)
-                            print(f"     ✓ Auto-reply sent (Total: {replied_count})")
-                            
-                            # Mark as read
-                            mark_as_read(access_token, email_id)
-                        else:
-                            print(f"     ❌ Failed to send auto-reply")
-                    else:
-                        print(f"     ⏸️  Auto-reply disabled - no action taken")
-            else:
-                if check_count % 10 == 0:
-                    print(f"[{current_time}] No new emails. Total replies sent: {replied_count}")
+                if ASYNC_MODE:
+                    replies_sent, failed = asyncio.run(process_emails_async(access_token, unread_emails))
+                else:
+                    replies_sent, failed = process_emails(access_token, unread_emails)
+                
+                replied_count += replies_sent
+                print(f"  Total replies sent: {replied_count}")
+                
+                if failed:
+                    # Not saving the delta state hands these emails out again next check
+                    print(f"  ❌ Failed to reply: {failed} (retrying next check)")
             
-            # Wait before next check
-            time.sleep(CHECK_INTERVAL)
+            if not failed:
+                delta_round.save()
+            
+            if poller:
+                # Only new mail counts, not older unread messages that were flagged or moved
+                interval = poller.record_messages(unread_emails)
             
+            if not unread_emails and check_count % 10 == 0:
+                print(f"[{current_time}] No new emails. Total replies sent: {replied_count}. Next check in {interval:.0f}s")
+            
+            # Wait before next check
+            time.sleep(interval)
+    
     except KeyboardInterrupt:
         print("\n\n" + "="*60)
         print("STOPPED BY USER")
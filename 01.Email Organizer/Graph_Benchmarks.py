@@ -0,0 +1,1040 @@
+import asyncio
+import contextlib
+import io
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import requests
+import graph_client
+import graph_retry
+import importlib.util
+import mail_sync
+import mail_daemon
+import meeting_stats
+import Meeting_Summary_Generator
+import dedup_store
+import adaptive_polling
+import availability
+import change_notifications
+import calendar_cache
+import date_extraction
+import event_records
+import folder_index
+import free_time
+import keyword_index
+import result_cache
+from keyword_index import KeywordIndex
+from sort_rules import RuleSet
+from datetime import datetime, timedelta, timezone
+from mock_graph_server import MockGraph, start_mock_server
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+# Number of requests per benchmark run
+REQUEST_COUNT = 500
+
+# Unread backlog for the bot benchmark (e.g. after a weekend)
+UNREAD_COUNT = 200
+
+# Simulated round-trip time to Graph for the bot benchmark (in seconds)
+GRAPH_LATENCY = 0.05
+
+# Synthetic emails for the date extraction benchmark
+EMAIL_CORPUS_SIZE = 10000
+
+# Synthetic calendar for the gap finder benchmark
+CALENDAR_EVENTS = 5000
+CALENDAR_DAYS = 90
+
+# People for the common free time benchmark (a month at 5-minute slots)
+ATTENDEE_COUNT = 50
+
+# Meetings for the statistics benchmark (a year for a whole organization)
+STATS_EVENT_COUNT = 500000
+
+# Meetings in the PDF memory benchmark (each build runs in its own process)
+PDF_EVENT_COUNT = 100000
+
+# Inbox backlog for the auto-sort benchmark, and how many of them the
+# one-message-at-a-time baseline sorts (the rest is extrapolated)
+SORT_BACKLOG = 50000
+SORT_BASELINE_SAMPLE = 200
+
+# Mailboxes and meetings per mailbox for the batch report benchmark
+BATCH_USER_COUNT = 16
+BATCH_EVENT_COUNT = 1000
+
+# Mailboxes served by the daemon benchmark (each with UNREAD_COUNT new emails)
+DAEMON_MAILBOX_COUNT = 50
+
+# Simulated week of mail for the adaptive polling benchmark (arrivals per
+# hour: weekday office hours, weekday mornings/evenings, nights, weekends)
+POLLING_DAYS = 7
+ARRIVAL_RATES = {"office": 40, "shoulder": 6, "night": 0.5, "weekend": 2}
+
+# Share of new emails that mention a reminder keyword, for the payload
+# size benchmark (UNREAD_COUNT new emails with HTML bodies per check)
+KEYWORD_EMAIL_SHARE = 0.1
+
+# Emails delivered one by one in the change notification benchmark, and the
+# gap between them (in seconds)
+NOTIFIED_EMAILS = 20
+NOTIFIED_EMAIL_GAP = 0.25
+
+# ============================================================
+# HELPERS
+# ============================================================
+
+def make_messages(count):
+    """Build fake inbox messages"""
+
+    return [
+        {
+            "id": f"msg-{i}",
+            "conversationId": f"conv-{i}",
+            "subject": f"Test message {i}",
+            "from": {"emailAddress": {"address": f"sender{i}@example.com", "name": f"Sender {i}"}},
+            "receivedDateTime": "2025-01-01T09:00:00Z",
+            "isRead": False
+        }
+        for i in range(count)
+    ]
+
+def report(name, count, elapsed):
+    """Print one benchmark result line"""
+
+    print(f"  {name:<40} {count / elapsed:>10.0f} req/s  ({elapsed:.2f}s)")
+
+def make_email_corpus(count):
+    """Build (subject, preview, html body) triples with dates scattered through them"""
+
+    rng = random.Random(42)
+    words = "please review the attached report before our meeting and send feedback on the budget".split()
+    future = datetime.now() + timedelta(days=30)
+    date_formats = ["%m/%d/%Y", "%Y-%m-%d", "%B %d, %Y", "%d %b %Y"]
+
+    corpus = []
+    for i in range(count):
+        paragraphs = []
+        for _ in range(rng.randint(5, 20)):
+            sentence = " ".join(rng.choice(words) for _ in range(rng.randint(8, 20)))
+            if rng.random() < 0.2:
+                sentence += " by " + (future + timedelta(days=rng.randint(0, 60))).strftime(rng.choice(date_formats))
+            paragraphs.append(f"<p style=\"margin:0\">{sentence}.</p>")
+
+        html = "<html><head><style>p {color: #333}</style></head><body>" + "".join(paragraphs) + "</body></html>"
+        corpus.append((f"Deadline reminder {i}", paragraphs[0][20:120], html))
+
+    return corpus
+
+def legacy_extract_dates(text):
+    """The original extract_dates_from_text (four regex passes), kept for comparison"""
+
+    dates = []
+    patterns = [
+        r'\b(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})\b',
+        r'\b(\d{4})[/-](\d{1,2})[/-](\d{1,2})\b',
+        r'\b(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]* (\d{1,2}),? (\d{4})\b',
+        r'\b(\d{1,2}) (Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]* (\d{4})\b',
+    ]
+    month_map = {
+        'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+        'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
+    }
+
+    for pattern in patterns:
+        for match in re.finditer(pattern, text, re.IGNORECASE):
+            try:
+                groups = match.groups()
+                if groups[0].isdigit() and groups[1].isdigit():
+                    if len(groups[0]) == 4:
+                        year, month, day = int(groups[0]), int(groups[1]), int(groups[2])
+                    else:
+                        month, day, year = int(groups[0]), int(groups[1]), int(groups[2])
+                        if year < 100:
+                            year += 2000
+                elif groups[0].isdigit():
+                    day, month, year = int(groups[0]), month_map.get(groups[1][:3].lower()), int(groups[2])
+                else:
+                    month, day, year = month_map.get(groups[0][:3].lower()), int(groups[1]), int(groups[2])
+                date = datetime(year, month, day)
+                if date >= datetime.now():
+                    dates.append(date)
+            except (ValueError, TypeError):
+                continue
+
+    return dates
+
+def make_calendar(count, days, start, seed=1):
+    """Build Graph-shaped events spread over `days`, a few of them multi-day"""
+
+    rng = random.Random(seed)
+    events = []
+    for i in range(count):
+        begin = start + timedelta(days=rng.randrange(days), hours=rng.randint(7, 20), minutes=rng.choice([0, 15, 30, 45]))
+        length = timedelta(days=rng.randint(1, 3)) if rng.random() < 0.01 else timedelta(minutes=rng.choice([15, 30, 60, 90]))
+        events.append({
+            "subject": f"Meeting {i}",
+            "start": {"dateTime": begin.isoformat(), "timeZone": "UTC"},
+            "end": {"dateTime": (begin + length).isoformat(), "timeZone": "UTC"}
+        })
+
+    return sorted(events, key=lambda event: event["start"]["dateTime"])
+
+def legacy_find_gaps_for_day(events, date, work_start_hour, work_end_hour, min_hours):
+    """The original per-day gap search (re-parses and re-filters every event), kept for comparison"""
+
+    work_start = date.replace(hour=work_start_hour)
+    work_end = date.replace(hour=work_end_hour)
+    day_events = []
+    for event in events:
+        start_dt = datetime.fromisoformat(event['start']['dateTime'])
+        end_dt = datetime.fromisoformat(event['end']['dateTime'])
+        if start_dt.date() == date.date() or end_dt.date() == date.date():
+            clipped_start, clipped_end = max(start_dt, work_start), min(end_dt, work_end)
+            if clipped_start < clipped_end:
+                day_events.append((clipped_start, clipped_end))
+    day_events.sort()
+
+    gaps = []
+    current_time = work_start
+    for start, end in day_events + [(work_end, work_end)]:
+        if current_time < start and (start - current_time).total_seconds() / 3600 >= min_hours:
+            gaps.append((current_time, start))
+        current_time = max(current_time, end)
+
+    return gaps
+
+# ============================================================
+# BENCHMARKS
+# ============================================================
+
+def bench_connection_pooling(base_url):
+    """Compare bare requests.* calls against the pooled graph_client session"""
+
+    print("Connection pooling (sendMail + PATCH isRead):")
+
+    payload = {"message": {"subject": "Re: test"}}
+
+    # Before: a new connection for every call
+    start = time.perf_counter()
+    for i in range(REQUEST_COUNT // 2):
+        requests.post(f"{base_url}/me/sendMail", json=payload)
+        requests.patch(f"{base_url}/me/messages/msg-{i % 50}", json={"isRead": True})
+    report("bare requests (no keep-alive)", REQUEST_COUNT, time.perf_counter() - start)
+
+    # After: shared pooled session
+    graph_client.GRAPH_URL = base_url
+    start = time.perf_counter()
+    for i in range(REQUEST_COUNT // 2):
+        graph_client.graph_post("token", "/me/sendMail", json=payload)
+        graph_client.graph_patch("token", f"/me/messages/msg-{i % 50}", json={"isRead": True})
+    report("graph_client pooled session", REQUEST_COUNT, time.perf_counter() - start)
+
+    print()
+
+def bench_bot_writes(graph, base_url):
+    """Compare the serial bot loop against $batch and async mode on an unread backlog"""
+
+    print(f"Email_Response_Bot, {UNREAD_COUNT} unread, {GRAPH_LATENCY * 1000:.0f} ms simulated latency:")
+
+    # Keep the benchmark's dedup state out of the real one
+    dedup_store.STATE_DIR = tempfile.mkdtemp()
+    import Email_Response_Bot as bot
+
+    bot.AUTO_REPLY_ENABLED = True
+    graph_client.GRAPH_URL = base_url
+    graph.latency = GRAPH_LATENCY
+    emails = make_messages(UNREAD_COUNT)
+
+    bot.BATCH_WRITES = False
+    bot.replied_emails = dedup_store.DedupStore("bench_serial")
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        replies, _ = bot.process_emails("token", emails)
+    report(f"serial ({replies} replies)", replies * 2, time.perf_counter() - start)
+
+    bot.BATCH_WRITES = True
+    bot.replied_emails = dedup_store.DedupStore("bench_batch")
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        replies, _ = bot.process_emails("token", emails)
+    report(f"$batch ({replies} replies)", replies * 2, time.perf_counter() - start)
+
+    bot.replied_emails = dedup_store.DedupStore("bench_async")
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        replies, _ = asyncio.run(bot.process_emails_async("token", emails))
+    report(f"async x{bot.MAX_CONCURRENT_REQUESTS} ({replies} replies)", replies * 2, time.perf_counter() - start)
+
+    graph.latency = 0
+    print()
+
+def bench_date_extraction():
+    """Throughput of deadline extraction over a synthetic email corpus"""
+
+    corpus = make_email_corpus(EMAIL_CORPUS_SIZE)
+    megabytes = sum(len(subject) + len(preview) + len(html) for subject, preview, html in corpus) / 1e6
+
+    print(f"Date extraction, {EMAIL_CORPUS_SIZE} emails ({megabytes:.1f} MB):")
+
+    def run(name, extract):
+        start = time.perf_counter()
+        found = sum(1 for subject, preview, html in corpus if extract(subject, preview, html))
+        elapsed = time.perf_counter() - start
+        print(f"  {name:<40} {megabytes / elapsed:>10.1f} MB/s  ({found} with a date)")
+
+    run("legacy: 4 passes over raw HTML", lambda s, p, h: legacy_extract_dates(s + " " + p + " " + h)[:1])
+
+    now = datetime.now()
+    run("single pass, all dates", lambda s, p, h: date_extraction.extract_dates(s + " " + p + " " + h, now))
+    run("single pass, first date only", lambda s, p, h: date_extraction.first_date(s + " " + p + " " + h, now))
+    run(
+        "HTML stripped + first date only",
+        lambda s, p, h: date_extraction.first_date(s + " " + p + " " + date_extraction.html_to_text(h), now)
+    )
+
+    # Deadlines near keywords with relative dates, times and ranges; the
+    # second pass over the same emails is answered from the parse cache
+    # (bodies are stripped of HTML once, during the first pass)
+    result_cache.STATE_DIR = tempfile.mkdtemp()
+    extractor = date_extraction.DateExtractor(
+        KeywordIndex(["deadline", "due", "reminder"]), cache=result_cache.ResultCache("bench_dates")
+    )
+    received = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    texts = {}
+
+    def deadlines(s, p, h):
+        text = texts.setdefault(s, s + " " + p + " " + date_extraction.html_to_text(h))
+        return extractor.deadlines(text, received, "sender@example.com")
+
+    run("deadline extractor, cold cache", deadlines)
+    run("deadline extractor, warm cache", deadlines)
+
+    print()
+
+def bench_keyword_matching():
+    """Keyword search cost as the keyword list grows (every hit with its position)"""
+
+    corpus = make_email_corpus(2000)
+    texts = [subject + " " + preview + " " + html for subject, preview, html in corpus]
+    megabytes = sum(len(text) for text in texts) / 1e6
+    rng = random.Random(7)
+
+    print(f"Keyword matching, {len(texts)} emails ({megabytes:.1f} MB):")
+
+    for count in (4, 32, 100, 200, 500):
+        keywords = ["deadline", "due", "reminder", "meeting set-up"]
+        while len(keywords) < count:
+            keywords.append("".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(5, 12))))
+
+        index = KeywordIndex(keywords)
+        threshold = keyword_index.LOOP_MAX_KEYWORDS
+        rates = []
+
+        # Time find() with each strategy forced
+        for forced in (count, 0):
+            keyword_index.LOOP_MAX_KEYWORDS = forced
+            start = time.perf_counter()
+            for text in texts:
+                index.find(text)
+            rates.append(megabytes / (time.perf_counter() - start))
+
+        keyword_index.LOOP_MAX_KEYWORDS = threshold
+        loop_rate, regex_rate = rates
+        strategy = "loop" if count <= threshold else "regex"
+        print(f"  {count:>4} keywords: per-keyword loop {loop_rate:>7.1f} MB/s   one regex {regex_rate:>7.1f} MB/s   (find() uses the {strategy})")
+
+    print()
+
+def bench_gap_finder():
+    """Per-day re-scan against the range-wide sweep in free_time (times in UTC)"""
+
+    start_date = datetime(2026, 1, 5)
+    events = make_calendar(CALENDAR_EVENTS, CALENDAR_DAYS, start_date)
+
+    print(f"Calendar gaps, {CALENDAR_EVENTS} events over {CALENDAR_DAYS} days (1h minimum):")
+
+    start = time.perf_counter()
+    legacy = sum(
+        len(legacy_find_gaps_for_day(events, start_date + timedelta(days=day), 8, 21, 1))
+        for day in range(CALENDAR_DAYS)
+    )
+    print(f"  {'legacy: parse + filter per day':<40} {time.perf_counter() - start:>9.3f} s  ({legacy} gaps)")
+
+    start = time.perf_counter()
+    index = free_time.FreeTimeIndex(event_records.iter_records(events))
+    swept = sum(
+        len(index.free_windows(day.replace(hour=8, tzinfo=timezone.utc), day.replace(hour=21, tzinfo=timezone.utc), 60))
+        for day in (start_date + timedelta(days=offset) for offset in range(CALENDAR_DAYS))
+    )
+    print(f"  {'parse once + merged sweep':<40} {time.perf_counter() - start:>9.3f} s  ({swept} gaps)")
+
+    print()
+
+def bench_common_free_time(graph, base_url):
+    """Fetch and intersect many people's availability over a month"""
+
+    days = 30
+    start_date = datetime(2026, 1, 5)
+    grid = availability.SlotGrid(start_date, start_date + timedelta(days=days))
+    addresses = [f"person{i}@example.com" for i in range(ATTENDEE_COUNT)]
+
+    print(f"Common free time, {ATTENDEE_COUNT} people, {days} days at {availability.SLOT_MINUTES}-minute slots ({grid.size} slots):")
+
+    # One meeting a day each on average, stored on the stub as availabilityView strings
+    for seed, address in enumerate(addresses):
+        free = grid.free_from_records(event_records.iter_records(make_calendar(days, days, start_date, seed)))
+        graph.schedules[address] = format(free, "b").zfill(grid.size)[::-1].translate(str.maketrans("10", "02"))
+
+    graph_client.GRAPH_URL = base_url
+    graph.latency = GRAPH_LATENCY
+    start = time.perf_counter()
+    views = availability.fetch_availability("token", addresses, grid.start, grid.end)
+    print(f"  {f'fetch ({GRAPH_LATENCY * 1000:.0f} ms latency, concurrent)':<40} {(time.perf_counter() - start) * 1000:>9.1f} ms")
+    graph.latency = 0
+
+    bitmaps = [grid.free_from_view(view) for view in views.values()]
+    work = grid.working_hours(8, 21)
+
+    runs = 200
+    start = time.perf_counter()
+    for _ in range(runs):
+        common = availability.common_free(bitmaps + [work])
+    print(f"  {f'intersect {len(bitmaps)} bitmaps':<40} {(time.perf_counter() - start) / runs * 1000:>9.3f} ms")
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        windows = grid.windows(common, 30)
+    print(f"  {'extract windows >= 30 min':<40} {(time.perf_counter() - start) / runs * 1000:>9.3f} ms  ({len(windows)} windows)")
+
+    print()
+
+def bench_calendar_cache():
+    """Full calendarView download against the local cache kept by calendarView/delta"""
+
+    days = 90
+    start_date = datetime(2026, 1, 1)
+    end_date = start_date + timedelta(days=days)
+    events = make_calendar(CALENDAR_EVENTS, days, start_date)
+    for i, event in enumerate(events):
+        event["id"] = f"event-{i}"
+
+    print(f"Calendar cache, {CALENDAR_EVENTS} events over {days} days, {GRAPH_LATENCY * 1000:.0f} ms latency:")
+
+    graph = MockGraph(events=events)
+    server, base_url = start_mock_server(graph)
+    graph_client.GRAPH_URL = base_url
+    graph.latency = GRAPH_LATENCY
+    calendar_cache.STATE_DIR = tempfile.mkdtemp()
+    cache = calendar_cache.CalendarCache()
+
+    def run(name, work):
+        graph.request_count = 0
+        start = time.perf_counter()
+        count = work()
+        elapsed = time.perf_counter() - start
+        print(f"  {name:<40} {elapsed * 1000:>9.1f} ms  ({count} events, {graph.request_count} requests)")
+
+    run("calendarView download (every run)", lambda: sum(
+        1 for _ in graph_client.iter_items("token", "/me/calendar/calendarView", page_size=100)
+    ))
+    run("first sync into cache", lambda: cache.sync("token", start_date, end_date) and len(cache))
+    run("repeat run, delta sync (no changes)", lambda: cache.sync("token", start_date, end_date, force=True) and 0)
+    run("quarter read from cache", lambda: sum(1 for _ in cache.events(start_date, end_date)))
+    run("week read from cache", lambda: sum(1 for _ in cache.events(start_date, start_date + timedelta(days=7))))
+
+    cache.close()
+    server.shutdown()
+    print()
+
+def bench_meeting_stats():
+    """Meeting statistics over a year of org-wide meetings, NumPy against plain Python"""
+
+    rng = random.Random(3)
+    year_start = datetime(2026, 1, 1)
+    origin = int(year_start.replace(tzinfo=timezone.utc).timestamp())
+
+    columns = meeting_stats.EventColumns()
+    for _ in range(STATS_EVENT_COUNT):
+        start = origin + rng.randrange(365) * 86400 + rng.randint(7, 19) * 3600 + rng.choice([0, 900, 1800, 2700])
+        columns.start.append(start)
+        columns.end.append(start + rng.choice([900, 1800, 3600, 5400]))
+        columns.attendees.append(rng.randint(1, 12))
+        columns.organizer.append(columns.organizers.setdefault(f"user{rng.randrange(2000)}@example.com", len(columns.organizers)))
+
+    print(f"Meeting statistics, {STATS_EVENT_COUNT} meetings over a year:")
+
+    grid = meeting_stats.DayGrid(year_start, datetime(2026, 12, 31, 23, 59), timezone.utc)
+
+    if meeting_stats.load_numpy() is not None:
+        start = time.perf_counter()
+        meeting_stats.compute_stats_numpy(columns, grid)
+        print(f"  {'NumPy (columnar)':<40} {(time.perf_counter() - start) * 1000:>9.1f} ms")
+
+    start = time.perf_counter()
+    meeting_stats.compute_stats_python(columns, grid)
+    print(f"  {'plain Python fallback':<40} {(time.perf_counter() - start) * 1000:>9.1f} ms")
+
+    print()
+
+# Builds a meeting summary PDF and prints the process's peak memory in KB
+PDF_BUILD_SCRIPT = """
+import random, resource, sys
+import event_records
+import Meeting_Summary_Generator as summary
+from datetime import datetime, timezone
+
+count, days = int(sys.argv[1]), 365
+summary.STREAM_REPORT = sys.argv[2] == "stream"
+origin = int(datetime(2026, 1, 1, tzinfo=timezone.utc).timestamp())
+
+def load_events():
+    rng = random.Random(5)
+    starts = sorted(origin + rng.randrange(days * 96) * 900 for _ in range(count))
+    for i, start in enumerate(starts):
+        yield event_records.EventRecord(
+            f"event-{i}", start, start + rng.choice([900, 1800, 3600]), f"Meeting {i}",
+            "Room " + str(rng.randrange(40)), rng.randint(1, 12), f"user{rng.randrange(200)}@example.com", timezone.utc
+        )
+
+summary.create_summary(
+    load_events, datetime(2026, 1, 1, tzinfo=timezone.utc), datetime(2026, 12, 31, 23, 59, tzinfo=timezone.utc),
+    sys.argv[3], timezone.utc
+)
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+def bench_pdf_streaming():
+    """Peak memory of a very large meeting report, whole story in memory against streamed"""
+
+    print(f"Meeting summary PDF, {PDF_EVENT_COUNT} meetings over a year (peak memory):")
+
+    with tempfile.TemporaryDirectory() as folder:
+        for name, mode in [("whole story built in memory", "list"), ("streamed flowables", "stream")]:
+            start = time.perf_counter()
+            output = subprocess.run(
+                [sys.executable, "-c", PDF_BUILD_SCRIPT, str(PDF_EVENT_COUNT), mode, f"{folder}/{mode}.pdf"],
+                cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+            ).stdout
+            elapsed = time.perf_counter() - start
+
+            peak_mb = int(output.split()[-1]) / 1024
+            print(f"  {name:<40} {peak_mb:>7.0f} MB   ({elapsed:.1f} s)")
+
+    print()
+
+def make_sort_backlog(count, seed=4):
+    """Inbox messages from a mix of senders, about half of them matching a rule"""
+
+    rng = random.Random(seed)
+    domains = ["washingtonpost.com", "email.washingtonpost.com", "news.substack.com", "gmail.com",
+               "yourcompany.com", "vendor.example", "bank.example", "shop.example"]
+    subjects = ["Quarterly numbers", "Lunch?", "Your weekly digest", "URGENT: server down", "Invoice 4411",
+                "Re: project plan", "Sale ends tonight", "Meeting notes"]
+
+    return [
+        {
+            "id": f"msg-{i}",
+            "subject": rng.choice(subjects),
+            "from": {"emailAddress": {"address": f"person{rng.randrange(500)}@{rng.choice(domains)}"}},
+            "bodyPreview": rng.choice(["See the attached file.", "Click here to unsubscribe.", "Thanks, talk soon."]),
+            "importance": rng.choice(["normal"] * 9 + ["high"]),
+            "receivedDateTime": "2026-01-01T09:00:00Z"
+        }
+        for i in range(count)
+    ]
+
+def bench_auto_sort():
+    """Sorting an inbox backlog: per-message lookups and moves against the rule engine"""
+
+    import Auto_Sort_Outlook_Emails as sorter
+
+    messages = make_sort_backlog(SORT_BACKLOG)
+    rule_set = RuleSet(sorter.SORT_RULES)
+
+    print(f"Auto_Sort_Outlook_Emails, {SORT_BACKLOG} message backlog, {GRAPH_LATENCY * 1000:.0f} ms latency:")
+
+    start = time.perf_counter()
+    matched = sum(1 for message in messages if rule_set.classify(message))
+    elapsed = time.perf_counter() - start
+    print(f"  {'classify only (compiled rules)':<40} {SORT_BACKLOG / elapsed:>10.0f} msg/s  ({matched} to move)")
+
+    graph = MockGraph(messages=messages)
+    server, base_url = start_mock_server(graph)
+    graph_client.GRAPH_URL = base_url
+    graph.latency = GRAPH_LATENCY
+    mail_sync.STATE_DIR = folder_index.STATE_DIR = tempfile.mkdtemp()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        folder_ids = sorter.resolve_folders("token", rule_set.folders)
+
+    # Baseline: look the folder up and move each message with its own request
+    sample = [message for message in messages if rule_set.classify(message)][:SORT_BASELINE_SAMPLE]
+    start = time.perf_counter()
+    for message in sample:
+        folders = graph_client.graph_get("token", "/me/mailFolders").json()["value"]
+        folder_id = next(f["id"] for f in folders if f["displayName"] == rule_set.classify(message))
+        graph_client.graph_post("token", f"/me/messages/{message['id']}/move", json={"destinationId": folder_id})
+    per_message = (time.perf_counter() - start) / len(sample)
+    print(f"  {'one request per lookup and move':<40} {1 / per_message:>10.0f} msg/s  "
+          f"(~{per_message * matched / 60:.0f} min for the backlog, extrapolated)")
+
+    graph.request_count = 0
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        emails = sorter.get_new_emails("token")
+        moved, checked, failed = sorter.sort_emails("token", rule_set, folder_ids, emails)
+        emails.save()
+    elapsed = time.perf_counter() - start
+    print(f"  {f'delta sync + $batch x{sorter.MOVE_WORKERS}':<40} {checked / elapsed:>10.0f} msg/s  "
+          f"({sum(moved.values())} moved, {failed} failed, {graph.request_count} requests, {elapsed:.1f}s)")
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        moved, checked, failed = sorter.sort_emails("token", rule_set, folder_ids, sorter.get_new_emails("token"))
+    print(f"  {'next check (incremental)':<40} {(time.perf_counter() - start) * 1000:>9.0f} ms   ({checked} changes seen)")
+
+    server.shutdown()
+    print()
+
+def bench_folder_index():
+    """Resolving folder paths: walking childFolders per lookup against the cached index"""
+
+    graph = MockGraph()
+    server, base_url = start_mock_server(graph)
+    graph_client.GRAPH_URL = base_url
+    host = {"Host": base_url.split("//")[1]}
+
+    # 20 top-level folders x 10 subfolders x 5 below each
+    paths = []
+    for a in range(20):
+        top = graph.create_folder({}, {"displayName": f"Project {a}"}, host)[1]
+        for b in range(10):
+            middle = graph.create_folder({}, {"displayName": f"Area {b}"}, host, folder_id=top["id"])[1]
+            for c in range(5):
+                graph.create_folder({}, {"displayName": f"Topic {c}"}, host, folder_id=middle["id"])
+                paths.append(f"Project {a}/Area {b}/Topic {c}")
+
+    lookups = random.Random(6).choices(paths, k=200)
+    graph.latency = GRAPH_LATENCY
+
+    print(f"Folder lookups, {len(graph.folders)} folders, {len(lookups)} lookups, {GRAPH_LATENCY * 1000:.0f} ms latency:")
+
+    def walk(path):
+        url = "/me/mailFolders"
+        for name in path.split("/"):
+            folder = next(f for f in graph_client.iter_items("token", url, page_size=100) if f["displayName"] == name)
+            url = f"/me/mailFolders/{folder['id']}/childFolders"
+        return folder["id"]
+
+    sample = lookups[:20]
+    graph.request_count = 0
+    start = time.perf_counter()
+    for path in sample:
+        walk(path)
+    elapsed = (time.perf_counter() - start) / len(sample)
+    print(f"  {'walk childFolders per lookup':<40} {elapsed * 1000:>9.1f} ms/lookup ({graph.request_count / len(sample):.0f} requests each)")
+
+    folder_index.STATE_DIR = tempfile.mkdtemp()
+
+    graph.request_count = 0
+    start = time.perf_counter()
+    index = folder_index.FolderIndex()
+    index.refresh("token")
+    print(f"  {'index: first load (mailFolders/delta)':<40} {(time.perf_counter() - start) * 1000:>9.1f} ms   ({graph.request_count} requests)")
+
+    start = time.perf_counter()
+    index = folder_index.FolderIndex()
+    print(f"  {'index: next run (from disk)':<40} {(time.perf_counter() - start) * 1000:>9.1f} ms   ({len(index)} folders)")
+
+    graph.request_count = 0
+    start = time.perf_counter()
+    index.refresh("token", force=True)
+    print(f"  {'index: delta refresh (no changes)':<40} {(time.perf_counter() - start) * 1000:>9.1f} ms   ({graph.request_count} requests)")
+
+    start = time.perf_counter()
+    assert all(index.resolve("token", path) for path in lookups)
+    elapsed = (time.perf_counter() - start) / len(lookups)
+    print(f"  {'index: resolve':<40} {elapsed * 1e6:>9.1f} µs/lookup")
+
+    server.shutdown()
+    print()
+
+def bench_batch_reports():
+    """Weekly reports for many mailboxes, one render process against one per core"""
+
+    start_date = datetime(2026, 3, 2)
+    end_date = start_date + timedelta(days=6, hours=23, minutes=59, seconds=59)
+    events = make_calendar(BATCH_EVENT_COUNT, 7, start_date)
+    for i, event in enumerate(events):
+        event["id"] = f"event-{i}"
+
+    cores = os.cpu_count()
+    print(f"Batch reports, {BATCH_USER_COUNT} mailboxes x {BATCH_EVENT_COUNT} meetings, {cores} cores:")
+
+    graph = MockGraph(events=events)
+    server, base_url = start_mock_server(graph)
+    graph_client.GRAPH_URL = base_url
+    graph.latency = GRAPH_LATENCY
+    users = [f"user{i}@example.com" for i in range(BATCH_USER_COUNT)]
+    use_cache = Meeting_Summary_Generator.USE_CALENDAR_CACHE
+    Meeting_Summary_Generator.USE_CALENDAR_CACHE = False
+
+    def sequential(folder):
+        # One mailbox after another, as running the script once per user would
+        for user in users:
+            records = Meeting_Summary_Generator.fetch_user_records("token", user, start_date, end_date)
+            path = os.path.join(folder, Meeting_Summary_Generator.report_filename(start_date, end_date, user))
+            Meeting_Summary_Generator.create_summary(lambda: iter(records), start_date, end_date, path)
+
+    def batch(workers):
+        def run(folder):
+            Meeting_Summary_Generator.RENDER_WORKERS = workers
+            Meeting_Summary_Generator.run_batch("token", users, start_date, end_date, output_dir=folder)
+        return run
+
+    try:
+        for name, work in [
+            ("one mailbox at a time", sequential),
+            ("batch, 1 render process", batch(1)),
+            (f"batch, {cores} render processes", batch(cores))
+        ]:
+            with tempfile.TemporaryDirectory() as folder, contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                work(folder)
+                elapsed = time.perf_counter() - start
+
+            print(f"  {name:<40} {BATCH_USER_COUNT / elapsed:>10.1f} reports/s  ({elapsed:.2f}s)")
+    finally:
+        Meeting_Summary_Generator.USE_CALENDAR_CACHE = use_cache
+        Meeting_Summary_Generator.RENDER_WORKERS = None
+        server.shutdown()
+
+    print()
+
+def bench_mail_daemon():
+    """One delta sync per mailbox for all handlers, against a separate poller per script"""
+
+    graph = MockGraph(messages=make_messages(UNREAD_COUNT))
+    server, base_url = start_mock_server(graph)
+    graph_client.GRAPH_URL = base_url
+    graph.latency = GRAPH_LATENCY
+    users = [f"user{i}@example.com" for i in range(DAEMON_MAILBOX_COUNT)]
+
+    # The fields each script selects; the handlers themselves do nothing here
+    handler_fields = {
+        "auto_reply": "id,subject,from,receivedDateTime,conversationId,isRead",
+        "reminders": "id,subject,bodyPreview,receivedDateTime,from",
+        "sort": "id,subject,from,bodyPreview,importance,receivedDateTime"
+    }
+
+    print(f"Mailbox daemon, {DAEMON_MAILBOX_COUNT} mailboxes x {UNREAD_COUNT} new emails, "
+          f"{len(handler_fields)} handlers, {GRAPH_LATENCY * 1000:.0f} ms latency:")
+
+    # Baseline: each script polls every mailbox itself, one after another
+    mail_sync.STATE_DIR = tempfile.mkdtemp()
+    graph.request_count = 0
+    start = time.perf_counter()
+    for name, fields in handler_fields.items():
+        for user in users:
+            for _ in mail_sync.sync_messages("token", f"{name}-{user}", fields, base=f"/users/{user}"):
+                pass
+    elapsed = time.perf_counter() - start
+    print(f"  {'one poller per script':<40} {DAEMON_MAILBOX_COUNT / elapsed:>10.1f} mailboxes/s  "
+          f"({graph.request_count} requests, {elapsed:.2f}s)")
+
+    mail_sync.STATE_DIR = tempfile.mkdtemp()
+    daemon = mail_daemon.MailDaemon(lambda mailbox: "token", interval=3600)
+    for name, fields in handler_fields.items():
+        daemon.register(name, lambda access_token, mailbox, messages: 0, fields)
+    for user in users:
+        daemon.add_mailbox(user)
+
+    # Stop once every mailbox has had its first check
+    def stop_after_first_round():
+        while daemon.fetches < len(users):
+            time.sleep(0.01)
+        daemon.stop()
+
+    graph.request_count = 0
+    start = time.perf_counter()
+    watcher = threading.Thread(target=stop_after_first_round)
+    watcher.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        daemon.run()
+    watcher.join()
+    elapsed = time.perf_counter() - start
+    print(f"  {f'daemon, {daemon.workers} mailboxes at a time':<40} {DAEMON_MAILBOX_COUNT / elapsed:>10.1f} mailboxes/s  "
+          f"({graph.request_count} requests, {elapsed:.2f}s)")
+
+    server.shutdown()
+    print()
+
+def make_arrivals(days, rates, seed=8):
+    """Arrival times (in seconds) of a week of mail, busy in office hours and quiet at night"""
+
+    rng = random.Random(seed)
+    peak = max(rates.values()) / 3600
+
+    def rate_at(t):
+        day, hour = int(t // 86400) % 7, (t % 86400) / 3600
+        if day >= 5:
+            return rates["weekend"] / 3600
+        if 9 <= hour < 17:
+            return rates["office"] / 3600
+        if 7 <= hour < 9 or 17 <= hour < 22:
+            return rates["shoulder"] / 3600
+        return rates["night"] / 3600
+
+    # Thinning: draw at the peak rate, keep each in proportion to the rate at that time
+    arrivals = []
+    t = rng.expovariate(peak)
+    while t < days * 86400:
+        if rng.random() < rate_at(t) / peak:
+            arrivals.append(t)
+        t += rng.expovariate(peak)
+
+    return arrivals
+
+def bench_adaptive_polling():
+    """Checks made and delay until an email is seen: fixed interval against the adaptive poller"""
+
+    import Email_Response_Bot as bot
+
+    arrivals = make_arrivals(POLLING_DAYS, ARRIVAL_RATES)
+
+    print(f"Adaptive polling, {POLLING_DAYS} simulated days, {len(arrivals)} emails:")
+
+    def simulate(next_interval):
+        now, checks, seen, delays = 0.0, 0, 0, []
+        while now < POLLING_DAYS * 86400:
+            found = 0
+            while seen < len(arrivals) and arrivals[seen] <= now:
+                delays.append(now - arrivals[seen])
+                seen += 1
+                found += 1
+            checks += 1
+            now += next_interval(found, now)
+        return checks, sum(delays) / len(delays)
+
+    checks, delay = simulate(lambda found, now: bot.CHECK_INTERVAL)
+    print(f"  {f'fixed {bot.CHECK_INTERVAL}s':<40} {checks:>10} checks   ({delay:.0f}s mean delay)")
+
+    poller = adaptive_polling.AdaptivePoller(
+        "bench", bot.CHECK_INTERVAL, bot.MIN_CHECK_INTERVAL, bot.MAX_CHECK_INTERVAL,
+        path=os.path.join(tempfile.mkdtemp(), "bench.polling.json")
+    )
+    checks, delay = simulate(poller.record)
+    print(f"  {f'adaptive {bot.MIN_CHECK_INTERVAL}-{bot.MAX_CHECK_INTERVAL}s':<40} {checks:>10} checks   ({delay:.0f}s mean delay)")
+
+    print()
+
+def bench_change_notifications():
+    """Time from a new email to its handling: fixed-interval polling against change notifications"""
+
+    import Email_Response_Bot as bot
+
+    graph = MockGraph()
+    server, base_url = start_mock_server(graph)
+    graph_client.GRAPH_URL = base_url
+    mail_sync.STATE_DIR = change_notifications.STATE_DIR = tempfile.mkdtemp()
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    arrived = {}
+    latencies = []
+
+    def on_messages(access_token, messages):
+        now = time.perf_counter()
+        latencies.extend(now - arrived[message["id"]] for message in messages if message["id"] in arrived)
+        return len(messages)
+
+    runner = change_notifications.SubscriptionRunner(
+        lambda: "token", on_messages, lambda access_token: [], bot.MESSAGE_FIELDS,
+        f"http://127.0.0.1:{port}/notifications", port=port, name="bench", poll_interval=bot.CHECK_INTERVAL
+    )
+
+    print(f"Change notifications, {NOTIFIED_EMAILS} emails {NOTIFIED_EMAIL_GAP * 1000:.0f} ms apart:")
+
+    # Polling finds an email half an interval after it arrives, on average,
+    # and polls every interval whether or not anything came in
+    print(f"  {f'polling every {bot.CHECK_INTERVAL}s (expected)':<40} {bot.CHECK_INTERVAL / 2:>9.1f} s mean latency  "
+          f"({3600 // bot.CHECK_INTERVAL} requests/hour idle)")
+
+    thread = threading.Thread(target=lambda: asyncio.run(runner.run()))
+    with contextlib.redirect_stdout(io.StringIO()):
+        thread.start()
+        while not runner.subscription:
+            time.sleep(0.01)
+
+        graph.request_count = 0
+        for i in range(NOTIFIED_EMAILS):
+            message = make_messages(1)[0] | {"id": f"notified-{i}"}
+            arrived[message["id"]] = time.perf_counter()
+            graph.add_message(message)
+            time.sleep(NOTIFIED_EMAIL_GAP)
+
+        while len(latencies) < NOTIFIED_EMAILS:
+            time.sleep(0.01)
+        requests_made = graph.request_count
+
+        runner.stop()
+        thread.join()
+
+    print(f"  {'subscription + local receiver':<40} {sum(latencies) / len(latencies):>9.2f} s mean latency  "
+          f"({requests_made} requests for {NOTIFIED_EMAILS} emails, "
+          f"{3600 // change_notifications.CATCH_UP_INTERVAL} catch-up/hour idle)")
+
+    server.shutdown()
+    print()
+
+def make_inbox(count, keyword_share, seed=9):
+    """Messages with HTML bodies, a share of them about a deadline"""
+
+    rng = random.Random(seed)
+    received = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    messages = []
+
+    for i, (subject, preview, html) in enumerate(make_email_corpus(count)):
+        if rng.random() >= keyword_share:
+            subject, preview = f"Weekly update {i}", preview.replace("by ", "on ")
+            html = html.replace(" by ", " on ")
+
+        messages.append(make_messages(1)[0] | {
+            "id": f"mail-{i}",
+            "subject": subject,
+            "bodyPreview": preview,
+            "body": {"contentType": "html", "content": html},
+            "receivedDateTime": received
+        })
+
+    return messages
+
+def bench_two_phase_fetch():
+    """Response bytes per check: every new email with its HTML body, against narrow fields + bodies for candidates"""
+
+    dedup_store.STATE_DIR = tempfile.mkdtemp()
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Email-Reminder-Generator.py")
+    spec = importlib.util.spec_from_file_location("email_reminder_generator", path)
+    reminders = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(reminders)
+
+    graph = MockGraph(messages=make_inbox(UNREAD_COUNT, KEYWORD_EMAIL_SHARE))
+    server, base_url = start_mock_server(graph)
+    graph_client.GRAPH_URL = base_url
+
+    print(f"Reminder fetch, {UNREAD_COUNT} new emails ({KEYWORD_EMAIL_SHARE:.0%} with a keyword), response bytes:")
+
+    def run(name, fetch):
+        mail_sync.STATE_DIR = tempfile.mkdtemp()
+        graph.bytes_sent = graph.request_count = 0
+        candidates = fetch()
+        print(f"  {name:<40} {graph.bytes_sent / 1024:>10.1f} KB     "
+              f"({graph.request_count} requests, {len(candidates)} candidates)")
+
+    def two_phase(search):
+        reminders.SERVER_SEARCH = search
+        candidates = reminders.select_candidates(reminders.get_recent_emails(reminders.start_check("token")))
+        return reminders.fetch_bodies("token", candidates)
+
+    def full_bodies():
+        fields = reminders.MESSAGE_FIELDS + ",body"
+        messages = list(mail_sync.sync_messages("token", "bench", fields, page_size=reminders.PAGE_SIZE))
+        return [message for message in messages if reminders.check_for_keywords(message)]
+
+    run("delta, full HTML bodies", full_bodies)
+    run("delta, narrow fields + text bodies", lambda: two_phase(False))
+    run("$search, narrow fields + text bodies", lambda: two_phase(True))
+
+    server.shutdown()
+    print()
+
+def bench_throttling():
+    """Sustained throughput against a stub that throttles above a fixed rate"""
+
+    limit = 50
+    duration = 10
+
+    print(f"Throttled stub ({limit} req/s limit, {duration}s of mark-read traffic):")
+
+    graph = MockGraph(messages=make_messages(50))
+    graph.throttle_rate = limit
+    server, base_url = start_mock_server(graph)
+    graph_client.GRAPH_URL = base_url
+
+    for name, start_rate in [("retry only (no pacing)", 1e6), ("AIMD token bucket pacing", 40.0)]:
+        graph_retry.START_RATE = start_rate
+        graph_retry.MAX_RATE = max(start_rate, 100.0)
+        graph_retry.BURST = 10
+        graph_retry._buckets.clear()
+        graph_retry._breakers.clear()
+        graph.throttled_count = 0
+
+        done = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < duration:
+            try:
+                graph_client.graph_patch("token", f"/me/messages/msg-{done % 50}", json={"isRead": True})
+                done += 1
+            except graph_retry.GraphThrottledError:
+                pass
+        elapsed = time.perf_counter() - start
+
+        print(f"  {name:<40} {done / elapsed:>10.0f} ok/s   ({graph.throttled_count} × 429)")
+
+    server.shutdown()
+    print()
+
+# ============================================================
+# MAIN SCRIPT
+# ============================================================
+
+def main():
+    print("\n" + "="*60)
+    print("EMAIL ORGANIZER BENCHMARKS (local stub Graph server)")
+    print("="*60 + "\n")
+
+    # The stub never throttles; lift client-side pacing to measure the transport
+    graph_retry.START_RATE = graph_retry.MAX_RATE = graph_retry.BURST = 1e6
+
+    graph = MockGraph(messages=make_messages(UNREAD_COUNT))
+    server, base_url = start_mock_server(graph)
+    print(f"✓ Stub Graph server running at {base_url}\n")
+
+    try:
+        bench_connection_pooling(base_url)
+        bench_bot_writes(graph, base_url)
+        bench_throttling()
+        bench_date_extraction()
+        bench_keyword_matching()
+        bench_gap_finder()
+        bench_common_free_time(graph, base_url)
+        bench_calendar_cache()
+        bench_meeting_stats()
+        bench_pdf_streaming()
+        bench_auto_sort()
+        bench_folder_index()
+        bench_batch_reports()
+        bench_mail_daemon()
+        bench_adaptive_polling()
+        bench_change_notifications()
+        bench_two_phase_fetch()
+    finally:
+        server.shutdown()
+        graph_client.close_session()
+
+    print("="*60 + "\n")
+
+if __name__ == "__main__":
+    main()
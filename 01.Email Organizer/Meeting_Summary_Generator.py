@@ -1,11 +1,15 @@
-import requests
-from datetime import datetime, timedelta
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-from reportlab.lib.units import inch
-import time
+import calendar_cache
+import event_records
+import graph_client
+import json
+import meeting_stats
+import os
+import re
+import report_writers
+import sys
+import token_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
 
 # ============================================================
 # CONFIGURATION
@@ -14,81 +18,68 @@ import time
 CLIENT_ID = "YOUR_CLIENT_ID"
 YOUR_EMAIL = "YOUR_EMAIL_ADDRESS"
 
+# Permissions requested at login (offline_access allows silent token refresh;
+# add Calendars.Read.Shared to report on other mailboxes with BATCH_USERS)
+SCOPES = "Calendars.Read offline_access"
+
 # Summary settings
 SUMMARY_TYPE = "weekly"  # Options: "daily", "weekly", "monthly"
+OUTPUT_FORMAT = "pdf"    # Options: "pdf", "csv", "ndjson", "html" (only PDF needs reportlab)
+
+# Time zone for the report, as an IANA name such as "Europe/London"
+# (None uses this computer's time zone)
+TIME_ZONE = None
+
+# Hours shown in the meeting load heatmap (24-hour format)
+HEATMAP_START_HOUR = 8
+HEATMAP_END_HOUR = 21
+
+# Write the report as events stream past (PDFs page by page) so memory
+# stays flat on very large reports. Events are read twice (statistics
+# first), which is a cheap local read when USE_CALENDAR_CACHE is on.
+STREAM_REPORT = True
+
+# Meetings per PDF table; busier days are split into several tables
+TABLE_CHUNK_ROWS = 40
+
+# Events per page requested from Graph (pages are followed automatically)
+PAGE_SIZE = 100
+
+# Batch mode: mailboxes to report on, one report each (empty = only your own
+# calendar). Their calendars must be shared with you.
+BATCH_USERS = []  # e.g. ["alice@contoso.com", "bob@contoso.com"]
+
+# Folder the batch reports and manifest.json are written to
+OUTPUT_DIR = "meeting_summaries"
+
+# Calendars downloaded at the same time in batch mode
+FETCH_WORKERS = 8
+
+# Processes rendering reports in batch mode (None = one per CPU core)
+RENDER_WORKERS = None
+
+# Keep a local copy of the calendar (shared by the calendar scripts) and
+# only download what changed since the last run
+USE_CALENDAR_CACHE = True
 
 # ============================================================
 # AUTHENTICATION
 # ============================================================
 
-def get_access_token_device_code():
-    """Get access token using device code flow"""
-    
-    device_code_url = "https://login.microsoftonline.com/common/oauth2/v2.0/devicecode"
-    
-    data = {
-        "client_id": CLIENT_ID,
-        "scope": "Calendars.Read offline_access"
-    }
-    
-    print("Requesting authentication...")
+def get_access_token():
+    """Get a valid access token (cached and silently refreshed, device code login only when needed)"""
     
-    try:
-        response = requests.post(device_code_url, data=data)
-        response.raise_for_status()
-        device_code_response = response.json()
-        
-        if 'error' in device_code_response or 'message' not in device_code_response:
-            print(f"\n❌ Authentication error")
-            return None
-        
-    except requests.exceptions.RequestException as e:
-        print(f"\n❌ Network error: {e}")
-        return None
-    
-    print("\n" + "="*60)
-    print("AUTHENTICATION REQUIRED")
-    print("="*60)
-    print(f"\n{device_code_response['message']}\n")
-    print(f"User Code: {device_code_response['user_code']}")
-    print(f"Visit: {device_code_response['verification_uri']}")
-    print("\nWaiting for authentication...")
-    print("="*60 + "\n")
-    
-    token_url = "https://login.microsoftonline.com/common/oauth2/v2.0/token"
-    
-    token_data = {
-        "grant_type": "urn:ietf:params:oauth:grant-type:device_code",
-        "client_id": CLIENT_ID,
-        "device_code": device_code_response['device_code']
-    }
-    
-    while True:
-        try:
-            token_response = requests.post(token_url, data=token_data)
-            token_result = token_response.json()
-            
-            if "access_token" in token_result:
-                print("✓ Authentication successful!\n")
-                return token_result["access_token"]
-            elif token_result.get("error") == "authorization_pending":
-                print(".", end="", flush=True)
-                time.sleep(5)
-            else:
-                print(f"\n❌ Error: {token_result.get('error_description', 'Unknown error')}")
-                return None
-        except Exception as e:
-            print(f"\n❌ Error: {e}")
-            return None
+    return token_cache.get_token_manager(CLIENT_ID, SCOPES).get_token()
 
 # ============================================================
 # CALENDAR FUNCTIONS
 # ============================================================
 
-def get_date_range(summary_type):
+def get_date_range(summary_type, zone=None):
     """Calculate date range based on summary type"""
     
-    today = datetime.now()
+    # Naive datetimes are this computer's local time
+    today = datetime.now(zone) if zone else datetime.now()
     
     if summary_type == "daily":
         start_date = today.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -104,176 +95,179 @@ def get_date_range(summary_type):
         start_date = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
         # Get end of current month
         if today.month == 12:
-            end_date = today.replace(year=today.year + 1, month=1, day=1) - timedelta(seconds=1)
+            end_date = start_date.replace(year=today.year + 1, month=1) - timedelta(seconds=1)
         else:
-            end_date = today.replace(month=today.month + 1, day=1) - timedelta(seconds=1)
+            end_date = start_date.replace(month=today.month + 1) - timedelta(seconds=1)
     else:
         start_date = today
         end_date = today
     
     return start_date, end_date
 
-def get_calendar_events(access_token, start_date, end_date):
-    """Get calendar events within date range"""
+def get_calendar_events(access_token, start_date, end_date, user=None):
+    """Stream calendar events within date range (all pages, ordered by start)
+    
+    Raises graph_client.GraphError if the calendar cannot be read, so an
+    unreadable mailbox is never reported as one without meetings.
+    """
     
-    url = "https://graph.microsoft.com/v1.0/me/calendar/calendarView"
+    url = f"/users/{user}/calendar/calendarView" if user else "/me/calendar/calendarView"
     
     params = {
-        "startDateTime": start_date.isoformat() + "Z",
-        "endDateTime": end_date.isoformat() + "Z",
-        "$select": "subject,start,end,location,attendees,organizer,bodyPreview",
+        "startDateTime": event_records.utc_text(start_date) + "Z",
+        "endDateTime": event_records.utc_text(end_date) + "Z",
+        "$select": "subject,start,end,isAllDay,location,attendees,organizer,bodyPreview",
         "$orderby": "start/dateTime"
     }
     
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
+    # Times come back in UTC and are converted to TIME_ZONE once, in EventRecords
+    headers = {"Prefer": event_records.PREFER_UTC}
     
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        
-        if response.status_code == 200:
-            return response.json().get('value', [])
-        else:
-            print(f"❌ Error fetching events: {response.status_code}")
-            return []
-    except Exception as e:
-        print(f"❌ Error: {e}")
-        return []
+    if USE_CALENDAR_CACHE:
+        yield from calendar_cache.get_events(access_token, start_date, end_date, user=user)
+    else:
+        yield from graph_client.iter_items(access_token, url, params=params, page_size=PAGE_SIZE, headers=headers)
 
 # ============================================================
-# PDF GENERATION
+# REPORT GENERATION
 # ============================================================
 
-def create_pdf_summary(events, start_date, end_date, filename):
-    """Generate PDF summary of meetings"""
-    
-    doc = SimpleDocTemplate(filename, pagesize=letter)
-    story = []
-    styles = getSampleStyleSheet()
-    
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#1a73e8'),
-        spaceAfter=30,
-        alignment=1  # Center
-    )
+def create_summary(load_events, start_date, end_date, filename, zone=None, output_format=None):
+    """Generate the meeting summary report in OUTPUT_FORMAT
     
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=16,
-        textColor=colors.HexColor('#1a73e8'),
-        spaceAfter=12
-    )
+    load_events() returns a fresh stream of EventRecords. With STREAM_REPORT
+    it is called twice (statistics first, then the report body) so the
+    events are never all in memory. Returns the number of meetings (0 means
+    no report was written).
+    """
+    
+    output_format = output_format or OUTPUT_FORMAT
+    
+    if STREAM_REPORT:
+        columns = meeting_stats.EventColumns(load_events())
+    else:
+        events = list(load_events())
+        columns = meeting_stats.EventColumns(events)
+        load_events = lambda: events
     
-    # Title
-    title = Paragraph(f"Meeting Summary Report", title_style)
-    story.append(title)
+    if len(columns) == 0:
+        return 0
     
-    # Date range
-    date_range = Paragraph(
-        f"<b>Period:</b> {start_date.strftime('%B %d, %Y')} - {end_date.strftime('%B %d, %Y')}",
-        styles['Normal']
+    stats = meeting_stats.compute_stats(columns, start_date, end_date, zone)
+    
+    report_writers.write_report(
+        output_format, filename, stats, load_events(), start_date, end_date,
+        stream=STREAM_REPORT,
+        heatmap_hours=range(HEATMAP_START_HOUR, HEATMAP_END_HOUR),
+        table_rows=TABLE_CHUNK_ROWS
     )
-    story.append(date_range)
-    story.append(Spacer(1, 0.3*inch))
-    
-    # Summary statistics
-    total_meetings = len(events)
-    total_hours = sum([
-        (datetime.fromisoformat(event['end']['dateTime']) - 
-         datetime.fromisoformat(event['start']['dateTime'])).total_seconds() / 3600
-        for event in events
-    ])
-    
-    stats_data = [
-        ["Total Meetings:", str(total_meetings)],
-        ["Total Hours:", f"{total_hours:.1f} hours"],
-        ["Average per Day:", f"{total_meetings / 7:.1f} meetings"]
-    ]
-    
-    stats_table = Table(stats_data, colWidths=[2*inch, 2*inch])
-    stats_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f0f0f0')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.white)
-    ]))
-    
-    story.append(stats_table)
-    story.append(Spacer(1, 0.5*inch))
-    
-    # Group events by day
-    events_by_day = {}
-    for event in events:
-        start_dt = datetime.fromisoformat(event['start']['dateTime'])
-        day_key = start_dt.strftime('%Y-%m-%d')
-        
-        if day_key not in events_by_day:
-            events_by_day[day_key] = []
-        events_by_day[day_key].append(event)
     
-    # Meetings details
-    story.append(Paragraph("Meeting Details", heading_style))
-    story.append(Spacer(1, 0.2*inch))
+    print(f"✓ {output_format.upper()} generated: {filename}")
     
-    for day_key in sorted(events_by_day.keys()):
-        day_events = events_by_day[day_key]
-        day_date = datetime.strptime(day_key, '%Y-%m-%d')
-        
-        # Day header
-        day_header = Paragraph(
-            f"<b>{day_date.strftime('%A, %B %d, %Y')}</b> ({len(day_events)} meetings)",
-            styles['Heading3']
-        )
-        story.append(day_header)
-        story.append(Spacer(1, 0.1*inch))
+    return stats['total_meetings']
+
+# ============================================================
+# BATCH REPORTS
+# ============================================================
+
+def report_filename(start_date, end_date, user=None, output_format=None):
+    """File name for a report (the user's address is made safe for file names)"""
+    
+    period = f"{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}"
+    extension = output_format or OUTPUT_FORMAT
+    
+    if user:
+        return f"meeting_summary_{re.sub(r'[^A-Za-z0-9.@-]', '_', user)}_{period}.{extension}"
+    
+    return f"meeting_summary_{period}.{extension}"
+
+def fetch_user_records(access_token, user, start_date, end_date, zone=None):
+    """Download one user's calendar as a list of EventRecords (runs on a fetch thread)"""
+    
+    return list(event_records.iter_records(get_calendar_events(access_token, start_date, end_date, user), zone))
+
+def render_user_report(user, records, start_date, end_date, path, zone=None):
+    """Render one user's report (runs in a worker process) and return its manifest entry"""
+    
+    entry = {"user": user, "file": None, "meetings": 0, "status": "ok"}
+    
+    try:
+        entry["meetings"] = create_summary(lambda: iter(records), start_date, end_date, path, zone)
         
-        # Meeting table for this day
-        meeting_data = [["Time", "Subject", "Location", "Attendees"]]
+        if entry["meetings"]:
+            entry["file"] = os.path.basename(path)
+        else:
+            entry["status"] = "no meetings"
+    except Exception as e:
+        entry["status"] = "error"
+        entry["error"] = str(e)
+    
+    return entry
+
+def write_manifest(output_dir, entries, start_date, end_date):
+    """Write manifest.json atomically so readers never see half a file"""
+    
+    path = os.path.join(output_dir, "manifest.json")
+    tmp_path = path + ".tmp"
+    
+    manifest = {
+        "generatedAt": datetime.now(timezone.utc).isoformat(),
+        "summaryType": SUMMARY_TYPE,
+        "start": start_date.isoformat(),
+        "end": end_date.isoformat(),
+        "reports": entries
+    }
+    
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    
+    os.replace(tmp_path, path)
+    
+    return path
+
+def run_batch(access_token, users, start_date, end_date, zone=None, output_dir=None):
+    """One report per user: calendars fetched on threads, reports rendered on every core
+    
+    Each user's report goes to the process pool as soon as their calendar has
+    downloaded, so fetching and rendering overlap. Returns the manifest
+    entries, in the order the users were given.
+    """
+    
+    output_dir = output_dir or OUTPUT_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    
+    users = list(dict.fromkeys(users))  # Drop duplicates, keep order
+    entries = {}
+    
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as fetch_pool, \
+            ProcessPoolExecutor(max_workers=RENDER_WORKERS) as render_pool:
+        fetches = {
+            fetch_pool.submit(fetch_user_records, access_token, user, start_date, end_date, zone): user
+            for user in users
+        }
+        renders = []
         
-        for event in day_events:
-            start_dt = datetime.fromisoformat(event['start']['dateTime'])
-            end_dt = datetime.fromisoformat(event['end']['dateTime'])
-            
-            time_str = f"{start_dt.strftime('%I:%M %p')} - {end_dt.strftime('%I:%M %p')}"
-            subject = event.get('subject', 'No Subject')
-            location = event.get('location', {}).get('displayName', 'No Location')
+        for future in as_completed(fetches):
+            user = fetches[future]
             
-            attendees = event.get('attendees', [])
-            attendee_count = len(attendees)
-            attendee_str = f"{attendee_count} attendees" if attendee_count > 0 else "No attendees"
+            try:
+                records = future.result()
+            except Exception as e:
+                print(f"❌ Error fetching calendar for {user}: {e}")
+                entries[user] = {"user": user, "file": None, "meetings": 0, "status": "error", "error": str(e)}
+                continue
             
-            meeting_data.append([time_str, subject, location, attendee_str])
-        
-        meeting_table = Table(meeting_data, colWidths=[1.5*inch, 2.5*inch, 1.5*inch, 1.2*inch])
-        meeting_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1a73e8')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP')
-        ]))
+            path = os.path.join(output_dir, report_filename(start_date, end_date, user))
+            renders.append(render_pool.submit(render_user_report, user, records, start_date, end_date, path, zone))
         
-        story.append(meeting_table)
-        story.append(Spacer(1, 0.3*inch))
+        for future in as_completed(renders):
+            entry = future.result()
+            entries[entry["user"]] = entry
     
-    # Build PDF
-    doc.build(story)
-    print(f"✓ PDF generated: {filename}")
+    entries = [entries[user] for user in users]
+    write_manifest(output_dir, entries, start_date, end_date)
+    
+    return entries
 
 # ============================================================
 # MAIN SCRIPT
@@ -285,37 +279,55 @@ def main():
     print("="*60 + "\n")
     
     # Authenticate
-    access_token = get_access_token_device_code()
+    access_token = get_access_token()
     
     if not access_token:
         print("❌ Authentication failed!")
         return
     
     # Get date range
-    start_date, end_date = get_date_range(SUMMARY_TYPE)
+    zone = event_records.get_zone(TIME_ZONE)
+    start_date, end_date = get_date_range(SUMMARY_TYPE, zone)
     
     print(f"Fetching meetings from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}...")
     
-    # Get calendar events
-    events = get_calendar_events(access_token, start_date, end_date)
-    
-    if not events:
-        print("❌ No meetings found in the specified date range.")
+    if BATCH_USERS:
+        print(f"Generating reports for {len(BATCH_USERS)} mailboxes...")
+        entries = run_batch(access_token, BATCH_USERS, start_date, end_date, zone)
+        
+        print("\n" + "="*60)
+        print("BATCH COMPLETE")
+        print("="*60)
+        print(f"Reports saved in: {os.path.abspath(OUTPUT_DIR)}")
+        print(f"Reports written: {sum(1 for entry in entries if entry['file'])}")
+        print(f"No meetings: {sum(1 for entry in entries if entry['status'] == 'no meetings')}")
+        print(f"Errors: {sum(1 for entry in entries if entry['status'] == 'error')}")
+        print("="*60 + "\n")
         return
     
-    print(f"✓ Found {len(events)} meetings")
+    # Calendar events as records parsed once (a fresh stream on each call)
+    def load_events():
+        return event_records.iter_records(get_calendar_events(access_token, start_date, end_date), zone)
     
-    # Generate PDF
-    filename = f"meeting_summary_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.pdf"
+    # Generate report
+    filename = report_filename(start_date, end_date)
     
-    print(f"Generating PDF report...")
-    create_pdf_summary(events, start_date, end_date, filename)
+    print(f"Generating {OUTPUT_FORMAT.upper()} report...")
+    try:
+        total_meetings = create_summary(load_events, start_date, end_date, filename, zone)
+    except graph_client.GraphError as e:
+        print(f"❌ Could not read your calendar, no report written: {e}")
+        return
+    
+    if total_meetings == 0:
+        print("❌ No meetings found in the specified date range.")
+        return
     
     print("\n" + "="*60)
     print("SUMMARY COMPLETE")
     print("="*60)
     print(f"Report saved as: {filename}")
-    print(f"Total meetings: {len(events)}")
+    print(f"Total meetings: {total_meetings}")
     print("="*60 + "\n")
 
 if __name__ == "__main__":
@@ -329,4 +341,6 @@ if __name__ == "__main__":
         import traceback
         traceback.print_exc()
     finally:
-        input("\nPress Enter to close...")
+        # Scheduled runs (cron, Task Scheduler) have no console to wait on
+        if sys.stdin.isatty():
+            input("\nPress Enter to close...")
@@ -0,0 +1,166 @@
+import json
+import math
+import os
+import time
+from datetime import datetime, timezone
+from mail_sync import parse_received
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+# Where each poller's estimate and chosen interval are kept
+STATE_DIR = os.path.join(os.path.expanduser("~"), ".email_organizer")
+
+# Bounds for the check interval (in seconds)
+MIN_INTERVAL = 30
+MAX_INTERVAL = 900
+
+# At this many new emails an hour the base interval (the script's
+# CHECK_INTERVAL) is kept; four times busier halves it, four times
+# quieter doubles it
+REFERENCE_ARRIVALS_PER_HOUR = 10
+
+# How quickly the arrival rate estimate forgets the past (in seconds);
+# an hour-old check counts about a third as much as the latest one
+TIME_CONSTANT = 3600
+
+# The interval may at most grow by this factor from one check to the
+# next (it shrinks at once when mail picks up)
+MAX_GROWTH = 1.5
+
+# ============================================================
+# ADAPTIVE POLLER
+# ============================================================
+
+def arrivals_since(messages, since):
+    """How many messages were received after `since` (a Unix time; None counts them all)
+
+    A delta round also returns messages that were only read, flagged or
+    moved since the last check. Those are not new mail and must not
+    shorten the interval. Messages without a receivedDateTime are counted.
+    """
+
+    if since is None:
+        return len(messages)
+
+    return sum(
+        1 for message in messages
+        if not message.get('receivedDateTime') or parse_received(message['receivedDateTime']).timestamp() > since
+    )
+
+class AdaptivePoller:
+    """Chooses the next check interval from the observed arrival rate
+
+    After each check, record() is given how many new emails it found. The
+    rate is an exponentially weighted moving average, weighted by the time
+    each check covered, so short and long intervals count fairly. The next
+    interval scales with 1 / sqrt(rate), within [min_interval,
+    max_interval]: short during a busy afternoon, long overnight. For a
+    given number of checks, that spread gives the lowest mean delay
+    between an email arriving and a check finding it; with the defaults
+    it makes a few fewer checks than the fixed base interval.
+
+    The estimate and the chosen interval are written to
+    <name>.polling.json after every check, for monitoring and so a
+    restart picks up where the last run left off.
+
+        poller = AdaptivePoller("response_bot_inbox", CHECK_INTERVAL)
+        time.sleep(poller.record_messages(delta_messages))
+    """
+
+    def __init__(self, name, base_interval, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+                 reference_per_hour=REFERENCE_ARRIVALS_PER_HOUR, path=None):
+        if path is None:
+            path = os.path.join(STATE_DIR, f"{name}.polling.json")
+
+        self.path = path
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.reference_rate = reference_per_hour / 3600
+
+        self.interval = self.clamp(base_interval)
+        self.rate = self.reference_rate  # emails per second
+        self.last_check = None
+        self.checks = 0
+        self.arrivals = 0
+
+        self.load()
+
+    def clamp(self, interval):
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def record(self, arrivals, now=None):
+        """Fold one check's arrivals into the rate, returns the next interval (in seconds)"""
+
+        now = time.time() if now is None else now
+
+        if self.last_check is not None and now > self.last_check:
+            elapsed = now - self.last_check
+            weight = math.exp(-elapsed / TIME_CONSTANT)
+            self.rate = weight * self.rate + (1 - weight) * arrivals / elapsed
+
+        self.last_check = now
+        self.checks += 1
+        self.arrivals += arrivals
+
+        if self.rate > 0:
+            wanted = self.base_interval * math.sqrt(self.reference_rate / self.rate)
+        else:
+            wanted = self.max_interval
+
+        self.interval = self.clamp(min(wanted, self.interval * MAX_GROWTH))
+
+        self.save()
+        return self.interval
+
+    def record_messages(self, messages, now=None):
+        """record() a check's messages, counting only those received since the last check
+
+        The messages need their receivedDateTime.
+        """
+
+        return self.record(arrivals_since(messages, self.last_check), now)
+
+    def metrics(self):
+        """Current estimate and interval, as written to the state file"""
+
+        return {
+            "interval": round(self.interval, 1),
+            "arrivalsPerHour": round(self.rate * 3600, 4),
+            "checks": self.checks,
+            "arrivals": self.arrivals,
+            "lastCheck": self.last_check
+        }
+
+    # --------------------------------------------------------
+    # State file
+    # --------------------------------------------------------
+
+    def load(self):
+        """Start from the last run's estimate (a missing or damaged file just means defaults)"""
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        self.rate = state.get("arrivalsPerHour", self.rate * 3600) / 3600
+        self.interval = self.clamp(state.get("interval", self.interval))
+        self.last_check = state.get("lastCheck")
+
+    def save(self):
+        """Write the metrics atomically so a crash never leaves half a file"""
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({**self.metrics(), "savedAt": datetime.now(timezone.utc).isoformat()}, f)
+
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️  Could not save polling state: {e}")
@@ -0,0 +1,171 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import reduce
+from operator import and_
+import graph_client
+from event_records import local_timestamp, timestamp_of, to_local, utc_text
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+# Resolution of the availability bitmaps (Graph accepts 5 to 1440)
+SLOT_MINUTES = 5
+
+# Graph answers getSchedule for at most 20 people per call
+SCHEDULES_PER_REQUEST = 20
+
+# getSchedule calls sent at the same time
+FETCH_WORKERS = 8
+
+# availabilityView digits: 0 free, 1 tentative, 2 busy, 3 out of office, 4 working elsewhere
+FREE_DIGITS = "0"
+
+# ============================================================
+# SLOT BITMAPS
+# ============================================================
+#
+# A person's availability over the range is one Python int: bit i is set
+# when slot i (SLOT_MINUTES long, counted from the range start) is free.
+# Intersecting many people is then a chain of integer ANDs, which runs in
+# C over the whole range at once.
+
+class SlotGrid:
+    """Maps times in [start, end) onto slot numbers
+
+    Times may be datetimes or epoch timestamps; slots are counted in real
+    elapsed time, so a DST change in the range does not shift them.
+    """
+
+    def __init__(self, start, end, slot_minutes=None, zone=None):
+        self.zone = zone
+        self.origin = timestamp_of(start)
+        self.slot = (slot_minutes or SLOT_MINUTES) * 60
+        self.size = int(-(-(timestamp_of(end) - self.origin) // self.slot))  # Round up
+        self.all_slots = (1 << self.size) - 1
+
+    @property
+    def start(self):
+        return to_local(self.origin, self.zone)
+
+    @property
+    def end(self):
+        return to_local(self.origin + self.size * self.slot, self.zone)
+
+    def index(self, moment):
+        """Slot number containing `moment`, clamped to the grid"""
+
+        return int(min(self.size, max(0, (timestamp_of(moment) - self.origin) // self.slot)))
+
+    def mask(self, start, end):
+        """Bits for every slot touched by [start, end)"""
+
+        first = self.index(start)
+        last = int(min(self.size, max(0, -(-(timestamp_of(end) - self.origin) // self.slot))))
+
+        if last <= first:
+            return 0
+
+        return ((1 << (last - first)) - 1) << first
+
+    def working_hours(self, start_hour, end_hour, weekdays_only=False):
+        """Bits for the working hours of every local day in the grid"""
+
+        bits = 0
+        day = self.start.date()
+        last_day = self.end.date()
+
+        while day <= last_day:
+            if not weekdays_only or day.weekday() < 5:
+                bits |= self.mask(local_timestamp(day, start_hour, self.zone), local_timestamp(day, end_hour, self.zone))
+            day += timedelta(days=1)
+
+        return bits
+
+    def free_from_records(self, records):
+        """Free bits for a calendar given as EventRecords"""
+
+        busy = 0
+        for record in records:
+            busy |= self.mask(record.start_ts, record.end_ts)
+
+        return self.all_slots & ~busy
+
+    def free_from_view(self, view):
+        """Free bits from a getSchedule availabilityView string (one digit per slot)"""
+
+        view = view[:self.size]
+        bits = "".join("1" if digit in FREE_DIGITS else "0" for digit in reversed(view))
+
+        # Slots Graph did not report on count as busy
+        return int(bits, 2) if bits else 0
+
+    def windows(self, bits, min_minutes=0):
+        """Free (start, end) datetimes in `bits` lasting at least `min_minutes`"""
+
+        min_slots = max(1, -(-min_minutes * 60 // self.slot))
+
+        # Bit i is character i once the binary string is reversed
+        slots = format(bits, "b").zfill(self.size)[::-1]
+
+        return [
+            (to_local(self.origin + match.start() * self.slot, self.zone),
+             to_local(self.origin + match.end() * self.slot, self.zone))
+            for match in re.finditer(f"1{{{min_slots},}}", slots)
+        ]
+
+def common_free(bitmaps):
+    """Slots free for everyone"""
+
+    return reduce(and_, bitmaps)
+
+# ============================================================
+# GRAPH FETCH
+# ============================================================
+
+def get_schedule(access_token, addresses, start, end, slot_minutes=None):
+    """One getSchedule call, returns {address: availabilityView}
+
+    Raises GraphError if the call fails, so a chunk of attendees never
+    quietly drops out of the intersection. People Graph has no schedule
+    for (reported one by one) are left out of the result.
+    """
+
+    url = "/me/calendar/getSchedule"
+
+    body = {
+        "schedules": list(addresses),
+        "startTime": {"dateTime": utc_text(start), "timeZone": "UTC"},
+        "endTime": {"dateTime": utc_text(end), "timeZone": "UTC"},
+        "availabilityViewInterval": slot_minutes or SLOT_MINUTES
+    }
+
+    response = graph_client.graph_post(access_token, url, json=body)
+
+    if response.status_code != 200:
+        raise graph_client.GraphError(f"Error fetching schedules: {response.status_code}", response.status_code)
+
+    views = {}
+    for schedule in response.json().get("value", []):
+        if "error" in schedule:
+            print(f"⚠️  No schedule for {schedule.get('scheduleId')}: {schedule['error'].get('message')}")
+            continue
+        views[schedule["scheduleId"].lower()] = schedule.get("availabilityView", "")
+
+    return views
+
+def fetch_availability(access_token, addresses, start, end, slot_minutes=None):
+    """Fetch everyone's availabilityView concurrently, 20 people per call
+
+    Raises (GraphError, or the request's own error) if any call fails.
+    """
+
+    chunks = [addresses[i:i + SCHEDULES_PER_REQUEST] for i in range(0, len(addresses), SCHEDULES_PER_REQUEST)]
+    views = {}
+
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        for result in pool.map(lambda chunk: get_schedule(access_token, chunk, start, end, slot_minutes), chunks):
+            views.update(result)
+
+    return views
@@ -0,0 +1,301 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import graph_client
+from event_records import PREFER_UTC, to_utc
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+# Where the calendar database is kept between runs
+STATE_DIR = os.path.join(os.path.expanduser("~"), ".email_organizer")
+
+# Months that were synced this recently are read straight from the cache
+# (in seconds); months entirely in the past change rarely and are checked
+# less often
+SYNC_INTERVAL = 300
+PAST_SYNC_INTERVAL = 86400
+
+# Events per page requested from Graph
+PAGE_SIZE = 100
+
+# ============================================================
+# SYNC WINDOWS
+# ============================================================
+#
+# calendarView/delta tracks one fixed date window per deltaLink, so the
+# cache is synced in calendar-month windows (UTC). A report for any range
+# syncs only the months it touches, each with its own deltaLink.
+
+def month_start(moment):
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def next_month(moment):
+    if moment.month == 12:
+        return moment.replace(year=moment.year + 1, month=1)
+    return moment.replace(month=moment.month + 1)
+
+def month_windows(start, end):
+    """(window_start, window_end) for every month overlapping [start, end)"""
+
+    window_start = month_start(start)
+
+    while window_start < end:
+        window_end = next_month(window_start)
+        yield window_start, window_end
+        window_start = window_end
+
+def to_key(moment):
+    """Sortable text form of a naive UTC datetime, used for the month and start/end columns"""
+
+    return moment.strftime("%Y-%m-%dT%H:%M:%S")
+
+# ============================================================
+# CALENDAR CACHE
+# ============================================================
+
+class CalendarCache:
+    """Local copy of the calendar in SQLite, kept current with calendarView/delta
+
+    Events are stored whole (as Graph returned them) with start/end columns
+    indexed for range scans. An event spanning two months is stored once
+    per month, and reads return it once. `user` caches someone else's
+    calendar (shared with you) instead of your own.
+    """
+
+    def __init__(self, name="calendar", path=None, user=None):
+        if path is None:
+            os.makedirs(STATE_DIR, exist_ok=True)
+            path = os.path.join(STATE_DIR, f"{name}.sqlite3")
+
+        self.path = path
+        self.base = f"/users/{user}" if user else "/me"
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " id TEXT NOT NULL,"
+            " month TEXT NOT NULL,"
+            " starts_at TEXT NOT NULL,"
+            " ends_at TEXT NOT NULL,"
+            " data TEXT NOT NULL,"
+            " PRIMARY KEY (id, month)"
+            ") WITHOUT ROWID"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS events_starts_at ON events (starts_at, ends_at)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_state ("
+            " month TEXT PRIMARY KEY,"
+            " delta_link TEXT NOT NULL,"
+            " synced_at REAL NOT NULL"
+            ")"
+        )
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # --------------------------------------------------------
+    # Reading
+    # --------------------------------------------------------
+
+    def events(self, start, end):
+        """Cached events overlapping [start, end), ordered by start
+
+        An event stored for several months may hold an older copy in a
+        month synced less recently; the copy from the month synced last
+        is the one returned (and the one whose times are checked).
+        """
+
+        window = (to_key(to_utc(end)), to_key(to_utc(start)))
+
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT data FROM ("
+                " SELECT events.id, starts_at, ends_at, data, ROW_NUMBER() OVER ("
+                "  PARTITION BY events.id ORDER BY sync_state.synced_at DESC, events.month DESC"
+                " ) AS copy"
+                " FROM events LEFT JOIN sync_state ON sync_state.month = events.month"
+                " WHERE events.id IN (SELECT id FROM events WHERE starts_at < ? AND ends_at > ?)"
+                ") WHERE copy = 1 AND starts_at < ? AND ends_at > ?"
+                " ORDER BY starts_at, id",
+                window + window
+            ).fetchall()
+
+        for (data,) in rows:
+            yield json.loads(data)
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(DISTINCT id) FROM events").fetchone()[0]
+
+    # --------------------------------------------------------
+    # Syncing
+    # --------------------------------------------------------
+
+    def sync_state(self, month):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT delta_link, synced_at FROM sync_state WHERE month = ?", (month,)
+            ).fetchone()
+
+    def is_fresh(self, window_start, window_end, now=None):
+        """True if the month was synced recently enough to skip Graph"""
+
+        state = self.sync_state(to_key(window_start))
+        if state is None:
+            return False
+
+        now = now or time.time()
+        in_past = window_end <= to_utc(now)
+        return now - state[1] < (PAST_SYNC_INTERVAL if in_past else SYNC_INTERVAL)
+
+    def sync(self, access_token, start, end, force=False):
+        """Bring every month overlapping [start, end) up to date
+
+        Returns False if any month could not be synced; cached data for it
+        is still served.
+        """
+
+        ok = True
+
+        for window_start, window_end in month_windows(to_utc(start), to_utc(end)):
+            if force or not self.is_fresh(window_start, window_end):
+                ok = self.sync_window(access_token, window_start, window_end) and ok
+
+        return ok
+
+    def sync_window(self, access_token, window_start, window_end):
+        """Fetch one month's changes and apply them in a single transaction"""
+
+        month = to_key(window_start)
+        state = self.sync_state(month)
+
+        if state is None:
+            url, params = self.initial_delta_request(window_start, window_end)
+        else:
+            url, params = state[0], None
+
+        full_sync = state is None
+        headers = {"Prefer": f"odata.maxpagesize={PAGE_SIZE}, {PREFER_UTC}"}
+        changed = []
+        removed = []
+
+        try:
+            while url:
+                response = graph_client.graph_get(access_token, url, params=params, headers=headers)
+
+                if response.status_code == 410:
+                    # Sync state expired on the server - refetch the whole month
+                    print(f"⚠️  Calendar sync state for {month[:7]} expired, refetching the month")
+                    url, params = self.initial_delta_request(window_start, window_end)
+                    full_sync = True
+                    changed, removed = [], []
+                    continue
+
+                if response.status_code != 200:
+                    print(f"❌ Error syncing calendar for {month[:7]}: {response.status_code}")
+                    return False
+
+                page = response.json()
+
+                for event in page.get('value', []):
+                    if '@removed' in event:
+                        removed.append(event['id'])
+                    else:
+                        changed.append(event)
+
+                params = None
+                url = page.get('@odata.nextLink')
+                delta_link = page.get('@odata.deltaLink')
+
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            return False
+
+        if not delta_link:
+            print(f"❌ Error syncing calendar for {month[:7]}: no deltaLink returned")
+            return False
+
+        self.apply(month, changed, removed, delta_link, full_sync)
+        return True
+
+    def initial_delta_request(self, window_start, window_end):
+        """URL and params for the first delta round of a month"""
+
+        params = {
+            "startDateTime": window_start.isoformat() + "Z",
+            "endDateTime": window_end.isoformat() + "Z"
+        }
+
+        return f"{self.base}/calendarView/delta", params
+
+    def apply(self, month, changed, removed, delta_link, full_sync):
+        """Write one month's changes and its new deltaLink atomically"""
+
+        rows = [
+            (event['id'], month, event['start']['dateTime'][:19], event['end']['dateTime'][:19], json.dumps(event))
+            for event in changed
+        ]
+
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                if full_sync:
+                    self.conn.execute("DELETE FROM events WHERE month = ?", (month,))
+                self.conn.executemany(
+                    "DELETE FROM events WHERE id = ? AND month = ?", [(event_id, month) for event_id in removed]
+                )
+                self.conn.executemany("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?)", rows)
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?)", (month, delta_link, time.time())
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+# ============================================================
+# SHARED CACHE
+# ============================================================
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_calendar_cache(name="calendar", user=None):
+    """One CalendarCache per database, shared by everything in the process
+
+    Each user gets a database of their own, named after the address.
+    """
+
+    if user:
+        name = name + "-" + re.sub(r"[^\w.@-]", "_", user.lower())
+
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = CalendarCache(name, user=user)
+        return _caches[name]
+
+def get_events(access_token, start, end, name="calendar", user=None):
+    """Sync the months covering [start, end) if needed, then stream events from the cache
+
+    A month that failed to sync is served from the cache, but if it was
+    never synced at all there is nothing to serve and GraphError is raised
+    rather than reporting it as empty.
+    """
+
+    cache = get_calendar_cache(name, user)
+
+    if not cache.sync(access_token, start, end):
+        for window_start, _ in month_windows(to_utc(start), to_utc(end)):
+            if cache.sync_state(to_key(window_start)) is None:
+                raise graph_client.GraphError(f"Calendar for {to_key(window_start)[:7]} could not be synced")
+
+    yield from cache.events(start, end)
@@ -0,0 +1,498 @@
+import asyncio
+import json
+import os
+import secrets
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs, urlsplit
+import graph_client
+import graph_batch
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+# Where the subscription is remembered between runs
+STATE_DIR = os.path.join(os.path.expanduser("~"), ".email_organizer")
+
+# Subscription lifetime requested from Graph (mail allows at most 4230 minutes)
+SUBSCRIPTION_MINUTES = 4200
+
+# Renew the subscription this long before it expires (in seconds)
+RENEW_BEFORE = 3600
+
+# While notifications arrive, still catch up with a delta sync this often,
+# in case one was lost (in seconds)
+CATCH_UP_INTERVAL = 3600
+
+# Try to subscribe again this often after it failed (in seconds)
+RETRY_INTERVAL = 300
+
+# Wait this long after a notification for others to arrive, then fetch
+# them all together (in seconds)
+NOTIFICATION_DELAY = 0.5
+
+# Largest notification body the receiver accepts (in bytes)
+MAX_BODY_BYTES = 1024 * 1024
+
+# ============================================================
+# SUBSCRIPTIONS
+# ============================================================
+#
+# Graph posts to notificationUrl whenever a message is created in the
+# subscribed folder. It must be a public HTTPS address that forwards to
+# the local receiver (a reverse proxy or a tunnel such as ngrok or
+# devtunnels). When a subscription is created Graph first posts a
+# validationToken there and expects it back within 10 seconds.
+
+def expiration_time(minutes=SUBSCRIPTION_MINUTES):
+    return (datetime.now(timezone.utc) + timedelta(minutes=minutes)).strftime("%Y-%m-%dT%H:%M:%S.0000000Z")
+
+def parse_expiration(value):
+    """Graph's expirationDateTime (always UTC) as an aware datetime"""
+
+    return datetime.fromisoformat(value[:19]).replace(tzinfo=timezone.utc)
+
+def create_subscription(access_token, resource, notification_url, client_state):
+    """Subscribe to new messages in `resource`, returns the subscription or None"""
+
+    data = {
+        "changeType": "created",
+        "notificationUrl": notification_url,
+        "lifecycleNotificationUrl": notification_url,
+        "resource": resource,
+        "expirationDateTime": expiration_time(),
+        "clientState": client_state
+    }
+
+    try:
+        response = graph_client.graph_post(access_token, "/subscriptions", json=data)
+
+        if response.status_code != 201:
+            print(f"❌ Error creating subscription: {response.status_code} {response.text[:200]}")
+            return None
+
+        return response.json()
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return None
+
+def renew_subscription(access_token, subscription_id):
+    """Push a subscription's expiry out again, returns the new expirationDateTime or None"""
+
+    try:
+        response = graph_client.graph_patch(
+            access_token, f"/subscriptions/{subscription_id}", json={"expirationDateTime": expiration_time()}
+        )
+
+        if response.status_code != 200:
+            print(f"⚠️  Could not renew subscription: {response.status_code}")
+            return None
+
+        return response.json().get("expirationDateTime")
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return None
+
+def delete_subscription(access_token, subscription_id):
+    try:
+        response = graph_client.graph_request("DELETE", access_token, f"/subscriptions/{subscription_id}")
+        return response.status_code in (204, 404)
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return False
+
+def fetch_messages(access_token, message_ids, select, base="/me"):
+    """Get the messages with these ids, 20 to a $batch call (deleted ones are left out)"""
+
+    queue = graph_batch.BatchQueue(access_token)
+    gets = [queue.add("GET", f"{base}/messages/{message_id}?$select={select}") for message_id in message_ids]
+    queue.flush()
+
+    return [get.response for get in gets if get.ok and get.response]
+
+# ============================================================
+# NOTIFICATION RECEIVER
+# ============================================================
+
+class NotificationReceiver:
+    """Small asyncio HTTP server that Graph posts change notifications to
+
+    Answers the validation handshake (echoes validationToken as text/plain)
+    and acknowledges notifications with 202 straight away, as Graph wants
+    an answer within 3 seconds. Each notification whose clientState
+    matches is passed to on_notification on the event loop; others are
+    dropped, since anyone can post to a public URL.
+    """
+
+    def __init__(self, client_state, on_notification):
+        self.client_state = client_state
+        self.on_notification = on_notification
+        self.server = None
+        self.received = 0
+        self.rejected = 0
+
+    async def start(self, host, port):
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def handle_connection(self, reader, writer):
+        """Read one HTTP request, answer it and close the connection"""
+
+        try:
+            request_line = (await reader.readline()).decode("latin-1")
+            method, target, _ = request_line.split(" ", 2)
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            length = int(headers.get("content-length") or 0)
+
+            if length > MAX_BODY_BYTES:
+                status, content_type, payload = 413, "text/plain", b""
+            else:
+                body = await reader.readexactly(length) if length else b""
+                status, content_type, payload = self.handle_request(method, target, body)
+
+        except (ValueError, asyncio.IncompleteReadError):
+            status, content_type, payload = 400, "text/plain", b""
+
+        reason = {200: "OK", 202: "Accepted", 400: "Bad Request", 405: "Method Not Allowed", 413: "Payload Too Large"}
+
+        writer.write(
+            f"HTTP/1.1 {status} {reason.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1") + payload
+        )
+
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    def handle_request(self, method, target, body):
+        """(status, content type, body) for one request"""
+
+        query = parse_qs(urlsplit(target).query)
+
+        # Validation handshake when a subscription is created
+        if "validationToken" in query:
+            return 200, "text/plain", query["validationToken"][0].encode("utf-8")
+
+        if method != "POST":
+            return 405, "text/plain", b""
+
+        try:
+            notifications = json.loads(body or b"{}").get("value", [])
+        except ValueError:
+            return 400, "text/plain", b""
+
+        for notification in notifications:
+            client_state = str(notification.get("clientState") or "").encode("utf-8")
+
+            if not secrets.compare_digest(client_state, self.client_state.encode("utf-8")):
+                self.rejected += 1
+                continue
+
+            self.received += 1
+            self.on_notification(notification)
+
+        return 202, "text/plain", b""
+
+# ============================================================
+# SUBSCRIPTION MODE
+# ============================================================
+
+class SubscriptionRunner:
+    """Handle new mail as Graph reports it, falling back to delta polling
+
+    Runs three things side by side on one event loop:
+      - the receiver, queuing the id of every new message Graph reports
+      - a keeper that creates the subscription, renews it RENEW_BEFORE
+        its expiry and recreates it if Graph drops it
+      - a delta sync, at start, every CATCH_UP_INTERVAL and whenever
+        Graph says notifications were missed; every poll_interval while
+        there is no subscription
+
+    Only the reported ids are fetched, in $batch calls. poll(access_token)
+    and on_messages(access_token, messages) are the script's own blocking
+    functions and run one at a time in a worker thread; on_messages
+    returns how many actions it took. poll may return a mail_sync
+    DeltaRound or SearchRound, which is only saved if on_messages
+    returns: on_messages raises when it could not act on every message,
+    so the next poll hands them out again. The messages a delta sync returns
+    may include ones already handled from a notification, so on_messages
+    must skip repeats (the scripts' DedupStores do).
+
+        runner = SubscriptionRunner(get_access_token, process, poll, "id,subject",
+                                    "https://example.ngrok.app/notifications", port=8000)
+        asyncio.run(runner.run())
+    """
+
+    def __init__(self, get_token, on_messages, poll, select, notification_url, host="127.0.0.1", port=8000,
+                 name="subscription", base="/me", folder="inbox", poll_interval=RETRY_INTERVAL):
+        self.get_token = get_token
+        self.on_messages = on_messages
+        self.poll = poll
+        self.select = select
+        self.notification_url = notification_url
+        self.host = host
+        self.port = port
+        self.base = base
+        self.resource = f"{base.strip('/')}/mailFolders('{folder}')/messages"
+        self.poll_interval = poll_interval
+        self.state_path = os.path.join(STATE_DIR, f"{name}.subscription.json")
+
+        self.subscription = None  # {"id", "clientState", "expirationDateTime", "notificationUrl"}
+        self.client_state = secrets.token_urlsafe(24)
+        self.receiver = None
+        self.changed_ids = None
+        self.renew_now = None
+        self.catch_up = None
+        self.stopping = None
+        self.loop = None
+        self.busy = None
+
+        self.actions = 0
+        self.notified = 0
+        self.polls = 0
+
+    # --------------------------------------------------------
+    # Saved subscription
+    # --------------------------------------------------------
+
+    def load_state(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_state(self):
+        """Write the subscription atomically so a crash never leaves half a file"""
+
+        os.makedirs(STATE_DIR, exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({**self.subscription, "savedAt": datetime.now(timezone.utc).isoformat()}, f)
+
+        os.replace(tmp_path, self.state_path)
+
+    def clear_state(self):
+        try:
+            os.remove(self.state_path)
+        except OSError:
+            pass
+
+    # --------------------------------------------------------
+    # Keeping the subscription (blocking, run in a worker thread)
+    # --------------------------------------------------------
+
+    def subscribe(self):
+        """Reuse the subscription saved by the last run if it is still live, else create one"""
+
+        access_token = self.get_token()
+        if not access_token:
+            return False
+
+        saved = self.load_state()
+
+        if saved and saved.get("notificationUrl") == self.notification_url and saved.get("resource") == self.resource:
+            expires = renew_subscription(access_token, saved["id"])
+            if expires:
+                self.client_state = saved["clientState"]
+                self.receiver.client_state = self.client_state
+                self.subscription = {**saved, "expirationDateTime": expires}
+                self.save_state()
+                print(f"✓ Subscription renewed until {expires[:16]}")
+                return True
+
+        if saved:
+            delete_subscription(access_token, saved["id"])
+            self.clear_state()
+
+        subscription = create_subscription(access_token, self.resource, self.notification_url, self.client_state)
+        if subscription is None:
+            return False
+
+        self.subscription = {
+            "id": subscription["id"],
+            "clientState": self.client_state,
+            "expirationDateTime": subscription["expirationDateTime"],
+            "notificationUrl": self.notification_url,
+            "resource": self.resource
+        }
+        self.save_state()
+        print(f"✓ Subscribed to new mail until {subscription['expirationDateTime'][:16]}")
+
+        return True
+
+    def renew(self):
+        access_token = self.get_token()
+        expires = access_token and renew_subscription(access_token, self.subscription["id"])
+
+        if not expires:
+            return False
+
+        self.subscription["expirationDateTime"] = expires
+        self.save_state()
+        return True
+
+    def unsubscribe(self):
+        if self.subscription is None:
+            return
+
+        access_token = self.get_token()
+        if access_token and delete_subscription(access_token, self.subscription["id"]):
+            self.clear_state()
+
+        self.subscription = None
+
+    def seconds_until_renewal(self):
+        expires = parse_expiration(self.subscription["expirationDateTime"])
+        return max(0, (expires - datetime.now(timezone.utc)).total_seconds() - RENEW_BEFORE)
+
+    # --------------------------------------------------------
+    # Event loop tasks
+    # --------------------------------------------------------
+
+    def on_notification(self, notification):
+        """Called by the receiver for every genuine notification"""
+
+        event = notification.get("lifecycleEvent")
+
+        if event == "missed":
+            self.catch_up.set()
+        elif event == "reauthorizationRequired":
+            self.renew_now.set()
+        elif event == "subscriptionRemoved":
+            self.subscription = None
+            self.renew_now.set()
+            self.catch_up.set()
+        elif event is None:
+            message_id = (notification.get("resourceData") or {}).get("id")
+            if message_id:
+                self.changed_ids.put_nowait(message_id)
+
+    async def wait_for(self, event, timeout):
+        """Wait until `event` is set or `timeout` seconds pass, then clear it"""
+
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        event.clear()
+
+    async def handle(self, load):
+        """Load messages with load(access_token) and pass them to on_messages, one batch at a time"""
+
+        async with self.busy:
+            access_token = await asyncio.to_thread(self.get_token)
+            if not access_token:
+                print("❌ Could not renew access token - retrying later")
+                return
+
+            try:
+                messages = await asyncio.to_thread(load, access_token)
+
+                # A DeltaRound (or SearchRound) is only saved once on_messages returns
+                pending = messages if hasattr(messages, "save") else None
+                if pending is not None:
+                    messages = await asyncio.to_thread(list, pending)
+
+                if messages:
+                    self.actions += await asyncio.to_thread(self.on_messages, access_token, messages) or 0
+
+                if pending is not None:
+                    pending.save()
+            except Exception as e:
+                print(f"❌ Error: {e}")
+
+    async def keep_subscription(self):
+        while True:
+            if self.subscription is None:
+                subscribed = await asyncio.to_thread(self.subscribe)
+            else:
+                subscribed = await asyncio.to_thread(self.renew)
+                if not subscribed:
+                    print("⚠️  Subscription lost - subscribing again")
+                    self.subscription = None
+                    subscribed = await asyncio.to_thread(self.subscribe)
+
+            if not subscribed:
+                print(f"⚠️  Not subscribed - polling every {self.poll_interval} seconds, retrying in {RETRY_INTERVAL}")
+                self.subscription = None
+                self.catch_up.set()
+
+            wait = self.seconds_until_renewal() if self.subscription else RETRY_INTERVAL
+            await self.wait_for(self.renew_now, wait)
+
+    async def handle_notifications(self):
+        while True:
+            message_ids = [await self.changed_ids.get()]
+
+            # Graph often reports several messages at once; fetch them together
+            await asyncio.sleep(NOTIFICATION_DELAY)
+            while not self.changed_ids.empty():
+                message_ids.append(self.changed_ids.get_nowait())
+
+            message_ids = list(dict.fromkeys(message_ids))
+            self.notified += len(message_ids)
+
+            await self.handle(lambda access_token: fetch_messages(access_token, message_ids, self.select, self.base))
+
+    async def catch_up_with_delta(self):
+        while True:
+            self.polls += 1
+            await self.handle(self.poll)
+
+            await self.wait_for(self.catch_up, CATCH_UP_INTERVAL if self.subscription else self.poll_interval)
+
+    async def run(self):
+        """Serve until stop() is called (or the task is cancelled), then unsubscribe"""
+
+        self.loop = asyncio.get_running_loop()
+        self.changed_ids = asyncio.Queue()
+        self.renew_now = asyncio.Event()
+        self.catch_up = asyncio.Event()
+        self.stopping = asyncio.Event()
+        self.busy = asyncio.Lock()
+
+        self.receiver = NotificationReceiver(self.client_state, self.on_notification)
+        self.port = await self.receiver.start(self.host, self.port)
+        print(f"✓ Listening for notifications on {self.host}:{self.port}")
+
+        tasks = [
+            asyncio.create_task(self.keep_subscription()),
+            asyncio.create_task(self.handle_notifications()),
+            asyncio.create_task(self.catch_up_with_delta())
+        ]
+
+        try:
+            await self.stopping.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.receiver.close()
+            self.unsubscribe()
+
+    def stop(self):
+        """Ask run() to finish (safe to call from any thread)"""
+
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.stopping.set)
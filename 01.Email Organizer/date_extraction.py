@@ -0,0 +1,582 @@
+import calendar
+import re
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from html import unescape
+from keyword_index import trie_pattern, windows_around
+import result_cache
+
+dateparser_search = None  # dateparser.search once loaded (optional: pip install dateparser)
+_dateparser_checked = False
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+# Time of day meant by "EOD", "COB" and "end of the week"
+END_OF_DAY_HOUR = 17
+
+# A date written without a year that lies further back than this is
+# taken to be next year's ("Jan 5" in a December email), in days
+YEARLESS_PAST_DAYS = 182
+
+# Languages the dateparser backend tries (fewer is faster)
+DATEPARSER_LANGUAGES = ["en"]
+
+# Bump when the rules change, so cached results are parsed again
+RULES_VERSION = 2
+
+# ============================================================
+# PATTERNS (compiled once at import)
+# ============================================================
+
+MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
+}
+
+WEEKDAYS = {'mon': 0, 'tue': 1, 'wed': 2, 'thu': 3, 'fri': 4, 'sat': 5, 'sun': 6}
+
+NUMBER_WORDS = {
+    'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
+    'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10
+}
+
+# Patterns are written in lowercase: texts are lowercased once and matched
+# case-sensitively, which is several times faster than re.IGNORECASE
+MONTH_NAME = (
+    r'(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?'
+    r'|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\.?'
+)
+WEEKDAY_NAME = r'(?:mon|tue(?:s)?|wed(?:nes)?|thu(?:r(?:s)?)?|fri|sat(?:ur)?|sun)(?:day)?'
+ORDINAL = r'(?:st|nd|rd|th)?'
+COUNT = r'(?:\d{1,2}|an?|one|two|three|four|five|six|seven|eight|nine|ten)'
+END_OF_DAY = r'(?:eod|cob|end of (?:the )?(?:business )?day|close of business)'
+
+# How every relative date can start, factored into a trie. Common words
+# only count with what must follow them ("on fri", "in 3"), so the scan
+# skips ordinary words after a single test
+DATE_START_WORDS = (
+    ['today', 'tonight', 'tomorrow', 'tmrw', 'eod', 'eow', 'eom', 'cob', 'end of', 'close of', 'next', 'the following'] +
+    [f"{rel} {day}" for rel in ('this', 'coming') for day in WEEKDAYS] +
+    [f"{cue} {word}" for cue in ('by', 'on', 'until', 'till', 'before', 'due') for word in [*WEEKDAYS, 'next', 'this', 'coming']] +
+    [f"{word} {count}" for word in ('in', 'within') for count in [*NUMBER_WORDS, *'0123456789']]
+)
+DATE_START = trie_pattern(sorted(set(DATE_START_WORDS))).replace(re.escape(' '), r'\s+')
+
+# Absolute and relative dates in one alternation, so the text is scanned once.
+# The lookahead rejects words that cannot start a date with one test
+DATE_SOURCE = (
+    r'\b(?=\d|' + MONTH_NAME + r'\b|' + DATE_START + r')(?:'
+    r'(?P<ymd_y>\d{4})[/-](?P<ymd_m>\d{1,2})[/-](?P<ymd_d>\d{1,2})'                          # YYYY-MM-DD
+    r'|(?P<num_a>\d{1,2})(?P<num_sep>[/.-])(?P<num_b>\d{1,2})(?P=num_sep)(?P<num_y>\d{4}|\d{2})'  # MM/DD/YYYY, DD.MM.YYYY
+    r'|(?P<mdn_m>' + MONTH_NAME + r') (?P<mdn_d>\d{1,2})' + ORDINAL +                          # Month DD(-DD)(, YYYY)
+    r'(?:\s?[-–]\s?(?P<mdn_to>\d{1,2})' + ORDINAL + r')?(?:,? (?P<mdn_y>\d{4}))?'
+    r'|(?:(?P<dmn_from>\d{1,2})' + ORDINAL + r'\s?[-–]\s?)?(?P<dmn_d>\d{1,2})' + ORDINAL +      # (DD-)DD Month( YYYY)
+    r' (?:of )?(?P<dmn_m>' + MONTH_NAME + r'),?(?: (?P<dmn_y>\d{4}))?'
+    r'|(?P<day>today|tonight|tomorrow|tmrw)'
+    r'|(?P<eod>' + END_OF_DAY + r')'
+    r'|(?P<eow>eow|end of (?:the |this )?week)'
+    r'|end of (?P<eonw>next) week'
+    r'|(?P<next_week>next week|the following week)'
+    r'|(?P<eom>eom|end of (?:the |this )?month)'
+    r'|(?P<next_month>next month)'
+    r'|(?:in|within) (?P<in_n>' + COUNT + r') (?P<in_unit>(?:business |working )?days?|weeks?)'
+    r'|(?:(?P<wd_cue>by|on|until|till|before|due)\s+)?'                                       # by/next/this Friday
+    r'(?:(?P<wd_next>next)\s+|(?P<wd_this>this|coming)\s+)?(?P<wd>' + WEEKDAY_NAME + r')'
+    r')\b'
+)
+DATE_PATTERN = re.compile(DATE_SOURCE)
+DATE_PATTERN_IGNORECASE = re.compile(DATE_SOURCE, re.IGNORECASE)  # For texts lowercasing would shift
+
+TIME = (
+    r'(?:(?P<h12>\d{1,2})(?::(?P<m12>[0-5]\d))?\s?(?P<ampm>[ap])\.?m\b\.?'
+    r'|(?P<h24>[01]?\d|2[0-3]):(?P<m24>[0-5]\d)\b'
+    r'|(?P<noon>noon|midday)\b'
+    r'|(?P<midnight>midnight)\b'
+    r'|(?P<eod>' + END_OF_DAY + r')\b)'
+)
+
+# A time of day right after a date ("Friday at 3pm") or just before it ("EOD tomorrow")
+TIME_AFTER = re.compile(r'\s*(?:,|at|@|by|before|-|–)?\s*' + TIME, re.IGNORECASE)
+TIME_BEFORE = re.compile(r'\b' + TIME + r'\s*(?:,|on|by)?\s*$', re.IGNORECASE)
+TIME_ANYWHERE = re.compile(r'\b' + TIME, re.IGNORECASE)
+
+# What joins the two ends of a range ("Oct 3 to Oct 5")
+RANGE_JOIN = re.compile(r'\s*(?:-|–|—|to|until|till|through|thru)\s*', re.IGNORECASE)
+
+# What may sit between "EOD" and the day it belongs to
+ON = re.compile(r'\s*(?:on\s+)?', re.IGNORECASE)
+
+HTML_DROP = re.compile(r'<(script|style|head)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+HTML_TAG = re.compile(r'<[^>]+>')
+WHITESPACE = re.compile(r'\s+')
+
+# One date found in a text: `until` ends a range, `timed` says a time of
+# day was given, start/end are its place in the text that was scanned
+DateHit = namedtuple("DateHit", ["date", "until", "timed", "start", "end", "text"])
+
+# ============================================================
+# EXTRACTION
+# ============================================================
+
+def html_to_text(html):
+    """Strip tags, scripts and entities from an HTML body"""
+
+    text = HTML_DROP.sub(' ', html)
+    text = HTML_TAG.sub(' ', text)
+    return WHITESPACE.sub(' ', unescape(text))
+
+def body_text(email):
+    """Plain text of a Graph message body (HTML bodies are stripped)"""
+
+    body = email.get('body') or {}
+    content = body.get('content', '')
+
+    if body.get('contentType', '').lower() == 'html':
+        return html_to_text(content)
+
+    return content
+
+def local_time(received):
+    """Graph's receivedDateTime (always UTC) as a naive local datetime"""
+
+    moment = datetime.fromisoformat(received[:19]).replace(tzinfo=timezone.utc)
+    return moment.astimezone().replace(tzinfo=None)
+
+def day_first_for(address, sender_orders=None, default_order="MDY"):
+    """True if numeric dates from this sender are written DD/MM
+
+    sender_orders maps an address, "@domain" or ".tld" ending to "DMY" or
+    "MDY"; the most specific entry wins.
+    """
+
+    orders = {key.lower(): order for key, order in (sender_orders or {}).items()}
+    address = (address or "").lower()
+    domain = address.rpartition("@")[2]
+    order = default_order
+
+    if address in orders:
+        order = orders[address]
+    elif "@" + domain in orders:
+        order = orders["@" + domain]
+    else:
+        endings = [key for key in orders if key.startswith(".") and domain.endswith(key)]
+        if endings:
+            order = orders[max(endings, key=len)]
+
+    return order.upper() == "DMY"
+
+def with_year(year, month, day, today):
+    """A date from its parts; without a year, this year's unless that is long past"""
+
+    if year:
+        return datetime(int(year), month, day)
+
+    date = datetime(today.year, month, day)
+
+    if date < today - timedelta(days=YEARLESS_PAST_DAYS):
+        date = datetime(today.year + 1, month, day)
+
+    return date
+
+def add_business_days(date, days):
+    while days > 0:
+        date += timedelta(days=1)
+        if date.weekday() < 5:
+            days -= 1
+
+    return date
+
+def resolve_match(match, anchor, day_first=False):
+    """(date, until, timed) for a DATE_PATTERN match, relative ones counted from anchor (ValueError if invalid)"""
+
+    groups = match.groupdict()
+    today = anchor.replace(hour=0, minute=0, second=0, microsecond=0)
+    next_monday = today + timedelta(days=7 - today.weekday())
+    until = None
+
+    if groups['ymd_y']:
+        return datetime(int(groups['ymd_y']), int(groups['ymd_m']), int(groups['ymd_d'])), None, False
+
+    if groups['num_y']:
+        first, second, year = int(groups['num_a']), int(groups['num_b']), int(groups['num_y'])
+        if year < 100:
+            year += 2000
+
+        # A number over 12 can only be the day; otherwise the sender's order decides
+        if first > 12 or (day_first and second <= 12):
+            return datetime(year, second, first), None, False
+
+        return datetime(year, first, second), None, False
+
+    if groups['mdn_m']:
+        date = with_year(groups['mdn_y'], MONTHS[groups['mdn_m'][:3].lower()], int(groups['mdn_d']), today)
+        if groups['mdn_to']:
+            until = date.replace(day=int(groups['mdn_to']))
+        return date, until if until and until > date else None, False
+
+    if groups['dmn_m']:
+        date = with_year(groups['dmn_y'], MONTHS[groups['dmn_m'][:3].lower()], int(groups['dmn_d']), today)
+        if groups['dmn_from']:
+            date, until = date.replace(day=int(groups['dmn_from'])), date
+        return date, until if until and until > date else None, False
+
+    if groups['day']:
+        tomorrow = groups['day'].lower() in ('tomorrow', 'tmrw')
+        return today + timedelta(days=1 if tomorrow else 0), None, False
+
+    if groups['eod']:
+        return today.replace(hour=END_OF_DAY_HOUR), None, True
+
+    if groups['eow']:
+        return (today + timedelta(days=(4 - today.weekday()) % 7)).replace(hour=END_OF_DAY_HOUR), None, True
+
+    if groups['eonw']:
+        return (next_monday + timedelta(days=4)).replace(hour=END_OF_DAY_HOUR), None, True
+
+    if groups['next_week']:
+        return next_monday, None, False
+
+    if groups['eom']:
+        return today.replace(day=calendar.monthrange(today.year, today.month)[1]), None, False
+
+    if groups['next_month']:
+        return (today.replace(day=28) + timedelta(days=4)).replace(day=1), None, False
+
+    if groups['in_n']:
+        count = groups['in_n'].lower()
+        count = int(count) if count.isdigit() else NUMBER_WORDS[count]
+        unit = groups['in_unit'].lower()
+
+        if unit.startswith('week'):
+            return today + timedelta(weeks=count), None, False
+        if unit.startswith(('business', 'working')):
+            return add_business_days(today, count), None, False
+        return today + timedelta(days=count), None, False
+
+    # A weekday: "by/this Friday" is the coming one (today included),
+    # "next Friday" the one in next week
+    weekday = WEEKDAYS[groups['wd'][:3].lower()]
+
+    if groups['wd_next']:
+        return next_monday + timedelta(days=weekday), None, False
+
+    return today + timedelta(days=(weekday - today.weekday()) % 7), None, False
+
+def time_of_day(match):
+    """(hour, minute) of a TIME match (ValueError if impossible)"""
+
+    groups = match.groupdict()
+
+    if groups['h12']:
+        hour = int(groups['h12'])
+        if not 1 <= hour <= 12:
+            raise ValueError("hour out of range")
+        return hour % 12 + (12 if groups['ampm'].lower() == 'p' else 0), int(groups['m12'] or 0)
+
+    if groups['h24']:
+        return int(groups['h24']), int(groups['m24'])
+
+    if groups['noon']:
+        return 12, 0
+
+    if groups['midnight']:
+        return 23, 59  # A deadline at midnight ends the day
+
+    return END_OF_DAY_HOUR, 0
+
+def iter_hits(text, anchor=None, day_first=False):
+    """Yield every DateHit in the order it appears (single pass, past dates included)
+
+    Relative dates ("by Friday", "EOD tomorrow", "in 3 days") count from
+    anchor (default now). A time of day next to a date is folded into it,
+    and two dates joined by "-", "to", "until"... become one range.
+    Numeric dates that could be either are read DD/MM when day_first.
+    """
+
+    if anchor is None:
+        anchor = datetime.now()
+
+    lowered = text.lower()
+
+    if len(lowered) == len(text):
+        scanned, pattern = lowered, DATE_PATTERN
+    else:
+        # A few characters change length when lowercased; keep offsets right
+        scanned, pattern = text, DATE_PATTERN_IGNORECASE
+
+    skip_to = 0
+
+    for match in pattern.finditer(scanned):
+        if match.start() < skip_to:
+            continue
+
+        groups = match.groupdict()
+
+        # A bare weekday is too often not a date ("Happy Friday")
+        if groups['wd'] and not (groups['wd_cue'] or groups['wd_next'] or groups['wd_this']):
+            continue
+
+        # "EOD tomorrow": the day that follows picks EOD up as its time
+        if groups['eod'] and pattern.match(scanned, ON.match(scanned, match.end()).end()):
+            continue
+
+        try:
+            date, until, timed = resolve_match(match, anchor, day_first)
+        except ValueError:
+            continue
+
+        start, end = match.span()
+
+        time_match = TIME_AFTER.match(text, end)
+        if time_match:
+            end = time_match.end()
+        else:
+            time_match = TIME_BEFORE.search(text, max(0, start - 30), start)
+            if time_match:
+                start = time_match.start()
+
+        if time_match:
+            try:
+                hour, minute = time_of_day(time_match)
+                date, timed = date.replace(hour=hour, minute=minute), True
+            except ValueError:
+                pass
+
+        if until is None:
+            join = RANGE_JOIN.match(text, end)
+            second = join and pattern.match(scanned, join.end())
+
+            if second:
+                try:
+                    until = resolve_match(second, anchor, day_first)[0]
+                except ValueError:
+                    until = None
+
+                if until is not None and until.date() > date.date():
+                    end = skip_to = second.end()
+                else:
+                    until = None
+
+        yield DateHit(date, until, timed, start, end, text[start:end])
+
+def is_upcoming(hit, now):
+    """True until the deadline has passed (a date without a time lasts all day)"""
+
+    if hit.timed:
+        return hit.date >= now
+
+    return hit.date.date() >= now.date()
+
+def find_dates(text, anchor=None, day_first=False, limit=None, not_before=None):
+    """DateHits that have not passed by not_before (default: the anchor), in text order
+
+    Stops scanning after `limit` hits if given.
+    """
+
+    if anchor is None:
+        anchor = datetime.now()
+
+    not_before = not_before or anchor
+    hits = []
+
+    for hit in iter_hits(text, anchor, day_first):
+        if is_upcoming(hit, not_before):
+            hits.append(hit)
+            if limit is not None and len(hits) >= limit:
+                break
+
+    return hits
+
+def iter_dates(text, now=None, day_first=False):
+    """Yield the dates that have not passed, in the order they appear in the text (single pass)"""
+
+    for hit in iter_hits(text, now, day_first):
+        if is_upcoming(hit, now or datetime.now()):
+            yield hit.date
+
+def extract_dates(text, now=None, limit=None, day_first=False):
+    """List of upcoming dates in the text, stopping after `limit` if given"""
+
+    return [hit.date for hit in find_dates(text, now, day_first, limit)]
+
+def first_date(text, now=None, day_first=False):
+    """First upcoming date in the text, or None (stops scanning at the first hit)"""
+
+    return next(iter_dates(text, now, day_first), None)
+
+# ============================================================
+# DATEPARSER BACKEND (optional, needs: pip install dateparser)
+# ============================================================
+
+def load_dateparser():
+    """Import dateparser's search on first use (None when it is not installed)"""
+
+    global dateparser_search, _dateparser_checked
+
+    if not _dateparser_checked:
+        _dateparser_checked = True
+        try:
+            from dateparser import search
+            dateparser_search = search
+        except ImportError:
+            dateparser_search = None
+
+    return dateparser_search
+
+def dateparser_dates(text, anchor=None, day_first=False, limit=None, not_before=None):
+    """DateHits found by dateparser: many more phrasings and languages, but far slower
+
+    Returns [] when dateparser is not installed. Ranges are not joined.
+    """
+
+    search = load_dateparser()
+    if search is None:
+        return []
+
+    if anchor is None:
+        anchor = datetime.now()
+
+    not_before = not_before or anchor
+
+    settings = {
+        "RELATIVE_BASE": anchor,
+        "PREFER_DATES_FROM": "future",
+        "DATE_ORDER": "DMY" if day_first else "MDY",
+        "RETURN_AS_TIMEZONE_AWARE": False
+    }
+
+    try:
+        found = search.search_dates(text, languages=DATEPARSER_LANGUAGES, settings=settings) or []
+    except Exception as e:
+        print(f"⚠️  dateparser failed: {e}")
+        return []
+
+    hits = []
+    position = 0
+
+    for phrase, date in found:
+        start = text.find(phrase, position)
+        if start == -1:
+            start = max(0, text.find(phrase))
+        position = start + len(phrase)
+
+        # dateparser gives dates without a time the anchor's time of day
+        timed = TIME_ANYWHERE.search(phrase) is not None
+        if not timed:
+            date = date.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        hit = DateHit(date, None, timed, start, position, phrase)
+
+        if is_upcoming(hit, not_before):
+            hits.append(hit)
+            if limit is not None and len(hits) >= limit:
+                break
+
+    return hits
+
+# ============================================================
+# DEADLINE EXTRACTOR
+# ============================================================
+
+# Backends take (text, anchor, day_first, limit=None) and return DateHits
+BACKENDS = {
+    "rules": find_dates,
+    "dateparser": dateparser_dates
+}
+
+def get_backend(name):
+    backend = BACKENDS.get(name)
+
+    if backend is None:
+        raise ValueError(f"Unknown date backend {name!r} (choose from {', '.join(BACKENDS)})")
+
+    return backend
+
+def hit_to_json(hit):
+    return [hit.date.isoformat(), hit.until.isoformat() if hit.until else None, hit.timed, hit.start, hit.end, hit.text]
+
+def hit_from_json(item):
+    date, until, timed, start, end, text = item
+    return DateHit(datetime.fromisoformat(date), datetime.fromisoformat(until) if until else None, timed, start, end, text)
+
+class DateExtractor:
+    """Finds the deadlines in an email, cheapest backend first
+
+    The fast backend (the rules above) reads the text around each keyword
+    hit. Only when it finds nothing there is the fallback backend (such
+    as "dateparser") given those same snippets, so a slow parser only
+    ever sees a little of the mail that mentions a keyword. With no date
+    near a keyword, the first date anywhere in the email is used.
+
+    Relative dates count from when the email was received (local time),
+    and numeric dates are read DD/MM or MM/DD per sender (see
+    day_first_for). Results are cached under a hash of the message, so
+    reading an email again costs one lookup; dates that have passed
+    since are dropped on the way out.
+
+        extractor = DateExtractor(KeywordIndex(["deadline", "due"]), cache=ResultCache("deadlines"))
+        for hit in extractor.deadlines(text, email['receivedDateTime'], sender_address):
+            ...
+    """
+
+    def __init__(self, keyword_index, radius=300, backend="rules", fallback=None, cache=None,
+                 default_order="MDY", sender_orders=None):
+        self.keyword_index = keyword_index
+        self.radius = radius
+        self.backend = get_backend(backend)
+        self.fallback = get_backend(fallback) if fallback else None
+        self.backend_names = [backend, fallback]
+        self.cache = cache
+        self.default_order = default_order
+        self.sender_orders = sender_orders or {}
+
+    def deadlines(self, text, received=None, sender=None, limit=None, now=None):
+        """Upcoming DateHits in the email, those near keywords first (all of them up to `limit`)"""
+
+        anchor = local_time(received) if received else datetime.now()
+        day_first = day_first_for(sender, self.sender_orders, self.default_order)
+        hits = None
+
+        if self.cache is not None:
+            key = result_cache.content_key(
+                RULES_VERSION, self.backend_names, self.keyword_index.keywords, self.radius,
+                day_first, anchor.isoformat(), text
+            )
+            cached = self.cache.get(key)
+            if cached is not None:
+                hits = [hit_from_json(item) for item in cached]
+
+        if hits is None:
+            hits = self.scan(text, anchor, day_first)
+            if self.cache is not None:
+                self.cache.put(key, [hit_to_json(hit) for hit in hits])
+
+        now = now or datetime.now()
+        hits = [hit for hit in hits if is_upcoming(hit, now)]
+
+        return hits if limit is None else hits[:limit]
+
+    def scan(self, text, anchor, day_first):
+        """Every date from the anchor on, near keywords (fast, then fallback backend) or else the first anywhere"""
+
+        snippets = windows_around(text, self.keyword_index.find(text), self.radius)
+
+        for backend in (self.backend, self.fallback):
+            if backend is None:
+                continue
+
+            hits = []
+            seen = set()
+
+            for snippet in snippets:
+                for hit in backend(snippet, anchor, day_first):
+                    if (hit.date, hit.until) not in seen:
+                        seen.add((hit.date, hit.until))
+                        hits.append(hit)
+
+            if hits:
+                return hits
+
+        return self.backend(text, anchor, day_first, limit=1)
@@ -0,0 +1,64 @@
+import os
+from ttl_store import TTLStore
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+# Where the dedup databases are kept between runs
+STATE_DIR = os.path.join(os.path.expanduser("~"), ".email_organizer")
+
+# How long an ID is remembered before it is evicted
+DEFAULT_TTL_DAYS = 30
+
+# ============================================================
+# PERSISTENT DEDUP STORE
+# ============================================================
+
+class DedupStore(TTLStore):
+    """Set-like store of message/conversation IDs kept in SQLite (WAL mode)
+
+    Works as a drop-in for a set: `key in store` and `store.add(key)`.
+    IDs older than ttl_days are evicted so the file stays bounded, and
+    nothing is loaded into memory on start, so a restart is instant.
+    """
+
+    TABLE = "seen"
+
+    def __init__(self, name, ttl_days=DEFAULT_TTL_DAYS, path=None):
+        if path is None:
+            os.makedirs(STATE_DIR, exist_ok=True)
+            path = os.path.join(STATE_DIR, f"{name}.sqlite3")
+
+        super().__init__(path, ttl_days)
+
+    def __contains__(self, key):
+        return key is not None and self.lookup(key) is not None
+
+    def add(self, key):
+        """Remember an ID (refreshes its TTL if already present)"""
+
+        if key is not None:
+            self.insert(key)
+
+    def discard(self, key):
+        """Forget an ID"""
+
+        self.delete(key)
+
+# ============================================================
+# KEYS FOR SHARED MAILBOXES
+# ============================================================
+
+def scoped_key(key, base="/me"):
+    """Store key for an ID from one mailbox ("/me" or "/users/{id}")
+
+    Graph IDs are only unique within a mailbox, so other mailboxes'
+    keys carry their address. Your own keep the plain ID, which leaves
+    existing stores valid.
+    """
+
+    if key is None or base == "/me":
+        return key
+
+    return f"{base}:{key}"
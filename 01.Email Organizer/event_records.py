@@ -0,0 +1,150 @@
+from collections import namedtuple
+from datetime import datetime, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+# Graph is asked to return every event time in UTC, so the values can be
+# turned into timestamps without guessing; they are shown in TIME_ZONE
+PREFER_UTC = 'outlook.timezone="UTC"'  # Value for the Prefer header
+
+# ============================================================
+# TIME ZONES
+# ============================================================
+#
+# A zone is a ZoneInfo, or None for this computer's own time zone. All
+# conversions go through epoch seconds, so wall-clock math such as "8 AM
+# on the day the clocks change" comes out right.
+
+def get_zone(name=None):
+    """ZoneInfo for an IANA name such as "Europe/London" (None = local time)"""
+
+    return ZoneInfo(name) if name else None
+
+def to_local(timestamp, zone=None):
+    """Aware datetime for an epoch timestamp in the given zone"""
+
+    if zone is None:
+        return datetime.fromtimestamp(timestamp).astimezone()
+
+    return datetime.fromtimestamp(timestamp, zone)
+
+def local_timestamp(day, hour=0, zone=None):
+    """Epoch timestamp of a wall-clock hour on a date in the given zone"""
+
+    # Naive datetimes are read as this computer's local time by timestamp()
+    return int(datetime(day.year, day.month, day.day, hour, tzinfo=zone).timestamp())
+
+def timestamp_of(moment):
+    """Epoch timestamp of a datetime (naive means local time) or a number"""
+
+    if isinstance(moment, (int, float)):
+        return moment
+
+    return moment.timestamp()
+
+def to_utc(moment):
+    """Naive UTC datetime for a datetime (naive means local time) or a timestamp"""
+
+    return datetime.fromtimestamp(timestamp_of(moment), timezone.utc).replace(tzinfo=None)
+
+def utc_text(moment):
+    """ISO text of a moment in UTC, as Graph expects in query parameters"""
+
+    return to_utc(moment).strftime("%Y-%m-%dT%H:%M:%S")
+
+def today(zone=None):
+    """Current date in the given zone"""
+
+    return to_local(datetime.now(timezone.utc).timestamp(), zone).date()
+
+@lru_cache(maxsize=None)
+def graph_zone(name):
+    """tzinfo for a Graph timeZone value (unknown names fall back to UTC)"""
+
+    if not name or name.upper() in ("UTC", "TZONE://MICROSOFT/UTC"):
+        return timezone.utc
+
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.utc
+
+def parse_graph_time(value):
+    """Epoch timestamp of a Graph {dateTime, timeZone} value"""
+
+    # Graph sends 7 fractional digits; seconds are all a calendar needs
+    moment = datetime.fromisoformat(value['dateTime'][:19])
+    return int(moment.replace(tzinfo=graph_zone(value.get('timeZone'))).timestamp())
+
+def parse_all_day_time(value, zone=None):
+    """Epoch timestamp of an all-day event's start or end: midnight of its date in the given zone
+
+    All-day events float: Graph sends the date at midnight in whatever
+    time zone the request asked for (UTC here), so the date is read as a
+    local date rather than converted, which would move the event by the
+    zone's offset.
+    """
+
+    return local_timestamp(datetime.fromisoformat(value['dateTime'][:10]).date(), 0, zone)
+
+# ============================================================
+# EVENT RECORD
+# ============================================================
+
+class EventRecord(namedtuple("EventRecord", [
+    "id", "start_ts", "end_ts", "subject", "location", "attendee_count", "organizer", "zone"
+])):
+    """One calendar event, parsed once when it is read from Graph
+
+    Times are epoch seconds; `zone` is where they are shown (see get_zone).
+    """
+
+    __slots__ = ()
+
+    @property
+    def start(self):
+        return to_local(self.start_ts, self.zone)
+
+    @property
+    def end(self):
+        return to_local(self.end_ts, self.zone)
+
+    @property
+    def duration(self):
+        """Length in seconds"""
+        return self.end_ts - self.start_ts
+
+    @property
+    def hours(self):
+        return (self.end_ts - self.start_ts) / 3600
+
+    @property
+    def day(self):
+        """Local date the event starts on"""
+        return self.start.date()
+
+def from_graph(event, zone=None):
+    """EventRecord for a Graph event dict (all-day events span local midnights in `zone`)"""
+
+    parse_time = (lambda value: parse_all_day_time(value, zone)) if event.get('isAllDay') else parse_graph_time
+
+    return EventRecord(
+        event.get('id'),
+        parse_time(event['start']),
+        parse_time(event['end']),
+        event.get('subject') or 'No Subject',
+        (event.get('location') or {}).get('displayName') or 'No Location',
+        len(event.get('attendees') or []),
+        ((event.get('organizer') or {}).get('emailAddress') or {}).get('address', ''),
+        zone
+    )
+
+def iter_records(events, zone=None):
+    """Turn a stream of Graph events into EventRecords as they arrive"""
+
+    for event in events:
+        yield from_graph(event, zone)
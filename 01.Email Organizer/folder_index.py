@@ -0,0 +1,419 @@
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+import graph_client
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+# Where the folder index is kept between runs
+STATE_DIR = os.path.join(os.path.expanduser("~"), ".email_organizer")
+
+# Check Graph for folder changes when the index is older than this (in seconds)
+REFRESH_INTERVAL = 3600
+
+# Folders per page requested from Graph
+PAGE_SIZE = 250
+
+# Names Graph accepts in place of a folder id (not localized, unlike display names)
+WELL_KNOWN_FOLDERS = {"inbox", "archive", "drafts", "sentitems", "deleteditems", "junkemail", "outbox"}
+
+# ============================================================
+# FOLDER INDEX
+# ============================================================
+#
+# Folders are addressed by path: display names from the top of the
+# mailbox joined with "/", matched without regard to case, such as
+# "Newsletters/Tech". A path may also start with a well-known name
+# ("inbox/Receipts"), which works whatever language the mailbox uses.
+
+def join_path(*names):
+    return "/".join(names)
+
+def split_path(path):
+    return [name.strip() for name in path.strip("/").split("/") if name.strip()]
+
+class FolderIndex:
+    """Every mail folder in the mailbox, resolved from path to id in memory
+
+    The whole hierarchy comes from mailFolders/delta, which lists nested
+    folders flat (with parentFolderId) page by page, so nothing walks
+    childFolders level by level. The folders and the deltaLink are saved
+    to disk; a later run reads the file and only asks Graph what changed
+    once REFRESH_INTERVAL has passed. Missing folders are created on
+    demand. One lock guards changes, so threads can share an index.
+    `user` indexes someone else's mailbox (shared with you) instead of your own.
+
+        index = get_folder_index()
+        folder_id = index.resolve(access_token, "Newsletters/Tech", create=True)
+    """
+
+    def __init__(self, name="folders", path=None, user=None):
+        if path is None:
+            os.makedirs(STATE_DIR, exist_ok=True)
+            path = os.path.join(STATE_DIR, f"{name}.json")
+
+        self.path = path
+        self.base = f"/users/{user}" if user else "/me"
+        self.lock = threading.RLock()
+
+        self.folders = {}  # id -> {"name", "parent"}
+        self.well_known = {}  # well-known name -> id
+        self.delta_link = None
+        self.synced_at = 0
+        self.paths = {}  # lowercase path -> id
+        self.well_known_paths = {}  # well-known name -> lowercase path
+
+        self.load()
+
+    def __len__(self):
+        return len(self.folders)
+
+    # --------------------------------------------------------
+    # Disk cache
+    # --------------------------------------------------------
+
+    def load(self):
+        """Read the saved index (a missing or damaged file just means a full sync)"""
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        with self.lock:
+            self.folders = state.get("folders", {})
+            self.well_known = state.get("wellKnown", {})
+            self.delta_link = state.get("deltaLink")
+            self.synced_at = state.get("syncedAt", 0)
+            self.rebuild_paths()
+
+    def save(self):
+        """Write the index atomically so a crash never leaves half a file"""
+
+        with self.lock:
+            state = {
+                "folders": self.folders,
+                "wellKnown": self.well_known,
+                "deltaLink": self.delta_link,
+                "syncedAt": self.synced_at,
+                "savedAt": datetime.now(timezone.utc).isoformat()
+            }
+
+            # Per-process name: several scripts may save the same index at once
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+
+            os.replace(tmp_path, self.path)
+
+    def rebuild_paths(self):
+        """Recompute every folder's path (call with the lock held)"""
+
+        cache = {}
+
+        def path_of(folder_id):
+            if folder_id not in cache:
+                folder = self.folders[folder_id]
+                parent = folder.get("parent")
+
+                # Folders whose parent is not listed sit at the top (under the root)
+                if parent in self.folders:
+                    cache[folder_id] = join_path(path_of(parent), folder["name"])
+                else:
+                    cache[folder_id] = folder["name"]
+
+            return cache[folder_id]
+
+        self.paths = {path_of(folder_id).lower(): folder_id for folder_id in self.folders}
+        self.well_known_paths = {
+            name: path_of(folder_id).lower() for name, folder_id in self.well_known.items() if folder_id in self.folders
+        }
+
+    # --------------------------------------------------------
+    # Syncing
+    # --------------------------------------------------------
+
+    def is_fresh(self, now=None):
+        return bool(self.delta_link) and (now or time.time()) - self.synced_at < REFRESH_INTERVAL
+
+    def refresh(self, access_token, force=False):
+        """Bring the index up to date with mailFolders/delta
+
+        The first sync lists every folder; later ones only what was added,
+        renamed, moved or deleted. Returns False if Graph could not be
+        reached (the cached index keeps working).
+        """
+
+        with self.lock:
+            if not force and self.is_fresh():
+                return True
+
+            url = self.delta_link
+            params = None
+            full_sync = url is None
+
+            if full_sync:
+                url, params = f"{self.base}/mailFolders/delta", {"$select": "id,displayName,parentFolderId"}
+
+            headers = {"Prefer": f"odata.maxpagesize={PAGE_SIZE}"}
+            changed = []
+            removed = []
+            delta_link = None
+
+            try:
+                while url:
+                    response = graph_client.graph_get(access_token, url, params=params, headers=headers)
+
+                    if response.status_code == 410 and not full_sync:
+                        # Sync state expired on the server - list everything again
+                        print("⚠️  Folder sync state expired, reloading all folders")
+                        url, params = f"{self.base}/mailFolders/delta", {"$select": "id,displayName,parentFolderId"}
+                        full_sync = True
+                        changed, removed = [], []
+                        continue
+
+                    if response.status_code != 200:
+                        print(f"❌ Error syncing mail folders: {response.status_code}")
+                        return False
+
+                    page = response.json()
+
+                    for folder in page.get('value', []):
+                        if '@removed' in folder:
+                            removed.append(folder['id'])
+                        else:
+                            changed.append(folder)
+
+                    params = None
+                    url = page.get('@odata.nextLink')
+                    delta_link = page.get('@odata.deltaLink')
+
+            except Exception as e:
+                print(f"❌ Error: {e}")
+                return False
+
+            if full_sync:
+                self.folders = {}
+
+            for folder_id in removed:
+                self.folders.pop(folder_id, None)
+
+            for folder in changed:
+                self.folders[folder['id']] = {"name": folder.get('displayName', ''), "parent": folder.get('parentFolderId')}
+
+            self.delta_link = delta_link or self.delta_link
+            self.synced_at = time.time()
+            self.rebuild_paths()
+            self.save()
+
+            return True
+
+    # --------------------------------------------------------
+    # Lookups
+    # --------------------------------------------------------
+
+    def get(self, path):
+        """Id of the folder at `path` from memory, or None"""
+
+        names = split_path(path)
+
+        if not names:
+            return None
+
+        first = names[0].lower()
+
+        if first in self.well_known:
+            if len(names) == 1:
+                return self.well_known[first]
+            if first not in self.well_known_paths:
+                return None
+            return self.paths.get(join_path(self.well_known_paths[first], *names[1:]).lower())
+
+        return self.paths.get(join_path(*names).lower())
+
+    def resolve(self, access_token, path, create=False):
+        """Id of the folder at `path`, syncing (and creating it, if asked) when it is not known
+
+        Returns None when the folder does not exist and create is False,
+        or when it could not be created.
+        """
+
+        folder_id = self.get(path)
+        if folder_id is not None:
+            return folder_id
+
+        with self.lock:
+            # Another thread may have created or loaded it while we waited
+            folder_id = self.get(path)
+            if folder_id is not None:
+                return folder_id
+
+            # A miss may be a folder made elsewhere since the last sync;
+            # with a deltaLink that is one small request
+            self.resolve_well_known(access_token, path)
+            self.refresh(access_token, force=True)
+
+            folder_id = self.get(path)
+            if folder_id is not None or not create:
+                return folder_id
+
+            return self.create_path(access_token, path)
+
+    def resolve_well_known(self, access_token, path):
+        """Look up the id behind a leading well-known name once, and remember it"""
+
+        names = split_path(path)
+
+        if not names or names[0].lower() not in WELL_KNOWN_FOLDERS or names[0].lower() in self.well_known:
+            return
+
+        try:
+            response = graph_client.graph_get(
+                access_token, f"{self.base}/mailFolders/{names[0].lower()}", params={"$select": "id,displayName,parentFolderId"}
+            )
+
+            if response.status_code != 200:
+                print(f"❌ Error looking up folder {names[0]}: {response.status_code}")
+                return
+
+            folder = response.json()
+            self.well_known[names[0].lower()] = folder['id']
+            self.folders.setdefault(folder['id'], {"name": folder.get('displayName', ''), "parent": folder.get('parentFolderId')})
+            self.rebuild_paths()
+            self.save()
+        except Exception as e:
+            print(f"❌ Error: {e}")
+
+    def check_exists(self, access_token, folder_id):
+        """Ask Graph whether a folder is still there, forgetting it (and its subfolders) if not
+
+        For a request that answered 404, which may mean the folder was
+        deleted or only that the message it named is gone. Returns True or
+        False, or None when Graph could not be asked. A forgotten folder is
+        created again by the next resolve(create=True).
+        """
+
+        try:
+            response = graph_client.graph_get(access_token, f"{self.base}/mailFolders/{folder_id}", params={"$select": "id"})
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            return None
+
+        if response.status_code == 200:
+            return True
+
+        if response.status_code != 404:
+            print(f"❌ Error looking up folder {folder_id}: {response.status_code}")
+            return None
+
+        with self.lock:
+            gone = {folder_id}
+            changed = True
+
+            while changed:
+                children = {other for other, folder in self.folders.items() if folder.get("parent") in gone} - gone
+                gone |= children
+                changed = bool(children)
+
+            for other in gone:
+                self.folders.pop(other, None)
+
+            self.well_known = {name: other for name, other in self.well_known.items() if other not in gone}
+            self.rebuild_paths()
+            self.save()
+
+        return False
+
+    # --------------------------------------------------------
+    # Creating folders
+    # --------------------------------------------------------
+
+    def create_path(self, access_token, path):
+        """Create whichever folders along `path` are missing, returns the last id (call with the lock held)"""
+
+        names = split_path(path)
+        parent_id = None
+
+        for depth in range(1, len(names) + 1):
+            folder_id = self.get(join_path(*names[:depth]))
+
+            if folder_id is None:
+                if depth == 1 and names[0].lower() in WELL_KNOWN_FOLDERS:
+                    print(f"❌ Error: well-known folder {names[0]} not found")
+                    return None
+
+                folder_id = self.create_folder(access_token, names[depth - 1], parent_id)
+
+                if folder_id is None:
+                    return None
+
+            parent_id = folder_id
+
+        return parent_id
+
+    def create_folder(self, access_token, name, parent_id=None):
+        """Create one folder (at the top when parent_id is None), returns its id"""
+
+        url = f"{self.base}/mailFolders/{parent_id}/childFolders" if parent_id else f"{self.base}/mailFolders"
+
+        try:
+            response = graph_client.graph_post(access_token, url, json={"displayName": name})
+
+            if response.status_code == 409:
+                # Created elsewhere since our last sync - pick it up
+                self.refresh(access_token, force=True)
+                return self.child_id(parent_id, name)
+
+            if response.status_code != 201:
+                print(f"❌ Error creating folder {name}: {response.status_code}")
+                return None
+
+            folder = response.json()
+            print(f"  📁 Created folder: {name}")
+            self.folders[folder['id']] = {"name": folder.get('displayName', name), "parent": parent_id or folder.get('parentFolderId')}
+            self.rebuild_paths()
+            self.save()
+
+            return folder['id']
+
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            return None
+
+    def child_id(self, parent_id, name):
+        """Id of the folder called `name` directly under parent_id (None = top level)"""
+
+        for folder_id, folder in self.folders.items():
+            at_top = folder.get("parent") not in self.folders
+            if folder["name"].lower() == name.lower() and (folder.get("parent") == parent_id or (parent_id is None and at_top)):
+                return folder_id
+
+        return None
+
+# ============================================================
+# SHARED INDEX
+# ============================================================
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_folder_index(name="folders", user=None):
+    """One FolderIndex per mailbox file, shared by everything in the process
+
+    Each user gets a file of their own, named after the address.
+    """
+
+    if user:
+        name = name + "-" + re.sub(r"[^\w.@-]", "_", user.lower())
+
+    with _indexes_lock:
+        if name not in _indexes:
+            _indexes[name] = FolderIndex(name, user=user)
+        return _indexes[name]
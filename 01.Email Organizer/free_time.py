@@ -0,0 +1,120 @@
+from bisect import bisect_right
+from datetime import timedelta
+from event_records import local_timestamp, timestamp_of, to_local
+
+# ============================================================
+# BUSY INTERVALS
+# ============================================================
+#
+# Everything here works on EventRecords (see event_records.py): times are
+# epoch seconds, and day boundaries are computed in the records' zone, so
+# days that are 23 or 25 hours long around a DST change come out right.
+
+def sort_records(records):
+    """Non-empty records sorted by start"""
+
+    return sorted(
+        (record for record in records if record.start_ts < record.end_ts),
+        key=lambda record: (record.start_ts, record.end_ts)
+    )
+
+def merge_busy(records):
+    """Merge sorted records into non-overlapping (start_ts, end_ts) blocks in one sweep"""
+
+    busy = []
+
+    for record in records:
+        if busy and record.start_ts <= busy[-1][1]:
+            if record.end_ts > busy[-1][1]:
+                busy[-1][1] = record.end_ts
+        else:
+            busy.append([record.start_ts, record.end_ts])
+
+    return [(start, end) for start, end in busy]
+
+# ============================================================
+# FREE TIME INDEX
+# ============================================================
+
+class FreeTimeIndex:
+    """Merged busy time over a whole range, answering free-window queries
+
+    Built once in O(n log n); each query is a binary search plus a walk over
+    the busy blocks inside the window. Events spanning several days simply
+    cover every day they touch.
+
+        index = FreeTimeIndex(records)
+        index.free_windows(monday_9am, friday_5pm, min_minutes=60)
+    """
+
+    def __init__(self, records, zone=None):
+        self.zone = zone
+        self.busy = merge_busy(sort_records(records))
+        self.ends = [end for _, end in self.busy]
+
+    def __len__(self):
+        return len(self.busy)
+
+    def free_timestamps(self, start_ts, end_ts, min_seconds=0):
+        """Free (start_ts, end_ts) windows of at least `min_seconds`"""
+
+        windows = []
+        cursor = start_ts
+
+        # First busy block that ends after the window opens
+        i = bisect_right(self.ends, start_ts)
+
+        while i < len(self.busy) and self.busy[i][0] < end_ts:
+            busy_start, busy_end = self.busy[i]
+
+            if busy_start > cursor and busy_start - cursor >= min_seconds:
+                windows.append((cursor, busy_start))
+
+            cursor = max(cursor, busy_end)
+            i += 1
+
+        if cursor < end_ts and end_ts - cursor >= min_seconds:
+            windows.append((cursor, end_ts))
+
+        return windows
+
+    def free_windows(self, start, end, min_minutes=0):
+        """Free (start, end) datetimes of at least `min_minutes` between start and end"""
+
+        return [
+            (to_local(window_start, self.zone), to_local(window_end, self.zone))
+            for window_start, window_end in self.free_timestamps(timestamp_of(start), timestamp_of(end), min_minutes * 60)
+        ]
+
+    def is_free(self, start, end):
+        """True if nothing is booked between start and end"""
+
+        start_ts, end_ts = timestamp_of(start), timestamp_of(end)
+        i = bisect_right(self.ends, start_ts)
+        return i == len(self.busy) or self.busy[i][0] >= end_ts
+
+def iter_days(records, first_day, days, zone=None):
+    """Walk local dates in order, handing each day the records that overlap it
+
+    Records must be sorted by start; a pointer moves through them once and
+    only the records still in play are held, so multi-day events show up
+    on every day they cover.
+    """
+
+    position = 0
+    active = []
+
+    for day_offset in range(days):
+        day = first_day + timedelta(days=day_offset)
+        day_start = local_timestamp(day, 0, zone)
+        day_end = local_timestamp(day + timedelta(days=1), 0, zone)
+
+        # Pull in records that start before this day ends
+        while position < len(records) and records[position].start_ts < day_end:
+            active.append(records[position])
+            position += 1
+
+        # Drop records that finished before this day started
+        active = [record for record in active if record.end_ts > day_start]
+
+        yield day, active
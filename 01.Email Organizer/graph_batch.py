@@ -0,0 +1,257 @@
+import time
+import graph_client
+import graph_retry
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+# Graph accepts at most 20 sub-requests per $batch call
+MAX_BATCH_SIZE = 20
+
+# ============================================================
+# JSON $BATCH QUEUE
+# ============================================================
+
+class BatchRequest:
+    """One queued sub-request; status/response are filled in after flush()"""
+
+    def __init__(self, request_id, method, url, body=None, depends_on=None, headers=None, on_complete=None):
+        self.id = request_id
+        self.method = method
+        self.url = url
+        self.body = body
+        self.depends_on = list(depends_on or [])
+        self.headers = headers
+        self.on_complete = on_complete
+
+        self.status = None
+        self.response = None
+        self.done = False
+
+    @property
+    def ok(self):
+        return self.status is not None and 200 <= self.status < 300
+
+    def to_json(self, batch_ids=None):
+        """Sub-request entry for the $batch body"""
+
+        entry = {"id": self.id, "method": self.method, "url": self.url}
+
+        if self.body is not None:
+            entry["body"] = self.body
+            entry["headers"] = {"Content-Type": "application/json"}
+
+        if self.headers:
+            entry.setdefault("headers", {}).update(self.headers)
+
+        # On a retry, dependencies that already succeeded are not resent
+        depends_on = [r.id for r in self.depends_on if batch_ids is None or r.id in batch_ids]
+        if depends_on:
+            entry["dependsOn"] = depends_on
+
+        return entry
+
+    def complete(self, status, response):
+        self.status = status
+        self.response = response
+        self.done = True
+
+        if self.on_complete:
+            self.on_complete(self)
+
+class BatchQueue:
+    """Queue Graph writes and send them as /$batch calls of up to 20
+
+    Requests that depend on each other (depends_on) are always sent in the
+    same batch, as Graph requires. A request whose dependency fails gets
+    status 424 from Graph.
+
+        queue = BatchQueue(access_token)
+        reply = queue.add("POST", "/me/sendMail", body=...)
+        queue.add("PATCH", f"/me/messages/{email_id}", body={"isRead": True}, depends_on=[reply])
+        queue.flush()
+        if reply.ok: ...
+    """
+
+    def __init__(self, access_token, auto_flush=True):
+        self.access_token = access_token
+        self.auto_flush = auto_flush
+        self.pending = []
+        self.next_id = 1
+
+    def __len__(self):
+        return len(self.pending)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+    def add(self, method, url, body=None, depends_on=None, headers=None, on_complete=None):
+        """Queue a sub-request, returns its BatchRequest handle"""
+
+        # Flush a full queue before starting a new independent chain, so a
+        # request and its dependents never end up in different flushes
+        if self.auto_flush and not depends_on and len(self.pending) >= MAX_BATCH_SIZE:
+            self.flush()
+
+        for dependency in depends_on or []:
+            if dependency.done or dependency not in self.pending:
+                raise ValueError("depends_on must reference requests still waiting in this queue")
+
+        request = BatchRequest(str(self.next_id), method, url, body, depends_on, headers, on_complete)
+        self.next_id += 1
+
+        if len(self.dependency_group(request)) > MAX_BATCH_SIZE:
+            raise ValueError(f"a dependency chain cannot exceed {MAX_BATCH_SIZE} requests")
+
+        self.pending.append(request)
+        return request
+
+    def dependency_group(self, request):
+        """All pending requests linked to this one through depends_on"""
+
+        group = {request}
+        changed = True
+
+        while changed:
+            changed = False
+            for other in self.pending + [request]:
+                if other in group:
+                    linked = [dependency for dependency in other.depends_on if dependency not in group]
+                elif any(dependency in group for dependency in other.depends_on):
+                    linked = [other]
+                else:
+                    linked = []
+
+                if linked:
+                    group.update(linked)
+                    changed = True
+
+        return group
+
+    def pack_batches(self):
+        """Split pending requests into batches, keeping dependency groups together"""
+
+        groups = []
+        seen = set()
+
+        for request in self.pending:
+            if request in seen:
+                continue
+            group = self.dependency_group(request)
+            seen.update(group)
+            # Keep queue order inside the group (dependencies come first)
+            groups.append([r for r in self.pending if r in group])
+
+        batches = []
+        current = []
+
+        for group in groups:
+            if len(current) + len(group) > MAX_BATCH_SIZE:
+                batches.append(current)
+                current = []
+            current.extend(group)
+
+        if current:
+            batches.append(current)
+
+        return batches
+
+    def flush(self):
+        """Send everything queued, returns the completed BatchRequests"""
+
+        batches = self.pack_batches()
+        completed = list(self.pending)
+        self.pending = []
+
+        for batch in batches:
+            self.send_batch(batch)
+
+        return completed
+
+    def send_batch(self, batch):
+        """Send one batch and complete each request with its own status
+
+        Sub-requests Graph throttled (429/503) are sent again after
+        Retry-After, together with anything that only failed (424) because
+        it depended on them. A POST answered 502/504 (or 503 without
+        Retry-After) keeps that status rather than being sent twice.
+        Throttled sub-requests slow down their own mailbox's token bucket,
+        once per mailbox and response, as a throttled single request would.
+        """
+
+        remaining = batch
+
+        for attempt in range(graph_retry.MAX_RETRIES + 1):
+            results = self.post_batch(remaining)
+            last_attempt = attempt == graph_retry.MAX_RETRIES
+
+            retry = []
+            retry_ids = set()
+            retry_after = None
+            throttled_mailboxes = {}  # mailbox key -> longest Retry-After
+
+            for request in remaining:
+                status, body, headers = results.get(request.id, (None, None, {}))
+                wait = graph_retry.parse_retry_after((headers or {}).get("Retry-After"))
+                blocked = status == 424 and any(dep.id in retry_ids for dep in request.depends_on)
+                throttled = status in graph_retry.RETRY_STATUSES and graph_retry.can_retry(
+                    status, wait, idempotent=request.method != "POST"
+                )
+
+                if status in graph_retry.RETRY_STATUSES:
+                    key = graph_retry.mailbox_key(request.url)
+                    throttled_mailboxes[key] = max(throttled_mailboxes.get(key, 0), wait or 0)
+
+                if not last_attempt and (throttled or blocked):
+                    retry.append(request)
+                    retry_ids.add(request.id)
+                    if wait is not None:
+                        retry_after = max(retry_after or 0, wait)
+                else:
+                    request.complete(status, body)
+
+            for key, wait in throttled_mailboxes.items():
+                graph_retry.get_bucket(key).on_throttle(wait)
+
+            if not retry:
+                return
+
+            time.sleep(graph_retry.backoff_delay(attempt, retry_after))
+            remaining = retry
+
+    def post_batch(self, batch):
+        """POST one $batch, returns {id: (status, body, headers)}
+
+        The call is paced against the mailbox its sub-requests target
+        (the /$batch url itself names none), so each mailbox keeps its own
+        token bucket and circuit breaker.
+        """
+
+        batch_ids = {request.id for request in batch}
+        mailboxes = {graph_retry.mailbox_key(request.url) for request in batch}
+
+        try:
+            # A batch of reads can be resent whole; one with a POST cannot
+            response = graph_client.graph_post(
+                self.access_token, "/$batch",
+                json={"requests": [request.to_json(batch_ids) for request in batch]},
+                idempotent=all(request.method != "POST" for request in batch),
+                mailbox=mailboxes.pop() if len(mailboxes) == 1 else None
+            )
+        except Exception as e:
+            print(f"❌ Batch request failed: {e}")
+            return {}
+
+        if response.status_code != 200:
+            print(f"❌ Batch request failed: {response.status_code}")
+            return {request.id: (response.status_code, None, {}) for request in batch}
+
+        # Anything Graph did not answer for is left out and treated as failed
+        return {
+            sub_response.get("id"): (sub_response.get("status"), sub_response.get("body"), sub_response.get("headers"))
+            for sub_response in response.json().get("responses", [])
+        }
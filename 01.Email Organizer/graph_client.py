@@ -0,0 +1,209 @@
+import requests
+from requests.adapters import HTTPAdapter
+import graph_retry
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+# Base URL for all Microsoft Graph calls
+GRAPH_URL = "https://graph.microsoft.com/v1.0"
+
+# Connection pool settings
+POOL_CONNECTIONS = 4   # Number of hosts to keep a pool for (Graph + login)
+POOL_MAXSIZE = 16      # Max kept-alive connections per host
+POOL_BLOCK = True      # Wait for a free connection instead of opening extra ones
+
+# Timeout for a single request (in seconds)
+REQUEST_TIMEOUT = 30
+
+# Shared session, created on first use
+_session = None
+
+# ============================================================
+# ERRORS
+# ============================================================
+
+class GraphError(Exception):
+    """Graph answered with an error status (a listing cut short, or writes that failed)"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+# ============================================================
+# SESSION
+# ============================================================
+
+def create_session(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, pool_block=POOL_BLOCK):
+    """Create a requests session with a keep-alive connection pool"""
+
+    session = requests.Session()
+
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=pool_block
+    )
+
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+
+    return session
+
+def get_session():
+    """Get the shared pooled session used by all scripts"""
+
+    global _session
+
+    if _session is None:
+        _session = create_session()
+
+    return _session
+
+def configure_pool(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, pool_block=POOL_BLOCK):
+    """Replace the shared session with one using different pool limits"""
+
+    global _session
+
+    if _session is not None:
+        _session.close()
+
+    _session = create_session(pool_connections, pool_maxsize, pool_block)
+    return _session
+
+def close_session():
+    """Close all pooled connections"""
+
+    global _session
+
+    if _session is not None:
+        _session.close()
+        _session = None
+
+# ============================================================
+# REQUEST HELPERS
+# ============================================================
+
+def graph_url(path):
+    """Build a full Graph URL from a path like '/me/messages'"""
+
+    if path.startswith("http://") or path.startswith("https://"):
+        return path
+
+    return GRAPH_URL + path
+
+def auth_headers(access_token):
+    """Standard headers for a Graph request"""
+
+    return {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json"
+    }
+
+def graph_request(method, access_token, path, headers=None, idempotent=None, mailbox=None, **kwargs):
+    """Send a request to Graph over the shared session
+
+    Requests are paced per mailbox, and 429/503 responses are retried after
+    Retry-After (see graph_retry). Raises graph_retry.GraphThrottledError if
+    Graph is still throttling after all retries. Every method but POST is
+    idempotent unless `idempotent` says otherwise. `mailbox` names the
+    mailbox to pace against when the path does not (graph_retry.mailbox_key).
+    """
+
+    url = graph_url(path)
+    request_headers = auth_headers(access_token)
+
+    if headers:
+        request_headers.update(headers)
+
+    kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+
+    return graph_retry.send_with_retry(
+        url,
+        lambda: get_session().request(method, url, headers=request_headers, **kwargs),
+        idempotent=method != "POST" if idempotent is None else idempotent,
+        key=mailbox
+    )
+
+def graph_get(access_token, path, **kwargs):
+    """GET a Graph resource"""
+    return graph_request("GET", access_token, path, **kwargs)
+
+def graph_post(access_token, path, **kwargs):
+    """POST to a Graph resource"""
+    return graph_request("POST", access_token, path, **kwargs)
+
+def graph_patch(access_token, path, **kwargs):
+    """PATCH a Graph resource"""
+    return graph_request("PATCH", access_token, path, **kwargs)
+
+def post_form(url, data):
+    """POST form data (used for the login endpoints)"""
+    return get_session().post(url, data=data, timeout=REQUEST_TIMEOUT)
+
+# ============================================================
+# PAGINATION
+# ============================================================
+
+def iter_items(access_token, path, params=None, page_size=None, headers=None):
+    """Yield items one at a time, following @odata.nextLink across pages
+
+    Raises GraphError if any page fails, so a caller never mistakes part
+    of a listing for all of it.
+    """
+
+    request_headers = dict(headers or {})
+
+    if page_size:
+        # Keep any other preference the caller set (Prefer values are comma-separated)
+        preferences = [request_headers["Prefer"]] if request_headers.get("Prefer") else []
+        request_headers["Prefer"] = ", ".join(preferences + [f"odata.maxpagesize={page_size}"])
+
+    url = path
+
+    while url:
+        response = graph_get(access_token, url, params=params, headers=request_headers)
+
+        if response.status_code != 200:
+            raise GraphError(f"Error fetching {path}: {response.status_code}", response.status_code)
+
+        page = response.json()
+
+        for item in page.get('value', []):
+            yield item
+
+        # nextLink already carries the query string
+        url = page.get('@odata.nextLink')
+        params = None
+
+# ============================================================
+# ASYNC REQUESTS (optional, needs: pip install aiohttp)
+# ============================================================
+
+def create_async_session(limit=POOL_MAXSIZE):
+    """Create a pooled aiohttp session (call from inside the event loop)"""
+
+    import aiohttp
+
+    connector = aiohttp.TCPConnector(limit=limit, limit_per_host=limit, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+async def async_graph_request(session, method, access_token, path, headers=None, **kwargs):
+    """Send a request to Graph over an aiohttp session, returns the status code"""
+
+    url = graph_url(path)
+    request_headers = auth_headers(access_token)
+
+    if headers:
+        request_headers.update(headers)
+
+    async def send():
+        async with session.request(method, url, headers=request_headers, **kwargs) as response:
+            await response.read()
+            return response.status, response.headers
+
+    return await graph_retry.async_send_with_retry(url, send, idempotent=method != "POST")
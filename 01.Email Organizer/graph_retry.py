@@ -0,0 +1,337 @@
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+# Retries for throttled (429) or unavailable (502/503/504) responses
+MAX_RETRIES = 5
+BASE_DELAY = 1.0    # First backoff step (in seconds)
+MAX_DELAY = 60.0    # Longest single wait (in seconds)
+
+# Client-side pacing per mailbox (requests per second)
+START_RATE = 10.0   # Rate to begin with
+MAX_RATE = 16.0     # Never go above this (Graph allows ~10,000 per 10 minutes per mailbox)
+MIN_RATE = 0.5      # Never go below this
+BURST = 10          # Requests that may go out back to back
+RATE_STEP = 0.2     # Added to the rate after each success
+RATE_BACKOFF = 0.5  # Rate is multiplied by this after a throttle
+
+# Circuit breaker: stop calling Graph after this many requests in a row were
+# given up (a request only counts once, after all of its retries)
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 30.0  # Seconds to stay open before trying again
+
+RETRY_STATUSES = (429, 502, 503, 504)
+
+# ============================================================
+# ERRORS
+# ============================================================
+
+class GraphThrottledError(Exception):
+    """Graph kept throttling (or was unavailable) after all retries"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class CircuitOpenError(GraphThrottledError):
+    """Requests to this mailbox are paused after repeated failures"""
+
+# ============================================================
+# TOKEN BUCKET (AIMD pacing)
+# ============================================================
+
+class TokenBucket:
+    """Paces requests to one mailbox
+
+    The rate grows slowly while requests succeed and halves on every
+    throttle (additive increase, multiplicative decrease), so it settles
+    just under the highest rate Graph will accept instead of bouncing
+    between bursts and throttling.
+    """
+
+    def __init__(self, rate=None, capacity=None):
+        self.rate = rate if rate is not None else START_RATE
+        self.capacity = capacity if capacity is not None else BURST
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Take one token, returns how long to wait before sending"""
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+
+            wait = max(0.0, -self.tokens / self.rate)
+            return max(wait, self.paused_until - now)
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(MAX_RATE, self.rate + RATE_STEP)
+
+    def on_throttle(self, retry_after=None):
+        with self.lock:
+            self.rate = max(MIN_RATE, self.rate * RATE_BACKOFF)
+            if retry_after:
+                # Nobody sends to this mailbox until Graph said it is fine
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+# ============================================================
+# CIRCUIT BREAKER
+# ============================================================
+
+class CircuitBreaker:
+    """Fails fast after repeated failures, then lets one trial request through
+
+    A failure is a request that was given up, not a single throttled
+    attempt: one request retried MAX_RETRIES times must not open the
+    breaker on its own.
+    """
+
+    def __init__(self, threshold=None, cooldown=None):
+        self.threshold = threshold if threshold is not None else BREAKER_THRESHOLD
+        self.cooldown = cooldown if cooldown is not None else BREAKER_COOLDOWN
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """True if a request may be sent now"""
+
+        with self.lock:
+            if self.opened_at is None:
+                return True
+
+            if time.monotonic() - self.opened_at < self.cooldown or self.trial_in_flight:
+                return False
+
+            # Half-open: let a single request test the water
+            self.trial_in_flight = True
+            return True
+
+    def remaining(self):
+        with self.lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+# ============================================================
+# PER-MAILBOX STATE
+# ============================================================
+
+_buckets = {}
+_breakers = {}
+_state_lock = threading.Lock()
+
+def mailbox_key(url):
+    """Which mailbox a Graph URL targets ('me' or the user id/UPN)"""
+
+    match = re.search(r"/users/([^/?]+)", url)
+    if match:
+        return match.group(1).lower()
+
+    return "me"
+
+def get_bucket(key):
+    with _state_lock:
+        if key not in _buckets:
+            _buckets[key] = TokenBucket()
+        return _buckets[key]
+
+def get_breaker(key):
+    with _state_lock:
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker()
+        return _breakers[key]
+
+# ============================================================
+# BACKOFF
+# ============================================================
+
+def parse_retry_after(value):
+    """Retry-After as seconds (header may be seconds or an HTTP date)"""
+
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def can_retry(status, retry_after=None, idempotent=True):
+    """Whether a response with one of the RETRY_STATUSES may be sent again
+
+    A 502 or 504 (or a 503 without Retry-After) can come from a gateway
+    after the request already reached the mailbox, so a non-idempotent
+    request such as sendMail is only retried when Graph refused it
+    outright: 429, or 503 with Retry-After.
+    """
+
+    if idempotent:
+        return True
+
+    return status == 429 or (status == 503 and retry_after is not None)
+
+def backoff_delay(attempt, retry_after=None):
+    """Wait before retry number `attempt` (0-based)
+
+    Retry-After from Graph always wins; otherwise exponential backoff
+    with full jitter so parallel clients don't retry in lockstep.
+    """
+
+    if retry_after is not None:
+        return min(retry_after, MAX_DELAY)
+
+    return random.uniform(0, min(MAX_DELAY, BASE_DELAY * (2 ** attempt)))
+
+def send_with_retry(url, send, idempotent=True, key=None):
+    """Call send() under pacing, retries and the circuit breaker
+
+    send() performs one HTTP attempt and returns the response. Returns the
+    first response that is not throttled; raises GraphThrottledError when
+    retries run out and CircuitOpenError when the mailbox is paused.
+    Network errors, 502/504 and 503 without Retry-After are only retried
+    for idempotent requests, since a POST such as sendMail may already
+    have been delivered (see can_retry); otherwise GraphThrottledError is
+    raised at once.
+
+    The breaker is consulted once per request; a request it let through
+    keeps its retries, and only counts as a failure when they run out.
+    Pacing and the breaker belong to the mailbox the url targets, or to
+    `key` when given (a /$batch url names no mailbox).
+    """
+
+    key = key or mailbox_key(url)
+    bucket = get_bucket(key)
+    breaker = get_breaker(key)
+    retry_after = None
+
+    if not breaker.allow():
+        raise CircuitOpenError(
+            f"Graph requests for '{key}' paused after repeated failures "
+            f"(retrying in {breaker.remaining():.0f}s)",
+            retry_after=breaker.remaining()
+        )
+
+    for attempt in range(MAX_RETRIES + 1):
+        wait = bucket.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+        try:
+            response = send()
+        except Exception:
+            if attempt == MAX_RETRIES or not idempotent:
+                breaker.record_failure()
+                raise
+            time.sleep(backoff_delay(attempt))
+            continue
+
+        if response.status_code not in RETRY_STATUSES:
+            breaker.record_success()
+            bucket.on_success()
+            return response
+
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        bucket.on_throttle(retry_after)
+
+        if not can_retry(response.status_code, retry_after, idempotent):
+            breaker.record_failure()
+            raise GraphThrottledError(
+                f"Graph returned {response.status_code} for '{key}' (not retried, it may already have been applied)",
+                retry_after=retry_after
+            )
+
+        if attempt < MAX_RETRIES:
+            time.sleep(backoff_delay(attempt, retry_after))
+
+    breaker.record_failure()
+    raise GraphThrottledError(
+        f"Graph returned {response.status_code} for '{key}' after {MAX_RETRIES} retries",
+        retry_after=retry_after
+    )
+
+async def async_send_with_retry(url, send, idempotent=True, key=None):
+    """Async version of send_with_retry; send() is a coroutine function"""
+
+    import asyncio
+
+    key = key or mailbox_key(url)
+    bucket = get_bucket(key)
+    breaker = get_breaker(key)
+    retry_after = None
+
+    if not breaker.allow():
+        raise CircuitOpenError(
+            f"Graph requests for '{key}' paused after repeated failures "
+            f"(retrying in {breaker.remaining():.0f}s)",
+            retry_after=breaker.remaining()
+        )
+
+    for attempt in range(MAX_RETRIES + 1):
+        wait = bucket.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+        try:
+            status, headers = await send()
+        except Exception:
+            if attempt == MAX_RETRIES or not idempotent:
+                breaker.record_failure()
+                raise
+            await asyncio.sleep(backoff_delay(attempt))
+            continue
+
+        if status not in RETRY_STATUSES:
+            breaker.record_success()
+            bucket.on_success()
+            return status
+
+        retry_after = parse_retry_after(headers.get("Retry-After"))
+        bucket.on_throttle(retry_after)
+
+        if not can_retry(status, retry_after, idempotent):
+            breaker.record_failure()
+            raise GraphThrottledError(
+                f"Graph returned {status} for '{key}' (not retried, it may already have been applied)",
+                retry_after=retry_after
+            )
+
+        if attempt < MAX_RETRIES:
+            await asyncio.sleep(backoff_delay(attempt, retry_after))
+
+    breaker.record_failure()
+    raise GraphThrottledError(
+        f"Graph returned {status} for '{key}' after {MAX_RETRIES} retries",
+        retry_after=retry_after
+    )
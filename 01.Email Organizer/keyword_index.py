@@ -0,0 +1,169 @@
+import re
+from collections import namedtuple
+
+# ============================================================
+# KEYWORD INDEX
+# ============================================================
+
+KeywordHit = namedtuple("KeywordHit", ["keyword", "start", "end"])
+
+# Up to this many keywords, find() runs str.find once per keyword; the
+# one-regex scan only wins above it (2000 emails, MB/s loop vs regex:
+# 4 keywords 142 vs 49, 100 keywords 13 vs 10, 175 keywords 7 vs 11)
+LOOP_MAX_KEYWORDS = 128
+
+def trie_pattern(words):
+    """Regex source for a set of words, factored by common prefixes
+
+    ["due", "deadline", "date"] becomes d(?:ue|eadline|ate) (nested as
+    deep as the words share prefixes), so the regex engine tests each
+    text position against one branch per character instead of one per
+    keyword.
+    """
+
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}  # end of a word
+
+    def build(node):
+        branches = []
+        ends_here = "" in node
+
+        for char in sorted(k for k in node if k):
+            branches.append(re.escape(char) + build(node[char]))
+
+        if not branches:
+            return ""
+
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+        # Greedy optional: the longest keyword at a position wins
+        if ends_here:
+            return "(?:" + body + ")?"
+
+        return body
+
+    return build(trie)
+
+class KeywordIndex:
+    """All keywords compiled into one automaton-like regex, built once
+
+    Each text is scanned once no matter how many keywords there are.
+    Matching is case-insensitive and substring-based (like `kw in text`).
+    Overlapping keywords are all reported: the scan finds the longest
+    keyword at each position, and shorter keywords contained in it are
+    filled in from a precomputed table. For short keyword lists find()
+    uses a plain str.find loop instead, which is faster there.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = sorted({keyword.lower() for keyword in keywords if keyword})
+
+        # keyword -> [(contained keyword, offset), ...] including itself
+        self.contained = {
+            keyword: [
+                (other, match.start())
+                for other in self.keywords
+                for match in re.finditer(f"(?={re.escape(other)})", keyword)
+            ]
+            for keyword in self.keywords
+        }
+
+        # Texts are lowercased once up front; a case-sensitive regex is
+        # several times faster than re.IGNORECASE
+        if self.keywords:
+            source = trie_pattern(self.keywords)
+            self.pattern = re.compile(source)
+            # Lookahead so matches starting inside another match are seen too.
+            # The pattern starts with a plain character class (the keywords'
+            # first letters) so the regex engine can skip ahead to candidate
+            # positions instead of trying the lookahead at every character.
+            first = "[" + "".join(re.escape(char) for char in sorted({k[0] for k in self.keywords})) + "]"
+            overlapping = f"{first}(?<=(?=({source})){first})"
+            self.overlapping = re.compile(overlapping)
+            self.overlapping_ignorecase = re.compile(overlapping, re.IGNORECASE)
+        else:
+            self.pattern = self.overlapping = self.overlapping_ignorecase = None
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def matches_any(self, *texts):
+        """True if any keyword occurs in any of the texts (stops at the first hit)"""
+
+        if self.pattern is None:
+            return False
+
+        return any(text and self.pattern.search(text.lower()) for text in texts)
+
+    def find(self, text):
+        """Every keyword occurrence as KeywordHit(keyword, start, end), in text order"""
+
+        if self.overlapping is None or not text:
+            return []
+
+        lowered = text.lower()
+
+        if len(lowered) == len(text) and len(self.keywords) <= LOOP_MAX_KEYWORDS:
+            return self.find_each(lowered)
+
+        if len(lowered) == len(text):
+            matches = self.overlapping.finditer(lowered)
+        else:
+            # A few characters change length when lowercased; keep offsets right
+            matches = self.overlapping_ignorecase.finditer(text)
+
+        hits = set()
+
+        for match in matches:
+            found = match.group(1).lower()
+            position = match.start(1)
+
+            for keyword, offset in self.contained.get(found, [(found, 0)]):
+                start = position + offset
+                hits.add(KeywordHit(keyword, start, start + len(keyword)))
+
+        return sorted(hits, key=lambda hit: (hit.start, hit.end))
+
+    def find_each(self, lowered):
+        """find() for short keyword lists: one str.find pass per keyword"""
+
+        hits = []
+
+        for keyword in self.keywords:
+            start = lowered.find(keyword)
+            while start != -1:
+                hits.append(KeywordHit(keyword, start, start + len(keyword)))
+                start = lowered.find(keyword, start + 1)
+
+        return sorted(hits, key=lambda hit: (hit.start, hit.end))
+
+    def keywords_in(self, text):
+        """Set of distinct keywords found in the text"""
+
+        return {hit.keyword for hit in self.find(text)}
+
+def windows_around(text, hits, radius):
+    """Merge the text within `radius` characters of each hit into snippets
+
+    Windows are widened to the nearest whitespace so a token such as a date
+    is never cut in half.
+    """
+
+    spans = []
+
+    for hit in hits:
+        start = text.rfind(" ", 0, max(0, hit.start - radius)) + 1
+        end = text.find(" ", min(len(text), hit.end + radius))
+        if end == -1:
+            end = len(text)
+
+        if spans and start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            spans.append([start, end])
+
+    return [text[start:end] for start, end in spans]
@@ -0,0 +1,275 @@
+import heapq
+import itertools
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import mail_sync
+import adaptive_polling
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+# How often each mailbox is checked (in seconds)
+DEFAULT_INTERVAL = 300
+
+# Mailboxes checked at the same time
+DEFAULT_WORKERS = 8
+
+# Messages per page requested from Graph
+PAGE_SIZE = 50
+
+# ============================================================
+# MAILBOXES
+# ============================================================
+
+class Mailbox:
+    """One mailbox served by the daemon (user None is the signed-in user)
+
+    `context` is scratch space that handlers keep between checks, such as
+    the sorter's folder ids. With a `poller` (adaptive_polling) the
+    interval follows the mailbox's own arrival rate.
+    """
+
+    def __init__(self, user=None, interval=DEFAULT_INTERVAL):
+        self.user = user
+        self.name = user or "me"
+        self.base = f"/users/{user}" if user else "/me"
+        self.interval = interval
+        self.poller = None
+        self.context = {}
+
+        self.checks = 0
+        self.messages = 0
+        self.errors = 0
+        self.last_check = None
+
+    @property
+    def sync_state_name(self):
+        """Delta sync state shared by every handler of this mailbox"""
+
+        if not self.user:
+            return "daemon_inbox"
+
+        return "daemon_inbox-" + re.sub(r"[^\w.@-]", "_", self.user.lower())
+
+# ============================================================
+# DAEMON
+# ============================================================
+
+class MailDaemon:
+    """Fetches each mailbox's new messages once and hands them to every handler
+
+    A handler is handle(access_token, mailbox, messages) and returns how
+    many actions it took. Each declares the message fields it reads; the
+    daemon selects all of them in a single delta sync per mailbox, so
+    adding a handler adds no requests. Handlers run in the order they
+    were registered.
+
+    A check's delta sync state is only saved once every handler has run
+    without raising; otherwise the same messages come back next check, to
+    every handler, so handlers must skip messages they already acted on
+    (the scripts' handlers do, through their dedup stores).
+
+    Mailboxes wait in a heap ordered by when their next check is due and
+    up to `workers` are checked at once. A mailbox is only put back once
+    its check has finished, so checks of one mailbox never overlap and a
+    slow mailbox does not hold up the others.
+
+        daemon = MailDaemon(lambda mailbox: get_access_token())
+        daemon.register("sort", sorter.handle_messages, sorter.MESSAGE_FIELDS)
+        daemon.add_mailbox("shared@example.com")
+        daemon.run()
+    """
+
+    def __init__(self, get_token, workers=DEFAULT_WORKERS, interval=DEFAULT_INTERVAL, initial_days=None,
+                 adaptive=False, min_interval=adaptive_polling.MIN_INTERVAL, max_interval=adaptive_polling.MAX_INTERVAL):
+        self.get_token = get_token
+        self.workers = workers
+        self.interval = interval
+        self.initial_days = initial_days
+        self.adaptive = adaptive
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+        self.handlers = []  # (name, handle, fields)
+        self.mailboxes = {}  # name -> Mailbox
+        self.schedule = []  # heap of (due, order, mailbox)
+        self.order = itertools.count()
+        self.condition = threading.Condition()
+        self.running = False
+
+        self.fetches = 0
+        self.actions = Counter()  # handler name -> actions taken
+        self.failures = Counter()  # handler name -> checks it raised on
+
+    def register(self, name, handle, fields):
+        """Add a handler that gets every check's messages"""
+
+        self.handlers.append((name, handle, fields))
+
+    def add_mailbox(self, user=None, interval=None):
+        """Serve a mailbox, first checked as soon as a worker is free"""
+
+        mailbox = Mailbox(user, interval or self.interval)
+
+        if self.adaptive:
+            mailbox.poller = adaptive_polling.AdaptivePoller(
+                mailbox.sync_state_name, mailbox.interval, self.min_interval, self.max_interval
+            )
+            mailbox.interval = mailbox.poller.interval
+
+        with self.condition:
+            self.mailboxes[mailbox.name] = mailbox
+            heapq.heappush(self.schedule, (time.monotonic(), next(self.order), mailbox))
+            self.condition.notify()
+
+        return mailbox
+
+    def select(self):
+        """Every handler's fields, each once (plus receivedDateTime, to tell new mail from changes)"""
+
+        fields = (field.strip() for _, _, handler_fields in self.handlers for field in handler_fields.split(","))
+        return ",".join(dict.fromkeys(itertools.chain((field for field in fields if field), ["receivedDateTime"])))
+
+    # --------------------------------------------------------
+    # Checking a mailbox
+    # --------------------------------------------------------
+
+    def check(self, mailbox):
+        """Fetch a mailbox's new messages once and run every handler on them"""
+
+        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        access_token = self.get_token(mailbox)
+        if not access_token:
+            print(f"[{current_time}] ❌ No access token for {mailbox.name} - retrying next check")
+            mailbox.errors += 1
+            return
+
+        delta_round = mail_sync.DeltaRound(
+            access_token, mailbox.sync_state_name, self.select(),
+            page_size=PAGE_SIZE, initial_days=self.initial_days, base=mailbox.base
+        )
+
+        try:
+            messages = list(delta_round)
+        except Exception as e:
+            print(f"[{current_time}] ❌ Error fetching {mailbox.name}: {e}")
+            mailbox.errors += 1
+            return
+
+        with self.condition:
+            self.fetches += 1
+            mailbox.checks += 1
+            mailbox.messages += len(messages)
+            mailbox.last_check = current_time
+
+            if mailbox.poller:
+                # Only new mail counts, not messages that were read, flagged or moved
+                mailbox.interval = mailbox.poller.record_messages(messages)
+
+        if not messages:
+            delta_round.save()
+            return
+
+        print(f"\n[{current_time}] {mailbox.name}: {len(messages)} new or changed email(s)")
+
+        failed = False
+
+        for name, handle, _ in self.handlers:
+            try:
+                actions = handle(access_token, mailbox, messages)
+            except Exception as e:
+                print(f"  ❌ {name} failed on {mailbox.name}: {e}")
+                failed = True
+                with self.condition:
+                    self.failures[name] += 1
+                continue
+
+            with self.condition:
+                self.actions[name] += actions or 0
+
+        # Hold the sync state until every handler got through this check
+        if failed:
+            print(f"  ⚠️  {mailbox.name}: these emails will be handed out again next check")
+        else:
+            delta_round.save()
+
+    def run_check(self, mailbox):
+        """Check a mailbox, then schedule its next check"""
+
+        try:
+            self.check(mailbox)
+        finally:
+            with self.condition:
+                heapq.heappush(self.schedule, (time.monotonic() + mailbox.interval, next(self.order), mailbox))
+                self.condition.notify()
+
+    # --------------------------------------------------------
+    # Scheduler
+    # --------------------------------------------------------
+
+    def next_due(self):
+        """Wait for the next mailbox that is due, or None once stopped"""
+
+        with self.condition:
+            while self.running:
+                if self.schedule:
+                    wait = self.schedule[0][0] - time.monotonic()
+                    if wait <= 0:
+                        return heapq.heappop(self.schedule)[2]
+                else:
+                    wait = None
+
+                self.condition.wait(wait)
+
+        return None
+
+    def run(self):
+        """Check mailboxes as they fall due until stop() is called"""
+
+        self.running = True
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+
+        try:
+            while True:
+                mailbox = self.next_due()
+                if mailbox is None:
+                    break
+                pool.submit(self.run_check, mailbox)
+        finally:
+            # Let running checks finish (their delta state stays consistent), drop queued ones
+            self.stop()
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def stop(self):
+        """Stop scheduling checks (those already running finish first)"""
+
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def metrics(self):
+        """Counters for the whole daemon and each mailbox"""
+
+        with self.condition:
+            return {
+                "fetches": self.fetches,
+                "actions": dict(self.actions),
+                "failures": dict(self.failures),
+                "mailboxes": {
+                    name: {
+                        "checks": mailbox.checks,
+                        "messages": mailbox.messages,
+                        "errors": mailbox.errors,
+                        "interval": round(mailbox.interval, 1),
+                        "arrivalsPerHour": mailbox.poller.metrics()["arrivalsPerHour"] if mailbox.poller else None,
+                        "lastCheck": mailbox.last_check
+                    }
+                    for name, mailbox in self.mailboxes.items()
+                }
+            }
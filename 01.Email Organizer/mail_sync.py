@@ -0,0 +1,322 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+import graph_client
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+# Where sync state (deltaLinks) is kept between runs
+STATE_DIR = os.path.join(os.path.expanduser("~"), ".email_organizer")
+
+# On the very first sync, only look this far back
+INITIAL_SYNC_DAYS = 1
+
+# Messages per page requested from Graph
+PAGE_SIZE = 50
+
+# Graph's search index trails new mail by a few minutes; each search
+# looks back this much further than the last one finished (in seconds).
+# Mail indexed later than this after it arrived is never found by
+# search_messages; only a delta sync is sure to see every message
+SEARCH_INDEX_LAG = 600
+
+# ============================================================
+# STATE FILES
+# ============================================================
+
+def state_path(state_name):
+    """Path of the JSON file holding the deltaLink for one sync"""
+    return os.path.join(STATE_DIR, f"{state_name}.delta.json")
+
+def load_delta_link(state_name):
+    """Read the saved deltaLink, or None on the first run"""
+
+    try:
+        with open(state_path(state_name), "r", encoding="utf-8") as f:
+            return json.load(f).get("deltaLink")
+    except (OSError, ValueError):
+        return None
+
+def save_delta_link(state_name, delta_link):
+    """Write the deltaLink atomically so a crash never leaves half a file"""
+
+    os.makedirs(STATE_DIR, exist_ok=True)
+    path = state_path(state_name)
+    tmp_path = path + ".tmp"
+
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"deltaLink": delta_link, "savedAt": datetime.now(timezone.utc).isoformat()}, f)
+
+    os.replace(tmp_path, path)
+
+def reset_sync(state_name):
+    """Forget the deltaLink so the next sync starts over"""
+
+    try:
+        os.remove(state_path(state_name))
+    except OSError:
+        pass
+
+# ============================================================
+# DELTA SYNC
+# ============================================================
+
+def initial_delta_request(folder, select, initial_days=None, base="/me"):
+    """URL and params for the first delta round of a folder"""
+
+    since = datetime.now(timezone.utc) - timedelta(days=initial_days or INITIAL_SYNC_DAYS)
+
+    params = {
+        "$select": select,
+        "$filter": f"receivedDateTime ge {since.strftime('%Y-%m-%dT%H:%M:%SZ')}",
+        "$orderby": "receivedDateTime desc"
+    }
+
+    return f"{base}/mailFolders/{folder}/messages/delta", params
+
+class DeltaRound:
+    """One round of a delta sync whose deltaLink the caller saves
+
+    Iterating yields the messages added or changed since the last saved
+    round (deleted ones, @removed, are skipped). Once every page has been
+    read, `delta_link` holds the link for the next round, but nothing is
+    written until save() is called, so a caller can wait until it has
+    acted on every message. A round that is never saved is delivered
+    again by the next one. A failed page raises GraphError, so a cut-short
+    round is never taken for a quiet mailbox.
+    """
+
+    def __init__(self, access_token, state_name, select, folder="inbox", page_size=PAGE_SIZE, initial_days=None,
+                 base="/me"):
+        self.access_token = access_token
+        self.state_name = state_name
+        self.select = select
+        self.folder = folder
+        self.page_size = page_size
+        self.initial_days = initial_days
+        self.base = base
+        self.delta_link = None
+
+    def __iter__(self):
+        url = load_delta_link(self.state_name)
+        params = None
+
+        if url is None:
+            url, params = initial_delta_request(self.folder, self.select, self.initial_days, self.base)
+
+        headers = {"Prefer": f"odata.maxpagesize={self.page_size}"}
+
+        while url:
+            response = graph_client.graph_get(self.access_token, url, params=params, headers=headers)
+
+            if response.status_code == 410:
+                # Sync state expired on the server - start a fresh round
+                print("⚠️  Delta sync state expired, starting a full sync")
+                reset_sync(self.state_name)
+                url, params = initial_delta_request(self.folder, self.select, self.initial_days, self.base)
+                continue
+
+            if response.status_code != 200:
+                raise graph_client.GraphError(f"Error syncing {self.folder}: {response.status_code}", response.status_code)
+
+            page = response.json()
+
+            for message in page.get('value', []):
+                if '@removed' not in message:
+                    yield message
+
+            params = None
+            url = page.get('@odata.nextLink')
+
+            if not url:
+                self.delta_link = page.get('@odata.deltaLink')
+
+    def save(self):
+        """Save the deltaLink if every page was read, returns whether it was"""
+
+        if not self.delta_link:
+            return False
+
+        save_delta_link(self.state_name, self.delta_link)
+        return True
+
+def sync_messages(access_token, state_name, select, folder="inbox", page_size=PAGE_SIZE, initial_days=None,
+                  base="/me"):
+    """Yield messages added or changed since the last sync
+
+    The first sync goes back `initial_days` (default INITIAL_SYNC_DAYS).
+    `base` is "/me" or "/users/{id}" for another mailbox.
+    The deltaLink is only saved once every page has been read, so if the
+    caller stops early the same changes are delivered again next time.
+    Deleted messages (@removed) are skipped. Use DeltaRound to save the
+    deltaLink later, after acting on the messages.
+    """
+
+    delta_round = DeltaRound(access_token, state_name, select, folder, page_size, initial_days, base)
+    yield from delta_round
+    delta_round.save()
+
+# ============================================================
+# SEARCH
+# ============================================================
+#
+# Delta queries cannot be combined with $search, so a search keeps its
+# own watermark instead of a deltaLink: the receivedDateTime it has read
+# up to, kept in <state_name>.search.json. Searches overlap by
+# SEARCH_INDEX_LAG, so callers should skip messages they already handled.
+
+def search_state_path(state_name):
+    """Path of the JSON file holding the watermark for one search"""
+    return os.path.join(STATE_DIR, f"{state_name}.search.json")
+
+def load_watermark(state_name):
+    """Read the saved watermark as an aware datetime, or None on the first run"""
+
+    try:
+        with open(search_state_path(state_name), "r", encoding="utf-8") as f:
+            return parse_received(json.load(f)["watermark"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def save_watermark(state_name, watermark):
+    """Write the watermark atomically so a crash never leaves half a file"""
+
+    os.makedirs(STATE_DIR, exist_ok=True)
+    path = search_state_path(state_name)
+    tmp_path = path + ".tmp"
+
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "watermark": watermark.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            "savedAt": datetime.now(timezone.utc).isoformat()
+        }, f)
+
+    os.replace(tmp_path, path)
+
+def parse_received(value):
+    """Graph's receivedDateTime (always UTC) as an aware datetime"""
+
+    return datetime.fromisoformat(value[:19]).replace(tzinfo=timezone.utc)
+
+def keywords_query(keywords):
+    """KQL matching any of the keywords, for $search
+
+    Single words match as prefixes ("deadline*" also finds "deadlines");
+    anything with spaces or punctuation is searched as a phrase.
+    """
+
+    terms = []
+
+    for keyword in keywords:
+        keyword = keyword.strip().replace('"', '')
+        if not keyword:
+            continue
+        if keyword.isalnum():
+            terms.append(keyword + "*")
+        else:
+            terms.append(f'\\"{keyword}\\"')
+
+    return "(" + " OR ".join(terms) + ")"
+
+class SearchRound:
+    """One search for a KQL query whose watermark the caller saves
+
+    Iterating yields the messages matching the query that arrived since
+    the last saved round. Graph does the matching, so only the hits come
+    back (with just the `select` fields). The first search goes back
+    `initial_days` (default INITIAL_SYNC_DAYS). KQL only compares dates,
+    so results are trimmed to the exact watermark here. As with
+    DeltaRound, nothing is written until save() is called after every
+    page was read, and a failed page raises GraphError.
+    """
+
+    def __init__(self, access_token, state_name, select, query, folder="inbox", page_size=PAGE_SIZE, initial_days=None,
+                 base="/me"):
+        self.access_token = access_token
+        self.state_name = state_name
+        self.select = select
+        self.query = query
+        self.folder = folder
+        self.page_size = page_size
+        self.initial_days = initial_days
+        self.base = base
+        self.watermark = None
+
+    def __iter__(self):
+        started = datetime.now(timezone.utc)
+        since = load_watermark(self.state_name)
+
+        if since is None:
+            since = started - timedelta(days=self.initial_days or INITIAL_SYNC_DAYS)
+
+        url = f"{self.base}/mailFolders/{self.folder}/messages"
+        params = {
+            "$search": f'"{self.query} AND received>={since.strftime("%Y-%m-%d")}"',
+            "$select": self.select,
+            "$top": self.page_size
+        }
+
+        while url:
+            response = graph_client.graph_get(self.access_token, url, params=params)
+
+            if response.status_code != 200:
+                raise graph_client.GraphError(f"Error searching {self.folder}: {response.status_code}", response.status_code)
+
+            page = response.json()
+
+            for message in page.get('value', []):
+                received = message.get('receivedDateTime')
+                if received is None or parse_received(received) >= since:
+                    yield message
+
+            params = None
+            url = page.get('@odata.nextLink')
+
+        self.watermark = started - timedelta(seconds=SEARCH_INDEX_LAG)
+
+    def save(self):
+        """Save the watermark if every page was read, returns whether it was"""
+
+        if self.watermark is None:
+            return False
+
+        save_watermark(self.state_name, self.watermark)
+        return True
+
+def search_messages(access_token, state_name, select, query, folder="inbox", page_size=PAGE_SIZE, initial_days=None,
+                    base="/me"):
+    """Yield messages matching a KQL query that arrived since the last search
+
+    As with sync_messages, the watermark is only saved once every page
+    has been read. Use SearchRound to save it later, after acting on the
+    messages.
+    """
+
+    search_round = SearchRound(access_token, state_name, select, query, folder, page_size, initial_days, base)
+    yield from search_round
+    search_round.save()
+
+def count_received(access_token, since, folder="inbox", base="/me"):
+    """How many messages in a folder were received after `since` (an aware datetime)
+
+    One request whatever the count ($count with $top=1), for callers that
+    only fetch search hits but still need the arrival rate. Returns None
+    if Graph refused the query.
+    """
+
+    params = {
+        "$filter": f"receivedDateTime gt {since.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}",
+        "$count": "true",
+        "$select": "id",
+        "$top": 1
+    }
+
+    response = graph_client.graph_get(access_token, f"{base}/mailFolders/{folder}/messages", params=params)
+
+    if response.status_code != 200:
+        print(f"❌ Error counting new messages in {folder}: {response.status_code}")
+        return None
+
+    return response.json().get('@odata.count')
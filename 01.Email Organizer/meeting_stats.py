@@ -0,0 +1,251 @@
+from array import array
+from bisect import bisect_right
+from datetime import timedelta
+from event_records import local_timestamp, timestamp_of, to_local
+
+np = None  # NumPy once loaded (optional: pip install numpy, much faster on big reports)
+_numpy_checked = False
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+# Meetings starting this soon after the previous one ends count as back-to-back (in seconds)
+BACK_TO_BACK_GAP = 5 * 60
+
+# How many busiest hours / top organizers to report
+TOP_COUNT = 3
+
+# Events longer than this only count towards the heatmap for their first day (in hours)
+HEATMAP_MAX_HOURS = 24
+
+# Reports with fewer meetings use plain Python: importing NumPy takes
+# longer than the statistics themselves, which matters for quick exports
+NUMPY_MIN_EVENTS = 10000
+
+# ============================================================
+# COLUMNAR EVENTS
+# ============================================================
+
+class EventColumns:
+    """Event fields kept column by column, filled as EventRecords stream past
+
+    Each column is a compact array of machine integers (8 bytes per value
+    instead of a Python object), which NumPy reads without copying.
+    Organizers are stored as small integer codes.
+    """
+
+    def __init__(self, records=None):
+        self.start = array("q")
+        self.end = array("q")
+        self.attendees = array("q")
+        self.organizer = array("q")
+        self.organizers = {}  # address -> code
+
+        for record in records or []:
+            self.append(record)
+
+    def __len__(self):
+        return len(self.start)
+
+    def append(self, record):
+        self.start.append(record.start_ts)
+        self.end.append(max(record.start_ts, record.end_ts))
+        self.attendees.append(record.attendee_count)
+        self.organizer.append(self.organizers.setdefault(record.organizer.lower(), len(self.organizers)))
+
+    def organizer_names(self):
+        """Addresses indexed by organizer code"""
+
+        names = [""] * len(self.organizers)
+        for address, code in self.organizers.items():
+            names[code] = address
+        return names
+
+# ============================================================
+# STATISTICS
+# ============================================================
+
+def load_numpy():
+    """Import NumPy on first use (None when it is not installed)"""
+
+    global np, _numpy_checked
+
+    if not _numpy_checked:
+        _numpy_checked = True
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+
+    return np
+
+class DayGrid:
+    """Local days of the report period, for turning timestamps into day/hour numbers"""
+
+    def __init__(self, start_date, end_date, zone=None):
+        first_day = to_local(timestamp_of(start_date), zone).date()
+        last_day = to_local(timestamp_of(end_date), zone).date()
+
+        self.days = [first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)]
+
+        # Midnight of each day plus the one after the last, as timestamps
+        self.midnights = [local_timestamp(day, 0, zone) for day in self.days]
+        self.midnights.append(local_timestamp(last_day + timedelta(days=1), 0, zone))
+
+        # UTC offset of each day (taken at noon, after any DST change)
+        self.offsets = [
+            int(to_local(local_timestamp(day, 12, zone), zone).utcoffset().total_seconds())
+            for day in self.days
+        ]
+        self.weekdays = [day.weekday() for day in self.days]
+
+def empty_stats(grid):
+    return {
+        "total_meetings": 0,
+        "total_hours": 0.0,
+        "days": len(grid.days),
+        "average_per_day": 0.0,
+        "average_hours_per_day": 0.0,
+        "average_attendees": 0.0,
+        "back_to_back": 0,
+        "per_day": [(day, 0, 0.0) for day in grid.days],
+        "busiest_hours": [],
+        "top_organizers": [],
+        "heatmap": [[0.0] * 24 for _ in range(7)]
+    }
+
+def finish_stats(stats, grid, per_day_counts, per_day_hours, heatmap, organizer_counts, names):
+    """Fill the derived numbers shared by both implementations"""
+
+    days = len(grid.days)
+    stats["average_per_day"] = stats["total_meetings"] / days
+    stats["average_hours_per_day"] = stats["total_hours"] / days
+    stats["per_day"] = list(zip(grid.days, per_day_counts, per_day_hours))
+    stats["heatmap"] = heatmap
+
+    hour_load = [sum(row[hour] for row in heatmap) for hour in range(24)]
+    busiest = sorted(range(24), key=lambda hour: -hour_load[hour])[:TOP_COUNT]
+    stats["busiest_hours"] = [(hour, hour_load[hour]) for hour in busiest if hour_load[hour] > 0]
+
+    top = sorted(range(len(organizer_counts)), key=lambda code: -organizer_counts[code])[:TOP_COUNT]
+    stats["top_organizers"] = [(names[code] or "Unknown", organizer_counts[code]) for code in top]
+
+    return stats
+
+def compute_stats(columns, start_date, end_date, zone=None):
+    """Meeting statistics for the period, computed column-wise
+
+    Returns a dict with totals, per-day counts and hours, back-to-back
+    meetings, busiest hours of the day, top organizers and a 7 x 24
+    heatmap of meeting hours (weekday x hour). Uses NumPy when installed
+    and the report has at least NUMPY_MIN_EVENTS meetings.
+    """
+
+    grid = DayGrid(start_date, end_date, zone)
+
+    if len(columns) == 0:
+        return empty_stats(grid)
+
+    if len(columns) >= NUMPY_MIN_EVENTS and load_numpy() is not None:
+        return compute_stats_numpy(columns, grid)
+
+    return compute_stats_python(columns, grid)
+
+def compute_stats_numpy(columns, grid):
+    start = np.frombuffer(columns.start, dtype=np.int64)
+    end = np.frombuffer(columns.end, dtype=np.int64)
+    attendees = np.frombuffer(columns.attendees, dtype=np.int64)
+    organizer = np.frombuffer(columns.organizer, dtype=np.int64)
+    days = len(grid.days)
+    duration_hours = (end - start) / 3600
+
+    stats = empty_stats(grid)
+    stats["total_meetings"] = len(start)
+    stats["total_hours"] = float(duration_hours.sum())
+    stats["average_attendees"] = float(attendees.mean())
+
+    # Day number of each start (events outside the period are left out of per-day numbers)
+    day = np.searchsorted(np.asarray(grid.midnights, dtype=np.int64), start, side="right") - 1
+    in_period = (day >= 0) & (day < days)
+    day = np.clip(day, 0, days - 1)
+    per_day_counts = np.bincount(day[in_period], minlength=days)
+    per_day_hours = np.bincount(day[in_period], weights=duration_hours[in_period], minlength=days)
+
+    # Back-to-back: next meeting (by start) begins within BACK_TO_BACK_GAP of this one ending
+    order = np.lexsort((end, start))
+    gaps = start[order][1:] - end[order][:-1]
+    stats["back_to_back"] = int(np.count_nonzero((gaps >= 0) & (gaps <= BACK_TO_BACK_GAP)))
+
+    # Heatmap: spread each meeting's minutes over the local hours it covers
+    offsets = np.asarray(grid.offsets, dtype=np.int64)[day]
+    weekdays = np.asarray(grid.weekdays, dtype=np.int64)[day]
+    local_start = start + offsets
+    local_end = np.minimum(end, start + HEATMAP_MAX_HOURS * 3600) + offsets
+    first_hour = local_start // 3600
+    day_hour = first_hour % 24
+    heatmap = np.zeros(7 * 24)
+
+    for step in range(int(((local_end - first_hour * 3600).max() + 3599) // 3600)):
+        bucket = (first_hour + step) * 3600
+        overlap = np.minimum(local_end, bucket + 3600) - np.maximum(local_start, bucket)
+        covered = overlap > 0
+        hours_since = day_hour[covered] + step
+        cell = (weekdays[covered] + hours_since // 24) % 7 * 24 + hours_since % 24
+        heatmap += np.bincount(cell, weights=overlap[covered] / 3600, minlength=7 * 24)
+
+    heatmap = heatmap.reshape(7, 24)
+
+    organizer_counts = np.bincount(organizer, minlength=len(columns.organizers))
+
+    return finish_stats(
+        stats, grid,
+        per_day_counts.tolist(), per_day_hours.tolist(), heatmap.tolist(),
+        organizer_counts.tolist(), columns.organizer_names()
+    )
+
+def compute_stats_python(columns, grid):
+    """Same numbers as compute_stats_numpy, for when NumPy is not installed"""
+
+    days = len(grid.days)
+    stats = empty_stats(grid)
+    stats["total_meetings"] = len(columns)
+    stats["total_hours"] = sum(end - start for start, end in zip(columns.start, columns.end)) / 3600
+    stats["average_attendees"] = sum(columns.attendees) / len(columns)
+
+    per_day_counts = [0] * days
+    per_day_hours = [0.0] * days
+    heatmap = [[0.0] * 24 for _ in range(7)]
+
+    for start, end in zip(columns.start, columns.end):
+        day = bisect_right(grid.midnights, start) - 1
+        if 0 <= day < days:
+            per_day_counts[day] += 1
+            per_day_hours[day] += (end - start) / 3600
+
+        day = min(max(day, 0), days - 1)
+        offset = grid.offsets[day]
+        local_start = start + offset
+        local_end = min(end, start + HEATMAP_MAX_HOURS * 3600) + offset
+        first_hour = local_start // 3600
+        bucket = first_hour * 3600
+
+        while bucket < local_end:
+            overlap = min(local_end, bucket + 3600) - max(local_start, bucket)
+            hours_since = bucket // 3600 - first_hour + first_hour % 24
+            heatmap[(grid.weekdays[day] + hours_since // 24) % 7][hours_since % 24] += overlap / 3600
+            bucket += 3600
+
+    ordered = sorted(zip(columns.start, columns.end))
+    stats["back_to_back"] = sum(
+        1 for (_, end), (start, _) in zip(ordered, ordered[1:]) if 0 <= start - end <= BACK_TO_BACK_GAP
+    )
+
+    organizer_counts = [0] * len(columns.organizers)
+    for code in columns.organizer:
+        organizer_counts[code] += 1
+
+    return finish_stats(
+        stats, grid, per_day_counts, per_day_hours, heatmap, organizer_counts, columns.organizer_names()
+    )
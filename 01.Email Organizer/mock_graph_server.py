@@ -0,0 +1,559 @@
+import json
+import re
+import secrets
+import socket
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, parse_qsl, urlencode, quote
+
+# ============================================================
+# LOCAL STUB OF MICROSOFT GRAPH (for benchmarks and dry runs)
+# ============================================================
+#
+# Usage:
+#     server, base_url = start_mock_server()
+#     graph_client.GRAPH_URL = base_url
+#     ...
+#     server.shutdown()
+
+class MockGraph:
+    """In-memory mailbox/calendar that answers a small subset of Graph"""
+
+    def __init__(self, messages=None, events=None):
+        self.messages = []
+        self.message_index = {}  # id -> message
+        self.moved_messages = {}  # id -> folder id it was moved to
+        self.folders = [{"id": "folder-inbox", "displayName": "Inbox", "parentFolderId": "root", "childFolderCount": 0}]
+        self.folder_versions = {"folder-inbox": 0}
+        self.versions = {}
+        self.sequence = 0
+        self.events = []
+        self.event_versions = {}
+        self.removed_events = {}  # id -> sequence it was deleted at
+        self.sent_mail = []
+        self.tasks = []
+        self.schedules = {}  # address -> availabilityView string
+        self.subscriptions = {}  # id -> subscription
+        self.notifications_sent = 0
+        self.request_count = 0
+        self.bytes_sent = 0  # Response body bytes, for payload size benchmarks
+        self.latency = 0  # Seconds added to every response (simulates the WAN)
+        self.throttle_rate = 0  # Max requests per second before answering 429 (0 = off)
+        self.throttled_count = 0
+        self.window = (0, 0)  # (second, requests seen in it)
+        self.lock = threading.Lock()
+
+        for message in messages or []:
+            self.add_message(message)
+
+        for event in events or []:
+            self.add_event(event)
+
+        self.routes = [
+            ("GET", r"^/me/mailFolders/inbox/messages$", self.list_messages),
+            ("GET", r"^/me/mailFolders/inbox/messages/delta$", self.message_delta),
+            ("POST", r"^/me/sendMail$", self.send_mail),
+            ("GET", r"^/me/messages/(?P<message_id>[^/]+)$", self.get_message),
+            ("PATCH", r"^/me/messages/(?P<message_id>[^/]+)$", self.update_message),
+            ("POST", r"^/me/messages/(?P<message_id>[^/]+)/move$", self.move_message),
+            ("GET", r"^/me/mailFolders$", self.list_folders),
+            ("POST", r"^/me/mailFolders$", self.create_folder),
+            ("GET", r"^/me/mailFolders/delta$", self.folder_delta),
+            ("GET", r"^/me/mailFolders/(?P<folder_id>[^/]+)$", self.get_folder),
+            ("GET", r"^/me/mailFolders/(?P<folder_id>[^/]+)/childFolders$", self.list_folders),
+            ("POST", r"^/me/mailFolders/(?P<folder_id>[^/]+)/childFolders$", self.create_folder),
+            ("POST", r"^/me/outlook/tasks$", self.create_task),
+            ("GET", r"^/me/calendar/calendarView$", self.list_events),
+            ("GET", r"^/me/calendarView/delta$", self.event_delta),
+            ("GET", r"^/users/(?P<user_id>[^/]+)/calendar/calendarView$", self.list_events),
+            ("GET", r"^/users/(?P<user_id>[^/]+)/calendarView/delta$", self.event_delta),
+            ("POST", r"^/me/calendar/getSchedule$", self.get_schedule),
+            ("POST", r"^/\$batch$", self.batch),
+            ("POST", r"^/subscriptions$", self.create_subscription),
+            ("PATCH", r"^/subscriptions/(?P<subscription_id>[^/]+)$", self.renew_subscription),
+            ("DELETE", r"^/subscriptions/(?P<subscription_id>[^/]+)$", self.delete_subscription),
+        ]
+
+    def handle(self, method, path, query, body, headers):
+        """Dispatch a request to the matching route"""
+
+        with self.lock:
+            self.request_count += 1
+
+            if self.throttle_rate:
+                second = int(time.monotonic())
+                count = self.window[1] + 1 if self.window[0] == second else 1
+                self.window = (second, count)
+
+                if count > self.throttle_rate:
+                    self.throttled_count += 1
+                    error = {"error": {"code": "TooManyRequests", "message": "Too many requests"}}
+                    return 429, error, {"Retry-After": "1"}
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        return self.route(method, path, query, body, headers)
+
+    def route(self, method, path, query, body, headers):
+        """Find and run the handler for a request"""
+
+        for route_method, pattern, handler in self.routes:
+            if route_method != method:
+                continue
+            match = re.match(pattern, path)
+            if match:
+                return handler(query=query, body=body, headers=headers, **match.groupdict())
+
+        # Every other user shares the one stub mailbox
+        shared = re.match(r"^/users/[^/]+(/.*)$", path)
+        if shared:
+            return self.route(method, "/me" + shared.group(1), query, body, headers)
+
+        return 404, {"error": {"code": "NotFound", "message": path}}, {}
+
+    def add_message(self, message):
+        """Add a message to the inbox and record it as a change"""
+
+        with self.lock:
+            self.messages.append(message)
+            self.message_index[message["id"]] = message
+            self.touch(message)
+            subscriptions = list(self.subscriptions.values())
+
+        for subscription in subscriptions:
+            self.notify(subscription, [{
+                "subscriptionId": subscription["id"],
+                "clientState": subscription["clientState"],
+                "changeType": "created",
+                "resource": f"Users/me/Messages/{message['id']}",
+                "resourceData": {"@odata.type": "#Microsoft.Graph.Message", "id": message["id"]}
+            }])
+
+    def touch(self, message):
+        self.sequence += 1
+        self.versions[message["id"]] = self.sequence
+
+    def add_event(self, event):
+        """Add or replace a calendar event and record it as a change"""
+
+        with self.lock:
+            if event["id"] in self.event_versions:
+                self.events = [e for e in self.events if e["id"] != event["id"]]
+            self.events.append(event)
+            self.sequence += 1
+            self.event_versions[event["id"]] = self.sequence
+            self.removed_events.pop(event["id"], None)
+
+    def remove_event(self, event_id):
+        with self.lock:
+            self.events = [e for e in self.events if e["id"] != event_id]
+            self.sequence += 1
+            self.removed_events[event_id] = self.sequence
+
+    def select(self, items, query):
+        """Project items to the fields in $select (id is always kept)"""
+
+        if "$select" not in query:
+            return items
+
+        fields = ["id"] + query["$select"][0].split(",")
+        return [{field: item[field] for field in fields if field in item} for item in items]
+
+    def search(self, messages, query):
+        """Apply a simple KQL $search: OR'd words (prefix*) or "phrases", plus received>=YYYY-MM-DD"""
+
+        kql = query["$search"][0].strip('"')
+        received = re.search(r"received>=(\d{4}-\d{2}-\d{2})", kql)
+        kql = re.sub(r"received>=\S+", " ", kql)
+        terms = [
+            (phrase or word).lower()
+            for phrase, word in re.findall(r'\\?"([^"\\]+)\\?"|([\w-]+)\*?', kql)
+            if phrase or word not in ("OR", "AND")
+        ]
+
+        def matches(message):
+            if received and message.get("receivedDateTime", "")[:10] < received.group(1):
+                return False
+            text = " ".join([
+                message.get("subject") or "", message.get("bodyPreview") or "",
+                (message.get("body") or {}).get("content") or ""
+            ]).lower()
+            return not terms or any(term in text for term in terms)
+
+        return [m for m in messages if matches(m)]
+
+    def page(self, items, path, query, headers):
+        """Return one page of items, with @odata.nextLink when more remain"""
+
+        page_size = int(query.get("$top", ["10"])[0])
+        prefer = headers.get("Prefer") or ""
+        if "odata.maxpagesize=" in prefer:
+            page_size = int(prefer.split("odata.maxpagesize=")[1].split(",")[0])
+
+        skip = int(query.get("$skip", ["0"])[0])
+        result = {"value": items[skip:skip + page_size]}
+
+        if skip + page_size < len(items):
+            next_query = {name: values[0] for name, values in query.items()}
+            next_query["$skip"] = skip + page_size
+            result["@odata.nextLink"] = f"http://{headers['Host']}{path}?{urlencode(next_query)}"
+
+        return result
+
+    # --------------------------------------------------------
+    # Routes
+    # --------------------------------------------------------
+
+    def list_messages(self, query, body, headers):
+        messages = [m for m in self.messages if m["id"] not in self.moved_messages]
+
+        if query.get("$filter", [""])[0] == "isRead eq false":
+            messages = [m for m in messages if not m.get("isRead")]
+
+        received = re.match(r"receivedDateTime (gt|ge) (\S+)$", query.get("$filter", [""])[0])
+        if received:
+            since = received.group(2)[:19]
+            messages = [
+                m for m in messages
+                if m.get("receivedDateTime", "")[:19] > since
+                or (received.group(1) == "ge" and m.get("receivedDateTime", "")[:19] == since)
+            ]
+
+        if "$search" in query:
+            messages = self.search(messages, query)
+
+        result = self.page(self.select(messages, query), "/me/mailFolders/inbox/messages", query, headers)
+
+        if query.get("$count", [""])[0] == "true":
+            result["@odata.count"] = len(messages)
+
+        return 200, result, {}
+
+    def message_delta(self, query, body, headers):
+        token = int(query.get("$deltatoken", ["0"])[0])
+        # Moved messages keep their place and come back as @removed, so
+        # paging through a round stays stable while messages are moved
+        changed = [
+            {"id": m["id"], "@removed": {"reason": "changed"}} if m["id"] in self.moved_messages else m
+            for m in self.messages if self.versions[m["id"]] > token
+        ]
+
+        result = self.page(self.select(changed, query), "/me/mailFolders/inbox/messages/delta", query, headers)
+
+        if "@odata.nextLink" not in result:
+            result["@odata.deltaLink"] = (
+                f"http://{headers['Host']}/me/mailFolders/inbox/messages/delta?$deltatoken={self.sequence}"
+            )
+
+        return 200, result, {}
+
+    def batch(self, query, body, headers):
+        """Run sub-requests in order, failing those whose dependsOn failed (424)"""
+
+        statuses = {}
+        responses = []
+
+        for sub_request in body.get("requests", []):
+            if any(not 200 <= statuses.get(dep, 0) < 300 for dep in sub_request.get("dependsOn", [])):
+                status, payload = 424, {"error": {"code": "FailedDependency"}}
+            else:
+                parts = urlsplit(sub_request["url"])
+                sub_headers = {**dict(headers.items()), **sub_request.get("headers", {})}
+                status, payload, _ = self.route(
+                    sub_request["method"], parts.path, parse_qs(parts.query), sub_request.get("body"), sub_headers
+                )
+
+            statuses[sub_request["id"]] = status
+            responses.append({"id": sub_request["id"], "status": status, "body": payload})
+
+        return 200, {"responses": responses}, {}
+
+    def send_mail(self, query, body, headers):
+        with self.lock:
+            self.sent_mail.append(body)
+        return 202, None, {}
+
+    def get_message(self, query, body, headers, message_id):
+        message = self.message_index.get(message_id)
+        if message is None or message_id in self.moved_messages:
+            return 404, {"error": {"code": "ErrorItemNotFound"}}, {}
+
+        message = self.select([message], query)[0]
+
+        # Prefer: outlook.body-content-type="text" returns the body without HTML
+        body_type = re.search(r'outlook\.body-content-type="?(\w+)', headers.get("Prefer") or "")
+        if body_type and body_type.group(1).lower() == "text" and (message.get("body") or {}).get("contentType") == "html":
+            text = re.sub(r"<(script|style|head)\b.*?</\1\s*>|<[^>]+>", " ", message["body"]["content"], flags=re.DOTALL)
+            message = {**message, "body": {"contentType": "text", "content": " ".join(text.split())}}
+
+        return 200, message, {}
+
+    def update_message(self, query, body, headers, message_id):
+        for message in self.messages:
+            if message.get("id") == message_id:
+                message.update(body or {})
+                self.touch(message)
+                return 200, message, {}
+        return 404, {"error": {"code": "ErrorItemNotFound"}}, {}
+
+    def move_message(self, query, body, headers, message_id):
+        folder_id = (body or {}).get("destinationId")
+
+        with self.lock:
+            message = self.message_index.get(message_id)
+            if message is None or message_id in self.moved_messages:
+                return 404, {"error": {"code": "ErrorItemNotFound"}}, {}
+            if not any(folder["id"] == folder_id for folder in self.folders):
+                return 400, {"error": {"code": "ErrorInvalidIdMalformed"}}, {}
+            self.moved_messages[message_id] = folder_id
+            self.touch(message)
+
+        return 201, {**message, "parentFolderId": folder_id}, {}
+
+    def find_folder(self, folder_id):
+        """Folder by id, or by well-known name (only the inbox here)"""
+
+        folder_id = "folder-inbox" if folder_id == "inbox" else folder_id
+        return next((folder for folder in self.folders if folder["id"] == folder_id), None)
+
+    def list_folders(self, query, body, headers, folder_id=None):
+        parent = self.find_folder(folder_id) if folder_id else {"id": "root"}
+        if parent is None:
+            return 404, {"error": {"code": "ErrorItemNotFound"}}, {}
+
+        children = [folder for folder in self.folders if folder["parentFolderId"] == parent["id"]]
+        path = f"/me/mailFolders/{folder_id}/childFolders" if folder_id else "/me/mailFolders"
+        return 200, self.page(children, path, query, headers), {}
+
+    def get_folder(self, query, body, headers, folder_id):
+        folder = self.find_folder(folder_id)
+        if folder is None:
+            return 404, {"error": {"code": "ErrorItemNotFound"}}, {}
+        return 200, folder, {}
+
+    def create_folder(self, query, body, headers, folder_id=None):
+        name = (body or {}).get("displayName", "")
+
+        with self.lock:
+            parent = self.find_folder(folder_id) if folder_id else {"id": "root"}
+            if parent is None:
+                return 404, {"error": {"code": "ErrorItemNotFound"}}, {}
+
+            siblings = [folder for folder in self.folders if folder["parentFolderId"] == parent["id"]]
+            if any(folder["displayName"].lower() == name.lower() for folder in siblings):
+                return 409, {"error": {"code": "ErrorFolderExists"}}, {}
+
+            folder = {"id": f"folder-{len(self.folders) + 1}", "displayName": name,
+                      "parentFolderId": parent["id"], "childFolderCount": 0}
+            self.folders.append(folder)
+            if "childFolderCount" in parent:
+                parent["childFolderCount"] += 1
+
+            self.sequence += 1
+            self.folder_versions[folder["id"]] = self.sequence
+
+        return 201, folder, {}
+
+    def folder_delta(self, query, body, headers):
+        token = int(query.get("$deltatoken", ["0"])[0])
+        changed = [folder for folder in self.folders if self.folder_versions[folder["id"]] > token or not token]
+
+        result = self.page(changed, "/me/mailFolders/delta", query, headers)
+
+        if "@odata.nextLink" not in result:
+            result["@odata.deltaLink"] = f"http://{headers['Host']}/me/mailFolders/delta?$deltatoken={self.sequence}"
+
+        return 200, result, {}
+
+    # --------------------------------------------------------
+    # Change notifications (the stub posts them like Graph would)
+    # --------------------------------------------------------
+
+    def create_subscription(self, query, body, headers):
+        # Graph checks the endpoint first: it must echo the token back
+        token = secrets.token_urlsafe(16)
+        url = body["notificationUrl"] + ("&" if "?" in body["notificationUrl"] else "?") + "validationToken=" + quote(token)
+
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, data=b"", method="POST"), timeout=10) as response:
+                echoed = response.read().decode("utf-8")
+        except OSError:
+            echoed = None
+
+        if echoed != token:
+            return 400, {"error": {"code": "InvalidRequest", "message": "Subscription validation request failed"}}, {}
+
+        subscription = {**body, "id": f"subscription-{secrets.token_hex(4)}"}
+
+        with self.lock:
+            self.subscriptions[subscription["id"]] = subscription
+
+        return 201, subscription, {}
+
+    def renew_subscription(self, query, body, headers, subscription_id):
+        with self.lock:
+            subscription = self.subscriptions.get(subscription_id)
+            if subscription is None:
+                return 404, {"error": {"code": "ResourceNotFound"}}, {}
+            subscription["expirationDateTime"] = body["expirationDateTime"]
+
+        return 200, subscription, {}
+
+    def delete_subscription(self, query, body, headers, subscription_id):
+        with self.lock:
+            if self.subscriptions.pop(subscription_id, None) is None:
+                return 404, {"error": {"code": "ResourceNotFound"}}, {}
+
+        return 204, None, {}
+
+    def notify(self, subscription, notifications, url=None):
+        """Post notifications to a subscriber from a background thread"""
+
+        def post():
+            data = json.dumps({"value": notifications}).encode("utf-8")
+            request = urllib.request.Request(
+                url or subscription["notificationUrl"], data=data, headers={"Content-Type": "application/json"}
+            )
+            try:
+                urllib.request.urlopen(request, timeout=5).close()
+                with self.lock:
+                    self.notifications_sent += len(notifications)
+            except OSError:
+                pass
+
+        threading.Thread(target=post, daemon=True).start()
+
+    def send_lifecycle_event(self, subscription_id, event):
+        """Send a lifecycle notification; subscriptionRemoved also drops the subscription"""
+
+        with self.lock:
+            subscription = self.subscriptions.get(subscription_id)
+            if event == "subscriptionRemoved":
+                self.subscriptions.pop(subscription_id, None)
+
+        if subscription is not None:
+            self.notify(subscription, [{
+                "subscriptionId": subscription_id,
+                "clientState": subscription["clientState"],
+                "lifecycleEvent": event
+            }], url=subscription.get("lifecycleNotificationUrl"))
+
+    def create_task(self, query, body, headers):
+        with self.lock:
+            self.tasks.append(body)
+        return 201, body, {}
+
+    # Every user shares the one stub calendar
+
+    def list_events(self, query, body, headers, user_id=None):
+        base = f"/users/{user_id}" if user_id else "/me"
+        return 200, self.page(self.events, f"{base}/calendar/calendarView", query, headers), {}
+
+    def event_delta(self, query, body, headers, user_id=None):
+        base = f"/users/{user_id}" if user_id else "/me"
+        token = int(query.get("$deltatoken", ["0"])[0])
+        window_start = query["startDateTime"][0].rstrip("Z")
+        window_end = query["endDateTime"][0].rstrip("Z")
+
+        changed = []
+        for event in self.events:
+            if self.event_versions[event["id"]] <= token:
+                continue
+            if event["start"]["dateTime"][:19] < window_end and event["end"]["dateTime"][:19] > window_start:
+                changed.append(event)
+            elif token:
+                # Moved out of this window since the last round
+                changed.append({"id": event["id"], "@removed": {"reason": "changed"}})
+
+        changed += [
+            {"id": event_id, "@removed": {"reason": "deleted"}}
+            for event_id, version in self.removed_events.items() if version > token
+        ]
+
+        result = self.page(changed, f"{base}/calendarView/delta", query, headers)
+
+        if "@odata.nextLink" not in result:
+            window = urlencode({"startDateTime": query["startDateTime"][0], "endDateTime": query["endDateTime"][0]})
+            result["@odata.deltaLink"] = (
+                f"http://{headers['Host']}{base}/calendarView/delta?{window}&$deltatoken={self.sequence}"
+            )
+
+        return 200, result, {}
+
+    def get_schedule(self, query, body, headers):
+        # Unknown people come back as an error entry, like Graph does
+        return 200, {"value": [
+            {"scheduleId": address, "availabilityView": self.schedules[address]}
+            if address in self.schedules
+            else {"scheduleId": address, "error": {"message": "Mailbox not found", "responseCode": "ErrorMailboxNotFound"}}
+            for address in body.get("schedules", [])
+        ]}, {}
+
+class MockGraphHandler(BaseHTTPRequestHandler):
+    """HTTP/1.1 handler so clients can reuse connections"""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Headers and body are written separately; don't let Nagle stall them
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _dispatch(self, method):
+        parts = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw_body = self.rfile.read(length) if length else b""
+        if not raw_body:
+            body = None
+        elif self.headers.get("Content-Type", "").startswith("application/x-www-form-urlencoded"):
+            body = dict(parse_qsl(raw_body.decode("utf-8")))
+        else:
+            body = json.loads(raw_body)
+
+        status, payload, extra_headers = self.server.graph.handle(
+            method, parts.path, parse_qs(parts.query), body, self.headers
+        )
+
+        data = json.dumps(payload).encode("utf-8") if payload is not None else b""
+
+        with self.server.graph.lock:
+            self.server.graph.bytes_sent += len(data)
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in extra_headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+def start_mock_server(graph=None, port=0):
+    """Start the stub server in a background thread, returns (server, base_url)"""
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockGraphHandler)
+    server.daemon_threads = True
+    server.graph = graph if graph is not None else MockGraph()
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    return server, base_url
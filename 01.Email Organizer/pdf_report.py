@@ -0,0 +1,167 @@
+from functools import lru_cache
+from itertools import chain
+from pdf_streaming import StreamingDocTemplate
+from report_writers import WEEKDAY_NAMES, format_period, iter_days, meeting_cells, stats_rows
+from reportlab.lib.pagesizes import letter
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.units import inch
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+# Meetings per table; busier days are split into several tables
+TABLE_CHUNK_ROWS = 40
+
+# ============================================================
+# STYLES
+# ============================================================
+
+@lru_cache(maxsize=None)
+def get_report_styles():
+    """Paragraph and table styles, built once and shared by every table"""
+
+    styles = getSampleStyleSheet()
+
+    return {
+        'title': ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            textColor=colors.HexColor('#1a73e8'),
+            spaceAfter=30,
+            alignment=1  # Center
+        ),
+        'heading': ParagraphStyle(
+            'CustomHeading',
+            parent=styles['Heading2'],
+            fontSize=16,
+            textColor=colors.HexColor('#1a73e8'),
+            spaceAfter=12
+        ),
+        'day': styles['Heading3'],
+        'normal': styles['Normal'],
+        'meetings': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1a73e8')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP')
+        ]),
+        'stats': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f0f0f0')),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+            ('GRID', (0, 0), (-1, -1), 1, colors.white)
+        ])
+    }
+
+# ============================================================
+# FLOWABLES
+# ============================================================
+
+def build_heatmap_table(heatmap, hours):
+    """Weekday x hour table of meeting hours, shaded by load"""
+
+    peak = max((heatmap[weekday][hour] for weekday in range(7) for hour in hours), default=0) or 1
+
+    data = [[""] + [str(hour) for hour in hours]]
+    style = [
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.white)
+    ]
+
+    for weekday, name in enumerate(WEEKDAY_NAMES):
+        row = [name]
+        for column, hour in enumerate(hours, start=1):
+            load = heatmap[weekday][hour]
+            row.append(f"{load:.1f}" if load else "")
+            shade = colors.linearlyInterpolatedColor(colors.white, colors.HexColor('#1a73e8'), 0, peak, load)
+            style.append(('BACKGROUND', (column, weekday + 1), (column, weekday + 1), shade))
+        data.append(row)
+
+    table = Table(data, colWidths=[0.5*inch] + [0.45*inch] * len(hours))
+    table.setStyle(TableStyle(style))
+
+    return table
+
+def iter_summary_flowables(stats, start_date, end_date, heatmap_hours):
+    """Title, period, statistics and heatmap at the top of the report"""
+
+    styles = get_report_styles()
+
+    yield Paragraph(f"Meeting Summary Report", styles['title'])
+    yield Paragraph(f"<b>Period:</b> {format_period(start_date, end_date)}", styles['normal'])
+    yield Spacer(1, 0.3*inch)
+
+    stats_table = Table([list(row) for row in stats_rows(stats)], colWidths=[2*inch, 4.5*inch])
+    stats_table.setStyle(styles['stats'])
+
+    yield stats_table
+    yield Spacer(1, 0.3*inch)
+    yield Paragraph("Meeting Load (hours per weekday and hour)", styles['heading'])
+    yield build_heatmap_table(stats['heatmap'], heatmap_hours)
+    yield Spacer(1, 0.5*inch)
+
+def iter_meeting_flowables(events, table_rows):
+    """Day headers and meeting tables, produced one day at a time"""
+
+    styles = get_report_styles()
+
+    yield Paragraph("Meeting Details", styles['heading'])
+    yield Spacer(1, 0.2*inch)
+
+    for day_date, day_events in iter_days(events):
+        # Day header
+        yield Paragraph(
+            f"<b>{day_date.strftime('%A, %B %d, %Y')}</b> ({len(day_events)} meetings)",
+            styles['day']
+        )
+        yield Spacer(1, 0.1*inch)
+
+        # Busy days become several tables, each repeating the header row
+        for chunk_start in range(0, len(day_events), table_rows):
+            meeting_data = [["Time", "Subject", "Location", "Attendees"]]
+            meeting_data += [meeting_cells(event) for event in day_events[chunk_start:chunk_start + table_rows]]
+
+            meeting_table = Table(meeting_data, colWidths=[1.5*inch, 2.5*inch, 1.5*inch, 1.2*inch], repeatRows=1)
+            meeting_table.setStyle(styles['meetings'])
+
+            yield meeting_table
+
+        yield Spacer(1, 0.3*inch)
+
+# ============================================================
+# WRITER
+# ============================================================
+
+def write_pdf(filename, stats, events, start_date, end_date, stream=True, heatmap_hours=range(8, 21),
+              table_rows=None, **options):
+    """Lay out the report and write the PDF
+
+    With stream the flowables are laid out as they are produced (see
+    pdf_streaming); otherwise the whole story is built first.
+    """
+
+    flowables = chain(
+        iter_summary_flowables(stats, start_date, end_date, heatmap_hours),
+        iter_meeting_flowables(events, table_rows or TABLE_CHUNK_ROWS)
+    )
+
+    if stream:
+        StreamingDocTemplate(filename, pagesize=letter).build_stream(flowables)
+    else:
+        SimpleDocTemplate(filename, pagesize=letter).build(list(flowables))
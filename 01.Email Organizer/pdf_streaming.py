@@ -0,0 +1,101 @@
+from itertools import islice
+import reportlab
+from reportlab.platypus import SimpleDocTemplate, PageTemplate, Frame
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+# Flowables pulled from the generator ahead of layout (enough to keep
+# "keep with next" and table splitting working)
+STREAM_BUFFER = 16
+
+# ReportLab versions build_stream is known to work with, [lowest, highest).
+# It drives the private layout loop of BaseDocTemplate, so any other
+# version falls back to the regular doc.build() (same README pin)
+REPORTLAB_VERSIONS = ((3, 6), (6, 0))
+
+# Private BaseDocTemplate methods build_stream calls
+LAYOUT_METHODS = ("_calc", "_startBuild", "handle_flowable", "clean_hanging", "_endBuild")
+
+# ============================================================
+# VERSION CHECK
+# ============================================================
+
+def reportlab_version():
+    """Installed ReportLab version as a tuple of ints, e.g. (4, 2, 5)"""
+
+    parts = []
+    for part in reportlab.Version.split("."):
+        digits = "".join(char for char in part if char.isdigit())
+        if not digits:
+            break
+        parts.append(int(digits))
+
+    return tuple(parts)
+
+def can_stream():
+    """True if this ReportLab has the layout loop build_stream relies on"""
+
+    lowest, highest = REPORTLAB_VERSIONS
+    if not lowest <= reportlab_version() < highest:
+        return False
+
+    return all(callable(getattr(SimpleDocTemplate, name, None)) for name in LAYOUT_METHODS)
+
+# ============================================================
+# STREAMING DOCUMENT
+# ============================================================
+
+class StreamingDocTemplate(SimpleDocTemplate):
+    """SimpleDocTemplate that lays out flowables as a generator produces them
+
+    doc.build(story) needs the whole story as a list up front. build_stream
+    runs the same layout loop (_startBuild / handle_flowable / _endBuild)
+    but only holds STREAM_BUFFER flowables at a time, so memory does not
+    grow with the number of tables in the report. Finished pages are kept
+    compressed in the PDF being written. On a ReportLab version outside
+    REPORTLAB_VERSIONS it falls back to doc.build().
+    """
+
+    def __init__(self, filename, **kw):
+        kw.setdefault("pageCompression", 1)
+        super().__init__(filename, **kw)
+
+    def build_stream(self, flowables):
+        """Lay out and write every flowable from an iterable"""
+
+        if not can_stream():
+            print(f"⚠️  ReportLab {reportlab.Version} is not supported for streaming, building the whole PDF at once")
+            self.build(list(flowables))
+            return
+
+        self._calc()
+        frame = Frame(self.leftMargin, self.bottomMargin, self.width, self.height, id='normal')
+        self.addPageTemplates([
+            PageTemplate(id='First', frames=frame, pagesize=self.pagesize),
+            PageTemplate(id='Later', frames=frame, pagesize=self.pagesize)
+        ])
+
+        self._startBuild(self.filename)
+        canv = self.canv
+        canv._doctemplate = self
+
+        flowables = iter(flowables)
+        pending = []
+
+        try:
+            while True:
+                if len(pending) < STREAM_BUFFER:
+                    pending.extend(islice(flowables, STREAM_BUFFER - len(pending)))
+
+                if not pending:
+                    break
+
+                self.clean_hanging()
+                # Takes pending[0]; a split table puts its remainder back at the front
+                self.handle_flowable(pending)
+        finally:
+            del canv._doctemplate
+
+        self._endBuild()
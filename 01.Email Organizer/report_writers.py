@@ -0,0 +1,210 @@
+import csv
+import html
+import json
+from itertools import groupby
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+# Columns of the CSV export (one row per meeting)
+CSV_COLUMNS = ["date", "start", "end", "hours", "subject", "location", "attendees", "organizer"]
+
+WEEKDAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+# ============================================================
+# SHARED FORMATTING
+# ============================================================
+#
+# Every writer gets the same inputs: the statistics from meeting_stats
+# (computed once, before writing) and the EventRecords, streamed in start
+# order. Writers consume the events as they go and never hold them all.
+
+def format_hour(hour):
+    """12-hour label for an hour of the day (e.g. 9 AM)"""
+
+    return f"{hour % 12 or 12} {'AM' if hour < 12 else 'PM'}"
+
+def format_period(start_date, end_date):
+    return f"{start_date.strftime('%B %d, %Y')} - {end_date.strftime('%B %d, %Y')}"
+
+def stats_rows(stats):
+    """(label, value) lines of the summary table shown at the top of a report"""
+
+    return [
+        ("Total Meetings:", str(stats['total_meetings'])),
+        ("Total Hours:", f"{stats['total_hours']:.1f} hours"),
+        ("Average per Day:", f"{stats['average_per_day']:.1f} meetings ({stats['average_hours_per_day']:.1f} hours)"),
+        ("Back-to-back Meetings:", str(stats['back_to_back'])),
+        ("Busiest Hours:", ", ".join(format_hour(hour) for hour, _ in stats['busiest_hours']) or "-"),
+        ("Top Organizers:", ", ".join(f"{name} ({count})" for name, count in stats['top_organizers']) or "-"),
+        ("Average Attendees:", f"{stats['average_attendees']:.1f}")
+    ]
+
+def meeting_cells(event):
+    """Time, subject, location and attendees of a meeting as display text"""
+
+    time_str = f"{event.start.strftime('%I:%M %p')} - {event.end.strftime('%I:%M %p')}"
+    attendee_str = f"{event.attendee_count} attendees" if event.attendee_count > 0 else "No attendees"
+
+    return [time_str, event.subject, event.location, attendee_str]
+
+def iter_days(events):
+    """(date, meetings) for each local day; events arrive ordered by start"""
+
+    for day_date, day_group in groupby(events, key=lambda event: event.day):
+        yield day_date, list(day_group)
+
+def meeting_record(event):
+    """Plain values of a meeting for the data exports"""
+
+    start = event.start
+
+    return {
+        "date": start.date().isoformat(),
+        "start": start.isoformat(),
+        "end": event.end.isoformat(),
+        "hours": round(event.hours, 2),
+        "subject": event.subject,
+        "location": event.location,
+        "attendees": event.attendee_count,
+        "organizer": event.organizer
+    }
+
+def stats_record(stats, start_date, end_date):
+    """The statistics as JSON-ready values"""
+
+    record = dict(stats)
+    record["start"] = start_date.isoformat()
+    record["end"] = end_date.isoformat()
+    record["per_day"] = [
+        {"date": day.isoformat(), "meetings": count, "hours": round(hours, 2)}
+        for day, count, hours in stats["per_day"]
+    ]
+    record["busiest_hours"] = [{"hour": hour, "hours": round(hours, 2)} for hour, hours in stats["busiest_hours"]]
+    record["top_organizers"] = [{"organizer": name, "meetings": count} for name, count in stats["top_organizers"]]
+    record["heatmap"] = [[round(hours, 2) for hours in row] for row in stats["heatmap"]]
+
+    return record
+
+# ============================================================
+# WRITERS
+# ============================================================
+#
+# write_<format>(filename, stats, events, start_date, end_date, **options)
+# Options a writer does not use are ignored.
+
+def write_csv(filename, stats, events, start_date, end_date, **options):
+    """One row per meeting, written as the events stream past"""
+
+    with open(filename, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+
+        for event in events:
+            writer.writerow(meeting_record(event))
+
+def write_ndjson(filename, stats, events, start_date, end_date, **options):
+    """A summary line followed by one line per meeting (newline-delimited JSON)"""
+
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"type": "summary", **stats_record(stats, start_date, end_date)}) + "\n")
+
+        for event in events:
+            f.write(json.dumps({"type": "meeting", **meeting_record(event)}) + "\n")
+
+HTML_HEAD = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Meeting Summary Report</title>
+<style>
+body { font-family: Helvetica, Arial, sans-serif; margin: 2em auto; max-width: 60em; color: #222; }
+h1, h2 { color: #1a73e8; }
+h1 { text-align: center; }
+table { border-collapse: collapse; margin-bottom: 1.5em; }
+th, td { padding: 0.35em 0.6em; text-align: left; vertical-align: top; }
+table.stats td { background: #f0f0f0; border: 1px solid #fff; }
+table.stats td:first-child { font-weight: bold; }
+table.heatmap td, table.heatmap th { border: 1px solid #fff; font-size: 0.8em; text-align: center; min-width: 2.5em; }
+table.meetings { width: 100%; }
+table.meetings th { background: #1a73e8; color: #fff; }
+table.meetings td { background: #f5f5dc; border: 1px solid #000; font-size: 0.9em; }
+</style>
+</head>
+<body>
+"""
+
+def heatmap_html(heatmap, hours):
+    """Weekday x hour table of meeting hours, shaded by load"""
+
+    peak = max((heatmap[weekday][hour] for weekday in range(7) for hour in hours), default=0) or 1
+
+    lines = ['<table class="heatmap">', "<tr><th></th>" + "".join(f"<th>{hour}</th>" for hour in hours) + "</tr>"]
+
+    for weekday, name in enumerate(WEEKDAY_NAMES):
+        cells = []
+        for hour in hours:
+            load = heatmap[weekday][hour]
+            cells.append(
+                f'<td style="background: rgba(26, 115, 232, {load / peak:.2f})">{f"{load:.1f}" if load else ""}</td>'
+            )
+        lines.append(f"<tr><th>{name}</th>{''.join(cells)}</tr>")
+
+    lines.append("</table>")
+    return "\n".join(lines) + "\n"
+
+def write_html(filename, stats, events, start_date, end_date, heatmap_hours=range(8, 21), **options):
+    """Static, self-contained HTML page laid out like the PDF"""
+
+    escape = html.escape
+
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(HTML_HEAD)
+        f.write("<h1>Meeting Summary Report</h1>\n")
+        f.write(f"<p><b>Period:</b> {escape(format_period(start_date, end_date))}</p>\n")
+
+        f.write('<table class="stats">\n')
+        for label, value in stats_rows(stats):
+            f.write(f"<tr><td>{escape(label)}</td><td>{escape(value)}</td></tr>\n")
+        f.write("</table>\n")
+
+        f.write("<h2>Meeting Load (hours per weekday and hour)</h2>\n")
+        f.write(heatmap_html(stats["heatmap"], heatmap_hours))
+
+        f.write("<h2>Meeting Details</h2>\n")
+
+        for day_date, day_events in iter_days(events):
+            f.write(f"<h3>{day_date.strftime('%A, %B %d, %Y')} ({len(day_events)} meetings)</h3>\n")
+            f.write('<table class="meetings">\n<tr><th>Time</th><th>Subject</th><th>Location</th><th>Attendees</th></tr>\n')
+
+            for event in day_events:
+                f.write("<tr>" + "".join(f"<td>{escape(cell)}</td>" for cell in meeting_cells(event)) + "</tr>\n")
+
+            f.write("</table>\n")
+
+        f.write("</body>\n</html>\n")
+
+def write_pdf(filename, stats, events, start_date, end_date, **options):
+    """PDF report (ReportLab is only imported when a PDF is asked for)"""
+
+    import pdf_report
+
+    pdf_report.write_pdf(filename, stats, events, start_date, end_date, **options)
+
+WRITERS = {
+    "pdf": write_pdf,
+    "csv": write_csv,
+    "ndjson": write_ndjson,
+    "html": write_html
+}
+
+def write_report(output_format, filename, stats, events, start_date, end_date, **options):
+    """Write a report in one of the WRITERS formats (the format is also the file extension)"""
+
+    writer = WRITERS.get(output_format)
+
+    if writer is None:
+        raise ValueError(f"Unknown output format {output_format!r} (choose from {', '.join(WRITERS)})")
+
+    writer(filename, stats, events, start_date, end_date, **options)
@@ -0,0 +1,62 @@
+import hashlib
+import json
+import os
+from ttl_store import TTLStore
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+# Where the caches are kept between runs
+STATE_DIR = os.path.join(os.path.expanduser("~"), ".email_organizer")
+
+# How long a result is kept before it is evicted
+DEFAULT_TTL_DAYS = 30
+
+# ============================================================
+# PERSISTENT RESULT CACHE
+# ============================================================
+
+def content_key(*parts):
+    """Cache key for some content: a SHA-256 of the parts (anything JSON can encode)"""
+
+    data = json.dumps(parts, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+class ResultCache(TTLStore):
+    """Dict-like cache of JSON results kept in SQLite (WAL mode)
+
+    `cache.get(key)` returns the stored value or None, `cache.put(key,
+    value)` stores it. Entries older than ttl_days are evicted the same
+    way as DedupStore's IDs (see ttl_store).
+    """
+
+    TABLE = "results"
+    COLUMNS = ("value TEXT NOT NULL",)
+
+    def __init__(self, name, ttl_days=DEFAULT_TTL_DAYS, path=None):
+        if path is None:
+            os.makedirs(STATE_DIR, exist_ok=True)
+            path = os.path.join(STATE_DIR, f"{name}.sqlite3")
+
+        self.hits = 0
+        self.misses = 0
+
+        super().__init__(path, ttl_days)
+
+    def get(self, key):
+        """The stored value, or None when missing or expired"""
+
+        data = self.lookup(key, "value")
+
+        if data is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return json.loads(data)
+
+    def put(self, key, value):
+        """Store a value (replacing any older one)"""
+
+        self.insert(key, value=json.dumps(value, separators=(",", ":")))
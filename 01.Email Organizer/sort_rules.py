@@ -0,0 +1,87 @@
+from keyword_index import KeywordIndex
+
+# ============================================================
+# RULE SET
+# ============================================================
+#
+# Rules are plain dicts, in priority order - the first rule that matches
+# a message decides its folder:
+#
+#     {"folder": "Newsletters",
+#      "domains": ["substack.com"],        # sender domain or any subdomain
+#      "senders": ["news@example.com"],    # exact sender address
+#      "subject": ["newsletter", "digest"],
+#      "body": ["unsubscribe"],            # searched in bodyPreview
+#      "importance": "high"}               # Graph importance value
+#
+# Every condition is optional; a rule matches when any of them does.
+
+class RuleSet:
+    """Sorting rules compiled once into lookup tables
+
+    Sender addresses and domains become dict lookups, and all subject
+    (and body) keywords of all rules are one KeywordIndex, so classifying
+    a message costs a few dict hits plus one scan of its subject and
+    preview however many rules there are. Each table maps to the highest
+    priority rule it belongs to; the best hit across tables wins.
+    """
+
+    def __init__(self, rules):
+        self.folders = [rule["folder"] for rule in rules]
+        self.domains = {}
+        self.senders = {}
+        self.importance = {}
+        self.subject_rules = {}
+        self.body_rules = {}
+
+        # setdefault keeps the first (highest priority) rule for each key
+        for number, rule in enumerate(rules):
+            for domain in rule.get("domains", []):
+                self.domains.setdefault(domain.lower().lstrip("@."), number)
+            for sender in rule.get("senders", []):
+                self.senders.setdefault(sender.lower(), number)
+            if rule.get("importance"):
+                self.importance.setdefault(rule["importance"].lower(), number)
+            for keyword in rule.get("subject", []):
+                self.subject_rules.setdefault(keyword.lower(), number)
+            for keyword in rule.get("body", []):
+                self.body_rules.setdefault(keyword.lower(), number)
+
+        self.subject_index = KeywordIndex(self.subject_rules)
+        self.body_index = KeywordIndex(self.body_rules)
+
+    def __len__(self):
+        return len(self.folders)
+
+    def match(self, message):
+        """Number of the first rule matching a Graph message, or None"""
+
+        no_match = len(self.folders)
+        best = no_match
+
+        address = (((message.get('from') or {}).get('emailAddress') or {}).get('address') or "").lower()
+        best = min(best, self.senders.get(address, no_match))
+
+        # "news@mail.example.com" looks up mail.example.com, then example.com, then com
+        domain = address.rpartition("@")[2]
+        while domain:
+            best = min(best, self.domains.get(domain, no_match))
+            domain = domain.partition(".")[2]
+
+        best = min(best, self.importance.get((message.get('importance') or "").lower(), no_match))
+
+        for keyword in self.subject_index.keywords_in(message.get('subject') or ""):
+            best = min(best, self.subject_rules[keyword])
+
+        # Previews are longer than subjects; skip them when no body rule could still win
+        if self.body_rules and min(self.body_rules.values()) < best:
+            for keyword in self.body_index.keywords_in(message.get('bodyPreview') or ""):
+                best = min(best, self.body_rules[keyword])
+
+        return best if best < no_match else None
+
+    def classify(self, message):
+        """Folder a Graph message belongs in, or None when no rule matches"""
+
+        number = self.match(message)
+        return None if number is None else self.folders[number]
@@ -0,0 +1,232 @@
+import json
+import os
+import threading
+import time
+import requests
+import graph_client
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+# Where cached tokens are kept between runs
+STATE_DIR = os.path.join(os.path.expanduser("~"), ".email_organizer")
+
+# Refresh the access token this many seconds before it expires
+REFRESH_MARGIN = 300
+
+AUTHORITY_URL = "https://login.microsoftonline.com/common/oauth2/v2.0"
+
+# ============================================================
+# TOKEN MANAGER
+# ============================================================
+
+class TokenManager:
+    """Access token source shared by all scripts
+
+    Tokens (including the refresh token) are cached on disk per client ID.
+    get_token() returns a valid access token, silently refreshing it shortly
+    before expiry; the interactive device code flow only runs when there is
+    no usable refresh token. Polling loops and daemons pass interactive=False
+    so a failed refresh returns None instead of waiting on a login prompt
+    nobody is watching.
+    """
+
+    def __init__(self, client_id, scopes, cache_path=None):
+        if cache_path is None:
+            cache_path = os.path.join(STATE_DIR, f"tokens_{client_id}.json")
+
+        self.client_id = client_id
+        self.scopes = scopes
+        self.cache_path = cache_path
+        self.lock = threading.Lock()
+        self.tokens = self.load_cache()
+
+    # --------------------------------------------------------
+    # Cache file
+    # --------------------------------------------------------
+    #
+    # Layout: {"refresh_token": ..., "access_tokens": {scope_key: {...}}}
+    # One refresh token per client ID is shared by every script; access
+    # tokens are kept per scope set since each script asks for different ones.
+
+    def scope_key(self):
+        return " ".join(sorted(self.scopes.split()))
+
+    def load_cache(self):
+        """Read cached tokens (another script may have refreshed them)"""
+
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_cache(self):
+        """Write tokens atomically, readable only by the current user"""
+
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.tokens, f)
+
+        os.replace(tmp_path, self.cache_path)
+
+    def store(self, token_result):
+        """Keep a token endpoint response, converting expires_in to a timestamp"""
+
+        # Merge with what is on disk so other scripts' access tokens survive
+        tokens = self.load_cache()
+        tokens.setdefault("access_tokens", {})[self.scope_key()] = {
+            "access_token": token_result["access_token"],
+            "expires_at": time.time() + int(token_result.get("expires_in", 3600))
+        }
+
+        if token_result.get("refresh_token"):
+            tokens["refresh_token"] = token_result["refresh_token"]
+
+        self.tokens = tokens
+        self.save_cache()
+
+    def cached_access_token(self):
+        """The cached access token for our scopes, if not about to expire"""
+
+        entry = self.tokens.get("access_tokens", {}).get(self.scope_key(), {})
+
+        if entry.get("access_token") and time.time() < entry.get("expires_at", 0) - REFRESH_MARGIN:
+            return entry["access_token"]
+
+        return None
+
+    # --------------------------------------------------------
+    # Token flows
+    # --------------------------------------------------------
+
+    def get_token(self, interactive=True):
+        """Return a valid access token, refreshing or logging in as needed
+
+        With interactive=False, returns None when the refresh token no
+        longer works instead of starting the device code flow.
+        """
+
+        with self.lock:
+            access_token = self.cached_access_token()
+            if access_token:
+                return access_token
+
+            # Another script may have refreshed in the meantime
+            self.tokens = self.load_cache()
+            access_token = self.cached_access_token()
+            if access_token:
+                return access_token
+
+            if self.tokens.get("refresh_token") and self.refresh():
+                return self.cached_access_token()
+
+            if not interactive:
+                print("❌ Cached login expired - restart to sign in again")
+                return None
+
+            if self.device_code_login():
+                return self.cached_access_token()
+
+            return None
+
+    def refresh(self):
+        """Redeem the refresh token for a new access token"""
+
+        token_data = {
+            "grant_type": "refresh_token",
+            "client_id": self.client_id,
+            "refresh_token": self.tokens["refresh_token"],
+            "scope": self.scopes
+        }
+
+        try:
+            token_result = graph_client.post_form(f"{AUTHORITY_URL}/token", token_data).json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"❌ Token refresh failed: {e}")
+            return False
+
+        if "access_token" not in token_result:
+            print(f"⚠️  Refresh token rejected: {token_result.get('error', 'unknown error')}")
+            return False
+
+        self.store(token_result)
+        return True
+
+    def device_code_login(self):
+        """Interactive device code flow (only used when no refresh token works)"""
+
+        data = {
+            "client_id": self.client_id,
+            "scope": self.scopes
+        }
+
+        print("Requesting authentication...")
+
+        try:
+            response = graph_client.post_form(f"{AUTHORITY_URL}/devicecode", data)
+            response.raise_for_status()
+            device_code_response = response.json()
+
+            if 'error' in device_code_response or 'message' not in device_code_response:
+                print(f"\n❌ Authentication error")
+                return False
+
+        except requests.exceptions.RequestException as e:
+            print(f"\n❌ Network error: {e}")
+            return False
+
+        print("\n" + "="*60)
+        print("AUTHENTICATION REQUIRED")
+        print("="*60)
+        print(f"\n{device_code_response['message']}\n")
+        print(f"User Code: {device_code_response['user_code']}")
+        print(f"Visit: {device_code_response['verification_uri']}")
+        print("\nWaiting for authentication...")
+        print("="*60 + "\n")
+
+        token_data = {
+            "grant_type": "urn:ietf:params:oauth:grant-type:device_code",
+            "client_id": self.client_id,
+            "device_code": device_code_response['device_code']
+        }
+
+        poll_interval = int(device_code_response.get('interval', 5))
+
+        while True:
+            try:
+                token_result = graph_client.post_form(f"{AUTHORITY_URL}/token", token_data).json()
+
+                if "access_token" in token_result:
+                    print("✓ Authentication successful!\n")
+                    self.store(token_result)
+                    return True
+                elif token_result.get("error") == "authorization_pending":
+                    print(".", end="", flush=True)
+                    time.sleep(poll_interval)
+                elif token_result.get("error") == "slow_down":
+                    poll_interval += 5
+                    time.sleep(poll_interval)
+                else:
+                    print(f"\n❌ Error: {token_result.get('error_description', 'Unknown error')}")
+                    return False
+            except Exception as e:
+                print(f"\n❌ Error: {e}")
+                return False
+
+# One manager per (client ID, scopes), shared inside a process
+_managers = {}
+
+def get_token_manager(client_id, scopes):
+    """Get the shared TokenManager for a client ID and scope set"""
+
+    key = (client_id, scopes)
+
+    if key not in _managers:
+        _managers[key] = TokenManager(client_id, scopes)
+
+    return _managers[key]
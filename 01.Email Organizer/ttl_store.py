@@ -0,0 +1,97 @@
+import sqlite3
+import threading
+import time
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+# Evict expired rows after this many additions
+PURGE_EVERY = 500
+
+# ============================================================
+# SQLITE TABLE WITH TTL EVICTION
+# ============================================================
+
+class TTLStore:
+    """One SQLite table (WAL mode) of keys whose rows expire after ttl_days
+
+    Base of DedupStore and ResultCache. A subclass names its TABLE and any
+    COLUMNS it keeps besides key and added_at. Expired rows are never
+    returned and are deleted every PURGE_EVERY additions, so the file
+    stays bounded; nothing is loaded into memory on start.
+    """
+
+    TABLE = None
+    COLUMNS = ()  # Extra column definitions, e.g. ("value TEXT NOT NULL",)
+
+    def __init__(self, path, ttl_days):
+        self.path = path
+        self.ttl_seconds = ttl_days * 86400
+        self.lock = threading.Lock()
+        self.adds_since_purge = 0
+
+        columns = "".join(f" {column}," for column in self.COLUMNS)
+
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.TABLE} ("
+            f" key TEXT PRIMARY KEY,{columns}"
+            " added_at REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS {self.TABLE}_added_at ON {self.TABLE} (added_at)")
+
+        self.purge_expired()
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()[0]
+
+    def lookup(self, key, column="added_at"):
+        """A column of the row for key, or None when missing or expired"""
+
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT {column} FROM {self.TABLE} WHERE key = ? AND added_at > ?",
+                (key, time.time() - self.ttl_seconds)
+            ).fetchone()
+
+        return None if row is None else row[0]
+
+    def insert(self, key, **values):
+        """Store a row for key (replacing any older one, which restarts its TTL)"""
+
+        columns = ["key", *values, "added_at"]
+
+        with self.lock:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self.TABLE} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                (key, *values.values(), time.time())
+            )
+            self.adds_since_purge += 1
+            purge_due = self.adds_since_purge >= PURGE_EVERY
+
+        if purge_due:
+            self.purge_expired()
+
+    def delete(self, key):
+        with self.lock:
+            self.conn.execute(f"DELETE FROM {self.TABLE} WHERE key = ?", (key,))
+
+    def purge_expired(self):
+        """Delete rows older than the TTL, returns how many were removed"""
+
+        with self.lock:
+            cursor = self.conn.execute(
+                f"DELETE FROM {self.TABLE} WHERE added_at <= ?",
+                (time.time() - self.ttl_seconds,)
+            )
+            self.adds_since_purge = 0
+            return cursor.rowcount
+
+    def close(self):
+        with self.lock:
+            self.conn.close()